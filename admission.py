@@ -0,0 +1,123 @@
+"""
+接口准入控制 (load shedding)
+
+上游变慢时，服务仍会不断接收 /api/download、/api/parse 请求，协程越积越多，
+最终内存和 socket 耗尽，所有请求一起超时。这里对每个接口单独限流：
+
+- 同时处理的请求数上限 (max_inflight)，超出的请求 FIFO 排队
+- 排队长度上限 (max_queue)，队列满时立即拒绝
+- 按近期处理耗时 (EWMA) 估算新请求的排队时间，预计等不到就立即拒绝，
+  不必先排满 queue_timeout 再超时
+- 拒绝时抛出 Overloaded，由服务返回 503 + Retry-After
+
+stats() 返回当前排队深度和各原因的拒绝次数，供 /api/metrics 监控。
+"""
+
+import math
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+
+# 处理耗时 EWMA 的平滑系数
+EWMA_ALPHA = 0.2
+
+
+class Overloaded(RuntimeError):
+    """请求被准入控制拒绝"""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    单个接口的准入控制
+
+    Args:
+        name: 接口名（用于错误信息和监控）
+        max_inflight: 同时处理的请求数上限
+        max_queue: 排队请求数上限
+        queue_timeout: 排队最长等待秒数；预计等待超过该值的请求直接拒绝
+    """
+
+    def __init__(self, name: str, max_inflight: int, max_queue: int, queue_timeout: float = 10.0):
+        self.name = name
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.inflight = 0
+        self.admitted = 0
+        self.shed = {"queue_full": 0, "latency": 0, "timeout": 0}
+        self.latency = 0.0
+        self._waiters = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def estimated_wait(self) -> float:
+        """新请求的预计排队时间（秒）"""
+        return (self.waiting + 1) * self.latency / max(self.max_inflight, 1)
+
+    def stats(self) -> dict:
+        return {
+            "inflight": self.inflight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+            "latency_ms": round(self.latency * 1000, 1),
+        }
+
+    def _reject(self, reason: str, message: str):
+        self.shed[reason] += 1
+        retry_after = max(1, math.ceil(min(self.estimated_wait(), self.queue_timeout)))
+        raise Overloaded(f"{self.name} 繁忙: {message}，请稍后重试", retry_after)
+
+    @asynccontextmanager
+    async def admit(self):
+        """占用一个处理名额，退出时归还并更新处理耗时"""
+        await self._acquire()
+        self.admitted += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            self.latency = elapsed if not self.latency else (
+                EWMA_ALPHA * elapsed + (1 - EWMA_ALPHA) * self.latency
+            )
+            self._release()
+
+    async def _acquire(self):
+        if not self._waiters and self.inflight < self.max_inflight:
+            self.inflight += 1
+            return
+        if self.waiting >= self.max_queue:
+            self._reject("queue_full", "排队请求过多")
+        if self.estimated_wait() > self.queue_timeout:
+            self._reject("latency", "处理延迟过高")
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await asyncio.wait_for(fut, self.queue_timeout)
+        except BaseException as e:
+            if fut.done() and not fut.cancelled():
+                # 名额已经分配，但等待方被取消：归还
+                self._release()
+            elif fut in self._waiters:
+                self._waiters.remove(fut)
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject("timeout", "排队超时")
+            raise
+
+    def _release(self):
+        self.inflight -= 1
+        while self._waiters and self.inflight < self.max_inflight:
+            fut = self._waiters.popleft()
+            if fut.done():
+                continue
+            self.inflight += 1
+            fut.set_result(None)
@@ -0,0 +1,306 @@
+"""
+作者主页批量下载
+
+原理：
+1. 解析主页分享链接，跟随重定向得到 sec_uid (iesdouyin.com/share/user/{sec_uid})
+2. 通过 iesdouyin 作品列表接口按 max_cursor 翻页
+3. 列表中的作品如果缺少播放地址，再单独请求 /share/video/{id}/ 获取详情
+4. 下载
+
+三个阶段通过有界队列串成流水线，每个阶段各自限制并发：
+翻页 (1) → 详情解析 (detail_concurrency) → 下载 (download_concurrency)
+"""
+
+import re
+import asyncio
+import httpx
+
+import dns_cache
+from douyin_core import (
+    DEFAULT_HEADERS,
+    extract_url,
+    resolve_share_url,
+    fetch_video_detail,
+    extract_video_urls,
+    download_post,
+    sanitize_filename,
+)
+
+# 从主页 URL 中提取 sec_uid
+SEC_UID_PATTERNS = [
+    re.compile(r"/user/([\w-]+)"),
+    re.compile(r"[?&]sec_uid=([\w-]+)"),
+]
+
+# 作品列表接口（分享页使用，不需要 Cookie 或签名）
+AUTHOR_POSTS_API = "https://www.iesdouyin.com/web/api/v2/aweme/post/"
+
+# 每页作品数
+PAGE_SIZE = 18
+
+# 接口偶尔返回 has_more=true 但列表为空，连续空页超过该次数即停止
+MAX_EMPTY_PAGES = 3
+
+DETAIL_CONCURRENCY = 4
+DOWNLOAD_CONCURRENCY = 2
+
+# 队列结束标记
+_DONE = object()
+
+
+def extract_sec_uid(url: str) -> str:
+    """从主页 URL 中提取 sec_uid"""
+    for pattern in SEC_UID_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            return match.group(1)
+    raise ValueError(f"无法从 URL 中提取作者 ID (sec_uid): {url}")
+
+
+async def resolve_sec_uid(share_text: str) -> str:
+    """解析作者主页分享文本/链接，返回 sec_uid"""
+    url = extract_url(share_text)
+    try:
+        return extract_sec_uid(url)
+    except ValueError:
+        pass
+    # 短链接需要跟随重定向，重定向到主页地址即可停止，不需要请求主页
+    stop = lambda u: any(p.search(u) for p in SEC_UID_PATTERNS)  # noqa: E731
+    return extract_sec_uid(await resolve_share_url(url, stop=stop))
+
+
+def author_client() -> httpx.AsyncClient:
+    """请求作品列表接口使用的 client"""
+    return httpx.AsyncClient(
+        headers={**DEFAULT_HEADERS, "Accept": "application/json"},
+        follow_redirects=True,
+        timeout=15,
+        transport=dns_cache.transport(),
+    )
+
+
+async def fetch_author_page(client, sec_uid: str, cursor: int = 0, page_size: int = PAGE_SIZE) -> dict:
+    """
+    请求一页作品列表
+
+    Returns:
+        接口原始数据: {"aweme_list": [...], "max_cursor": 下一页游标, "has_more": bool}
+    """
+    resp = await client.get(
+        AUTHOR_POSTS_API,
+        params={"sec_uid": sec_uid, "count": page_size, "max_cursor": cursor},
+    )
+    resp.raise_for_status()
+    data = resp.json()
+    if data.get("status_code", 0) != 0:
+        raise RuntimeError(f"获取作品列表失败: status_code={data.get('status_code')}")
+    return data
+
+
+async def iter_author_pages(sec_uid: str, page_size: int = PAGE_SIZE):
+    """按页返回作者的作品列表 (aweme_list)"""
+    cursor = 0
+    empty_pages = 0
+    async with author_client() as client:
+        while True:
+            data = await fetch_author_page(client, sec_uid, cursor, page_size)
+            aweme_list = data.get("aweme_list") or []
+            if aweme_list:
+                empty_pages = 0
+                yield aweme_list
+            else:
+                empty_pages += 1
+
+            if not data.get("has_more") or empty_pages >= MAX_EMPTY_PAGES:
+                return
+            cursor = data.get("max_cursor", 0)
+
+
+def _has_media(post: dict) -> bool:
+    """列表中的作品是否已包含可下载的地址（否则需要再请求详情页）"""
+    if post.get("aweme_type") == 2:
+        return any(img.get("url_list") for img in post.get("images") or [])
+    play_addr = (post.get("video") or {}).get("play_addr") or {}
+    return bool(play_addr.get("uri") or play_addr.get("url_list"))
+
+
+async def fetch_post_info(post: dict) -> dict:
+    """由列表中的作品得到 extract_video_urls 信息，缺少播放地址时请求详情页"""
+    detail = post
+    if not _has_media(post):
+        detail = await fetch_video_detail(
+            f"https://www.iesdouyin.com/share/video/{post.get('aweme_id', '')}/"
+        )
+    return extract_video_urls(detail)
+
+
+def post_base_name(info: dict) -> str:
+    """作者模式的文件名：同一作者的作品标题可能重复，带上 aweme_id 避免互相覆盖"""
+    return sanitize_filename(f"{info['aweme_id']}_{info['title']}")
+
+
+async def iter_author_infos(
+    sec_uid: str,
+    max_posts: int = None,
+    skip=None,
+    page_size: int = PAGE_SIZE,
+    detail_concurrency: int = DETAIL_CONCURRENCY,
+):
+    """
+    翻页 + 详情解析流水线，按完成顺序逐个产出作品信息
+
+    Args:
+        sec_uid: 作者 ID
+        max_posts: 最多处理的作品数
+        skip: 可选回调 skip(aweme_id) -> bool，返回 True 的作品不再解析详情
+        page_size: 每页作品数
+        detail_concurrency: 详情解析并发数
+
+    Yields:
+        extract_video_urls 的返回值；跳过的作品为 {"aweme_id", "skipped": True}，
+        失败的作品为 {"aweme_id", "error": 错误信息}
+    """
+    posts = asyncio.Queue(maxsize=detail_concurrency * 2)
+    results = asyncio.Queue(maxsize=detail_concurrency * 2)
+
+    async def pager():
+        if max_posts is not None and max_posts <= 0:
+            return
+        count = 0
+        async for page in iter_author_pages(sec_uid, page_size):
+            for post in page:
+                await posts.put(post)
+                count += 1
+                # 数量够了就不再翻下一页
+                if max_posts is not None and count >= max_posts:
+                    return
+
+    async def detail_worker():
+        while True:
+            post = await posts.get()
+            if post is _DONE:
+                return
+            aweme_id = str(post.get("aweme_id", ""))
+            try:
+                if skip is not None and skip(aweme_id):
+                    await results.put({"aweme_id": aweme_id, "skipped": True})
+                    continue
+                await results.put(await fetch_post_info(post))
+            except Exception as e:
+                await results.put({"aweme_id": aweme_id, "error": str(e)})
+
+    workers = [asyncio.create_task(detail_worker()) for _ in range(detail_concurrency)]
+
+    async def run():
+        error = None
+        try:
+            await pager()
+        except Exception as e:
+            error = e
+        for _ in workers:
+            await posts.put(_DONE)
+        await asyncio.gather(*workers)
+        await results.put(error if error is not None else _DONE)
+
+    runner = asyncio.create_task(run())
+    try:
+        while True:
+            item = await results.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        for task in (runner, *workers):
+            task.cancel()
+
+
+async def crawl_author(
+    share_text: str,
+    output_dir: str = ".",
+    only_parse: bool = False,
+    manifest=None,
+    force: bool = False,
+    max_posts: int = None,
+    faststart: bool = False,
+    detail_concurrency: int = DETAIL_CONCURRENCY,
+    download_concurrency: int = DOWNLOAD_CONCURRENCY,
+) -> dict:
+    """
+    下载作者主页的全部作品
+
+    Args:
+        share_text: 作者主页分享文本或链接
+        output_dir: 下载目录
+        only_parse: 仅解析不下载
+        manifest: 下载清单，已下载过的作品在列表阶段直接跳过
+        force: 忽略下载清单
+        max_posts: 最多处理的作品数
+        faststart: 视频下载后校验 MP4 并重排为 fast-start (见 download_post)
+        detail_concurrency: 详情解析并发数
+        download_concurrency: 下载并发数
+
+    Returns:
+        {"sec_uid", "posts": [作品信息], "downloaded", "skipped", "failed"}
+    """
+    sec_uid = await resolve_sec_uid(share_text)
+    print(f"作者 sec_uid: {sec_uid}")
+
+    skip = None
+    if manifest is not None and not force and not only_parse:
+        skip = lambda aweme_id: manifest.get(aweme_id) is not None  # noqa: E731
+
+    summary = {"sec_uid": sec_uid, "posts": [], "downloaded": 0, "skipped": 0, "failed": 0}
+    downloads = asyncio.Queue(maxsize=download_concurrency * 2)
+
+    async def download_worker():
+        while True:
+            info = await downloads.get()
+            if info is _DONE:
+                return
+            try:
+                await download_post(
+                    info, output_dir, base_name=post_base_name(info), manifest=manifest, faststart=faststart
+                )
+                summary["downloaded"] += 1
+            except Exception as e:
+                info["downloaded"] = False
+                info["error"] = str(e)
+                summary["failed"] += 1
+                print(f"作品 {info['aweme_id']} 下载失败: {e}")
+
+    workers = []
+    if not only_parse:
+        workers = [asyncio.create_task(download_worker()) for _ in range(download_concurrency)]
+
+    try:
+        async for info in iter_author_infos(
+            sec_uid,
+            max_posts=max_posts,
+            skip=skip,
+            detail_concurrency=detail_concurrency,
+        ):
+            summary["posts"].append(info)
+            if info.get("skipped"):
+                summary["skipped"] += 1
+            elif info.get("error"):
+                summary["failed"] += 1
+                print(f"作品 {info['aweme_id']} 解析失败: {info['error']}")
+            elif only_parse:
+                info["downloaded"] = False
+            else:
+                await downloads.put(info)
+
+        for _ in workers:
+            await downloads.put(_DONE)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+
+    print(
+        f"完成: 共 {len(summary['posts'])} 个作品，下载 {summary['downloaded']}，"
+        f"跳过 {summary['skipped']}，失败 {summary['failed']}"
+    )
+    return summary
@@ -0,0 +1,133 @@
+"""
+出站带宽调度
+
+Web 服务中交互式的分享页解析、/api/proxy 播放和 /api/download 批量下载共用同一条上行链路，
+几个大文件下载就能让解析延迟飙升。这里用一个全局令牌桶限制总带宽，并按优先级分配：
+
+    PRIORITY_PARSE (分享页解析) > PRIORITY_PROXY (代理播放) > PRIORITY_BULK (批量下载)
+
+- 有高优先级请求在等待时，低优先级请求不会获得令牌
+- 同一优先级内按客户端轮转，每次分配一个块，多个客户端平分带宽
+- 令牌不足时允许透支一个块（块大小通常为 64 KiB），之后按速率补齐，
+  因此大于桶容量的块也能通过
+
+各传输循环每收到一块数据调用一次 throttle(nbytes)；总带宽为 0（默认）时不限速，
+throttle() 返回 None，循环中不产生任何额外开销。
+"""
+
+import time
+import asyncio
+from collections import OrderedDict, deque
+
+PRIORITY_PARSE = 0
+PRIORITY_PROXY = 1
+PRIORITY_BULK = 2
+
+PRIORITY_NAMES = ("parse", "proxy", "bulk")
+
+
+class BandwidthScheduler:
+    """
+    按优先级分配的全局令牌桶
+
+    Args:
+        rate: 总带宽 (bytes/s)，0 表示不限速
+        burst: 桶容量 (bytes)，默认 rate 的 1/4 秒
+    """
+
+    def __init__(self, rate: int = 0, burst: int = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate // 4, 64 * 1024)
+        self.sent = [0] * len(PRIORITY_NAMES)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        # 每个优先级一个 {客户端: deque[(nbytes, future)]}，按插入顺序轮转
+        self._queues = [OrderedDict() for _ in PRIORITY_NAMES]
+        self._task = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    @property
+    def waiting(self) -> dict:
+        """各优先级排队中的块数"""
+        return {
+            name: sum(len(q) for q in self._queues[p].values())
+            for p, name in enumerate(PRIORITY_NAMES)
+        }
+
+    def throttle(self, priority: int, key: str = ""):
+        """返回绑定优先级和客户端的 async throttle(nbytes)；不限速时返回 None"""
+        if not self.enabled:
+            return None
+
+        async def throttle(nbytes: int):
+            await self.consume(nbytes, priority, key)
+
+        return throttle
+
+    async def consume(self, nbytes: int, priority: int = PRIORITY_BULK, key: str = ""):
+        """等待直到允许发送 nbytes 字节"""
+        if not self.enabled:
+            return
+        self._refill()
+        if self._tokens > 0 and not self._has_waiters(priority):
+            self._grant(nbytes, priority)
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(key, deque()).append((nbytes, fut))
+        self._ensure_dispatcher()
+        # 被取消时 future 一并取消，调度器会跳过它
+        await fut
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _grant(self, nbytes: int, priority: int):
+        self._tokens -= nbytes
+        self.sent[priority] += nbytes
+
+    def _has_waiters(self, priority: int) -> bool:
+        """priority 及更高优先级是否有人在排队"""
+        return any(self._queues[p] for p in range(priority + 1))
+
+    def _pop_next(self):
+        """取出下一个待分配的块：最高优先级，同级内按客户端轮转"""
+        for priority, clients in enumerate(self._queues):
+            while clients:
+                key, waiters = next(iter(clients.items()))
+                while waiters and waiters[0][1].done():
+                    waiters.popleft()
+                if not waiters:
+                    del clients[key]
+                    continue
+                nbytes, fut = waiters.popleft()
+                if waiters:
+                    clients.move_to_end(key)
+                else:
+                    del clients[key]
+                return nbytes, fut, priority
+        return None
+
+    def _ensure_dispatcher(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._dispatch())
+
+    async def _dispatch(self):
+        while True:
+            self._refill()
+            if self._tokens <= 0:
+                # 等到令牌回正再分配，期间到达的高优先级请求会排到前面
+                await asyncio.sleep(max(-self._tokens / self.rate, 0.001))
+                continue
+            item = self._pop_next()
+            if item is None:
+                return
+            nbytes, fut, priority = item
+            self._grant(nbytes, priority)
+            fut.set_result(None)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+并发下载时的事件循环延迟基准：事件循环内同步写盘 vs 后台写线程 (_FileWriter)
+
+用法:
+    python benchmarks/bench_download_write.py
+    python benchmarks/bench_download_write.py --downloads 16 --size-mb 16 --disk-mbps 200
+
+网络数据由内存生成，磁盘用带延迟的文件包装模拟慢盘/网络盘，
+对比两种写法下一个 5ms 周期定时器的实际延迟 (p50 / p99 / max)。
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import douyin_core  # noqa: E402
+from douyin_core import _FileWriter  # noqa: E402
+
+CHUNK = 65536
+TICK = 0.005
+
+
+class SlowFile:
+    """模拟慢盘：每次 write 都有固定延迟 + 按吞吐量计算的耗时"""
+
+    def __init__(self, f, latency: float, bytes_per_sec: float):
+        self._f = f
+        self._latency = latency
+        self._bps = bytes_per_sec
+
+    def write(self, data):
+        time.sleep(self._latency + len(data) / self._bps)
+        return self._f.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._f.close()
+
+
+async def fake_stream(total: int):
+    """模拟网络流：每块之间让出一次事件循环"""
+    sent = 0
+    payload = b"\0" * CHUNK
+    while sent < total:
+        n = min(CHUNK, total - sent)
+        sent += n
+        await asyncio.sleep(0)
+        yield payload[:n]
+
+
+async def download_inline(path: str, total: int, opener):
+    """旧实现：在事件循环中直接 f.write()"""
+    with opener(path, "wb") as f:
+        async for chunk in fake_stream(total):
+            f.write(chunk)
+
+
+async def download_threaded(path: str, total: int, opener):
+    """新实现：_FileWriter 后台写线程 (写线程内的 open 已在 measure() 中替换为 opener)"""
+    async with _FileWriter(path) as writer:
+        async for chunk in fake_stream(total):
+            await writer.write(chunk)
+
+
+async def measure(download, args, tmp_dir: str) -> dict:
+    lags = []
+    stop = asyncio.Event()
+
+    async def ticker():
+        loop = asyncio.get_running_loop()
+        while not stop.is_set():
+            start = loop.time()
+            await asyncio.sleep(TICK)
+            lags.append(loop.time() - start - TICK)
+
+    def opener(path, mode):
+        return SlowFile(open(path, mode), args.disk_latency_ms / 1000, args.disk_mbps * 1024 * 1024)
+
+    total = args.size_mb * 1024 * 1024
+    tick_task = asyncio.create_task(ticker())
+    began = time.perf_counter()
+    with patch.object(douyin_core, "open", opener, create=True):
+        await asyncio.gather(*(
+            download(os.path.join(tmp_dir, f"{download.__name__}_{i}.bin"), total, opener)
+            for i in range(args.downloads)
+        ))
+    elapsed = time.perf_counter() - began
+    stop.set()
+    await tick_task
+
+    lags_ms = sorted(x * 1000 for x in lags)
+    return {
+        "elapsed": elapsed,
+        "p50": statistics.median(lags_ms),
+        "p99": lags_ms[int(len(lags_ms) * 0.99) - 1] if len(lags_ms) > 1 else lags_ms[0],
+        "max": lags_ms[-1],
+        "ticks": len(lags_ms),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="下载写盘事件循环延迟基准")
+    parser.add_argument("--downloads", type=int, default=8, help="并发下载数 (默认: 8)")
+    parser.add_argument("--size-mb", type=int, default=8, help="每个下载大小 MB (默认: 8)")
+    parser.add_argument("--disk-mbps", type=float, default=400, help="模拟磁盘吞吐 MB/s (默认: 400)")
+    parser.add_argument("--disk-latency-ms", type=float, default=1.0, help="每次 write 固定延迟 ms (默认: 1)")
+    args = parser.parse_args()
+
+    print(
+        f"{args.downloads} 个并发下载 x {args.size_mb} MB, "
+        f"模拟磁盘 {args.disk_mbps} MB/s + {args.disk_latency_ms} ms/write"
+    )
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, fn in (("inline (旧)", download_inline), ("threaded (新)", download_threaded)):
+            r = asyncio.run(measure(fn, args, tmp_dir))
+            print(
+                f"{name:<14} 耗时 {r['elapsed']:.2f}s  事件循环延迟 "
+                f"p50={r['p50']:.2f}ms p99={r['p99']:.2f}ms max={r['max']:.2f}ms "
+                f"({r['ticks']} ticks)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+提取热路径微基准：在真实大小的分享页语料 (tests/corpus.py) 上离线回放
+
+用法:
+    python benchmarks/bench_extraction.py
+    python benchmarks/bench_extraction.py --repeat 9 --only parse
+
+每个阶段取多轮中的最小单次耗时 (us)，超过预算时以非 0 状态退出，
+可以放进 CI 以发现解析速度回退。预算按开发机实测值留出约 3 倍余量。
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import timeit
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx  # noqa: E402
+
+from douyin_core import (  # noqa: E402
+    extract_aweme_id,
+    extract_video_urls,
+    fetch_video_detail,
+    parse_router_data,
+    sanitize_filename,
+)
+from tests.corpus import load_corpus  # noqa: E402
+
+# extract_aweme_id 的输入：各种分享链接跳转后的最终 URL
+AWEME_URLS = [
+    "https://www.iesdouyin.com/share/video/7300000000000000001/?region=CN&mid=7300000000000000100&u_code=0&did=MS4wLjABAAAA&with_sec_did=1&titleType=title",
+    "https://www.douyin.com/video/7300000000000000001",
+    "https://www.iesdouyin.com/share/note/7300000000000000002/?region=CN",
+    "https://www.douyin.com/user/MS4wLjABAAAA?modal_id=7300000000000000003",
+]
+
+# sanitize_filename 的输入：带话题、表情、换行和非法字符的长描述
+TITLES = [
+    "语料标题 🎬 带 #话题 和 @提及 的描述 " * 3,
+    'a/b\\c:d*e?f"g<h>i|j\nk\rl\tm' * 4,
+    "  ...  ",
+]
+
+# 阶段名 -> 单次耗时预算 (us)
+BUDGETS = {
+    "parse_router_data[video]": 1200,
+    "parse_router_data[images]": 1200,
+    "parse_router_data[slides]": 4000,
+    "parse_router_data[deleted]": 600,
+    "extract_video_urls[video]": 25,
+    "extract_video_urls[images]": 50,
+    "extract_video_urls[slides]": 25,
+    "extract_aweme_id": 10,
+    "sanitize_filename": 25,
+    "fetch_video_detail[video]": 6000,
+}
+
+
+def _replay(html: str):
+    """把所有请求都回放为同一个分享页"""
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, text=html))
+    real = httpx.AsyncClient
+    return patch("douyin_core.httpx.AsyncClient", lambda *a, **kw: real(*a, **{**kw, "transport": transport}))
+
+
+def _parse_or_error(html: str):
+    try:
+        return parse_router_data(html)
+    except RuntimeError:
+        return None
+
+
+def stages(corpus: dict) -> dict:
+    """{阶段名: 无参可调用对象}"""
+    result = {}
+    for kind, html in corpus.items():
+        result[f"parse_router_data[{kind}]"] = lambda html=html: _parse_or_error(html)
+    for kind, html in corpus.items():
+        detail = _parse_or_error(html)
+        if detail is not None:
+            result[f"extract_video_urls[{kind}]"] = lambda detail=detail: extract_video_urls(detail)
+    result["extract_aweme_id"] = lambda: [extract_aweme_id(url) for url in AWEME_URLS]
+    result["sanitize_filename"] = lambda: [sanitize_filename(title) for title in TITLES]
+
+    loop = asyncio.new_event_loop()
+    video_url = "https://www.iesdouyin.com/share/video/7300000000000000001/"
+
+    def fetch():
+        with _replay(corpus["video"]):
+            return loop.run_until_complete(fetch_video_detail(video_url))
+
+    result["fetch_video_detail[video]"] = fetch
+    return result
+
+
+def measure(func, repeat: int) -> float:
+    """最小单次耗时 (us)：自动选择每轮调用次数，使单轮约 0.2 秒"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="提取热路径微基准")
+    parser.add_argument("--repeat", type=int, default=5, help="每个阶段的轮数 (默认: 5)")
+    parser.add_argument("--only", help="只运行名称包含该字符串的阶段")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    print("语料: " + ", ".join(f"{kind} {len(html.encode()) // 1024}KB" for kind, html in corpus.items()))
+
+    failed = False
+    print(f"{'阶段':<30} {'耗时':>12} {'预算':>10}")
+    for name, func in stages(corpus).items():
+        if args.only and args.only not in name:
+            continue
+        us = measure(func, args.repeat)
+        budget = BUDGETS[name]
+        failed |= us > budget
+        status = "OK" if us <= budget else "超出预算"
+        print(f"{name:<30} {us:>10.1f}us {budget:>8}us  [{status}]")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+分享页解析的事件循环延迟基准：事件循环内解析 vs 线程池 vs 进程池
+
+用法:
+    python benchmarks/bench_parse_offload.py
+    python benchmarks/bench_parse_offload.py --pages 64 --page-kb 800
+
+页面由 tests/mock_douyin 生成并用长描述、评论等填充到指定大小，
+并发解析时用 loop_lag.LoopLagMonitor 记录一个 5ms 周期定时器的实际延迟。
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import douyin_core  # noqa: E402
+from douyin_core import parse_router_data, configure_parse_offload, shutdown_parse_offload  # noqa: E402
+from loop_lag import LoopLagMonitor  # noqa: E402
+from tests.mock_douyin import make_video_post, router_data_html  # noqa: E402
+
+
+def make_page(size_kb: int) -> str:
+    """生成约 size_kb 大小的分享页（填充字段模拟真实页面中的推荐、评论等数据）"""
+    post = make_video_post("7000000000000000001", 1700000000)
+    post["comments"] = [
+        {"cid": str(i), "text": "评论内容" * 8, "user": {"nickname": f"用户{i}"}}
+        for i in range(size_kb * 1024 // 160)
+    ]
+    return router_data_html([post])
+
+
+async def measure(mode: str, html: str, pages: int) -> dict:
+    configure_parse_offload(mode, threshold=0)
+    monitor = LoopLagMonitor(interval=0.005)
+    tick_task = asyncio.create_task(monitor.run())
+    loop = asyncio.get_running_loop()
+    if douyin_core._parse_executor is not None:
+        # 预热执行器（进程池首次使用时启动子进程），不计入结果
+        await loop.run_in_executor(douyin_core._parse_executor, parse_router_data, html)
+        monitor.samples.clear()
+        monitor.max_lag = 0.0
+
+    async def parse_one():
+        if douyin_core._parse_executor is None:
+            parse_router_data(html)
+            await asyncio.sleep(0)
+        else:
+            await loop.run_in_executor(douyin_core._parse_executor, parse_router_data, html)
+
+    began = time.perf_counter()
+    await asyncio.gather(*(parse_one() for _ in range(pages)))
+    elapsed = time.perf_counter() - began
+    await asyncio.sleep(0.01)
+    tick_task.cancel()
+    shutdown_parse_offload()
+    return {"elapsed": elapsed, **monitor.stats()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分享页解析事件循环延迟基准")
+    parser.add_argument("--pages", type=int, default=32, help="并发解析的页面数 (默认: 32)")
+    parser.add_argument("--page-kb", type=int, default=400, help="每个页面大小 KB (默认: 400)")
+    args = parser.parse_args()
+
+    html = make_page(args.page_kb)
+    print(f"{args.pages} 个页面 x {len(html.encode()) // 1024} KB")
+    for mode in ("off", "thread", "process"):
+        r = asyncio.run(measure(mode, html, args.pages))
+        print(
+            f"{mode:<8} 耗时 {r['elapsed']:.2f}s  事件循环延迟 "
+            f"p50={r['p50_ms']:.2f}ms p99={r['p99_ms']:.2f}ms max={r['max_ms']:.2f}ms "
+            f"({r['samples']} ticks)"
+        )
+
+
+if __name__ == "__main__":
+    main()
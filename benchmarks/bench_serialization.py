@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+/api/parse 响应编码开销基准：dict + FastAPI 通用编码 vs VideoInfo + models.dumps
+
+用法:
+    python benchmarks/bench_serialization.py
+    python benchmarks/bench_serialization.py -n 50000
+
+旧路径: extract 返回 dict → jsonable_encoder → json.dumps (FastAPI 默认 JSONResponse)
+新路径: extract 返回 VideoInfo → models.dumps (orjson 可用时走 orjson)
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+import models  # noqa: E402
+from douyin_core import extract_video_urls  # noqa: E402
+
+DETAIL = {
+    "aweme_id": "7345678901234567890",
+    "desc": "测试视频标题 #话题 #抖音 这是一个比较长的描述文本，用于模拟真实作品" * 2,
+    "author": {"nickname": "TestAuthor", "uid": "123456"},
+    "video": {
+        "play_addr": {
+            "uri": "v0200fg10000abc123def456",
+            "url_list": [
+                f"https://v{i}-dy.douyinvod.com/aweme/v1/playwm/?video_id=v0200fg10000abc123def456&line={i}"
+                for i in range(3)
+            ],
+        },
+        "cover": {"url_list": ["https://p3-sign.douyinpic.com/tos-cn-i/cover.jpeg?x-expires=1700000000"]},
+        "duration": 15000,
+    },
+}
+
+
+def legacy_response(info) -> bytes:
+    """旧路径：dict 拷贝 + jsonable_encoder + json.dumps"""
+    info = {**info.to_dict()}
+    content = jsonable_encoder({"success": True, "data": info})
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def fast_response(info) -> bytes:
+    return models.dumps({"success": True, "data": info})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="响应编码基准")
+    parser.add_argument("-n", type=int, default=20000, help="每种路径的编码次数 (默认: 20000)")
+    args = parser.parse_args()
+
+    info = extract_video_urls(DETAIL)
+    assert json.loads(legacy_response(info)) == json.loads(fast_response(info))
+
+    backend = "orjson" if models.orjson is not None else "json (未安装 orjson)"
+    print(f"编码 {args.n} 次 /api/parse 响应，fast 后端: {backend}")
+    results = {}
+    for name, fn in (("legacy", legacy_response), ("fast", fast_response)):
+        seconds = min(timeit.repeat(lambda: fn(info), number=args.n, repeat=3))
+        results[name] = seconds / args.n * 1e6
+        print(f"{name:<8} {results[name]:.2f} µs/响应")
+    print(f"每个响应节省 {results['legacy'] - results['fast']:.2f} µs ({results['legacy'] / results['fast']:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
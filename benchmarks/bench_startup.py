@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+cli.py 启动开销基准 (基于 python -X importtime)
+
+用法:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10
+
+对每个场景统计 cli 自身触发的导入耗时（扣除解释器启动时 site 等固定导入）
+和整体墙钟时间，取多次运行的中位数。导入耗时超过预算时以非 0 状态退出，
+可以放进 CI 以发现启动速度回退。
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# (名称, 命令行参数, 导入耗时预算 ms)
+# 预算按实测中位数留约 10% 余量（解析路径实测约 160ms，大部分是 httpx / asyncio），
+# 新增的模块级导入会直接超出预算；确有必要时同步调整这里的数值
+SCENARIOS = [
+    ("--help", ["cli.py", "--help"], 15),
+    ("参数错误", ["cli.py"], 15),
+    ("解析路径导入", ["-c", "import cli, douyin_core"], 175),
+]
+
+
+def _parse_importtime(stderr: str) -> dict:
+    """返回 {顶层模块: 累计耗时 us}"""
+    result = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2]
+        # 顶层导入只有一个前导空格，嵌套导入有更多缩进
+        if name.startswith("  "):
+            continue
+        result[name.strip()] = int(parts[1])
+    return result
+
+
+def _run(args: list) -> tuple:
+    began = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    return time.perf_counter() - began, _parse_importtime(proc.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="cli.py 启动开销基准")
+    parser.add_argument("--runs", type=int, default=5, help="每个场景运行次数 (默认: 5)")
+    args = parser.parse_args()
+
+    # 解释器自身启动时的导入 (site、encodings 等) 不计入 cli 的开销
+    _, baseline = _run(["-c", "pass"])
+
+    failed = False
+    print(f"{'场景':<12} {'导入耗时':>10} {'预算':>8} {'墙钟':>10}  最慢的顶层导入")
+    for name, cmd, budget_ms in SCENARIOS:
+        import_ms, wall_ms, slowest = [], [], {}
+        for _ in range(args.runs):
+            wall, imports = _run(cmd)
+            own = {mod: us for mod, us in imports.items() if mod not in baseline}
+            import_ms.append(sum(own.values()) / 1000)
+            wall_ms.append(wall * 1000)
+            slowest = own
+        median = statistics.median(import_ms)
+        top = ", ".join(f"{m} {us / 1000:.1f}ms" for m, us in sorted(slowest.items(), key=lambda x: -x[1])[:3])
+        status = "OK" if median <= budget_ms else "超出预算"
+        failed |= median > budget_ms
+        print(
+            f"{name:<12} {median:>8.1f}ms {budget_ms:>6}ms {statistics.median(wall_ms):>8.1f}ms  "
+            f"{top}  [{status}]"
+        )
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
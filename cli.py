@@ -6,14 +6,64 @@
     python cli.py "分享文本或链接"
     python cli.py "https://v.douyin.com/xxx/" -o ./videos
     python cli.py "分享文本" --parse-only --json
+    python cli.py "作者主页链接" --author -o ./videos
+    python cli.py "作者主页链接" --watch -o ./archive
+    python cli.py --sync -o ./archive
+    python cli.py --export ndjson --input links.txt > posts.ndjson
 """
 
 import argparse
-import asyncio
 import sys
-import json
 
-from douyin_core import parse_and_download
+# 启动速度：--help 和参数错误不应加载 asyncio / httpx 等重量级模块，
+# 各功能用到的模块在参数解析之后按需导入（见 benchmarks/bench_startup.py）
+
+
+def run_export(args, parser):
+    """--export：批量解析输入中的链接，逐行输出 NDJSON / CSV"""
+    import asyncio
+    from export import export_links, parse_fields
+
+    fields = None
+    if args.fields:
+        try:
+            fields = parse_fields(args.fields)
+        except ValueError as e:
+            parser.error(str(e))
+
+    if args.input == "-":
+        source = sys.stdin
+    elif args.input:
+        source = open(args.input, encoding="utf-8")
+    else:
+        source = [args.share_text]
+
+    try:
+        stats = asyncio.run(
+            export_links(source, sys.stdout, fmt=args.export, fields=fields, concurrency=args.concurrency)
+        )
+    finally:
+        if source is not sys.stdin and hasattr(source, "close"):
+            source.close()
+    # 统计写到 stderr，不混入导出数据
+    print(f"导出完成: 成功 {stats['ok']} 条，失败 {stats['failed']} 条", file=sys.stderr)
+
+
+async def run_watchlist(args, manifest) -> list:
+    """--watch / --sync：维护关注列表并增量同步"""
+    from douyin_core import extract_url
+    from author import resolve_sec_uid
+    from watchlist import Watchlist, sync_author, sync_all
+
+    with Watchlist(args.output) as watchlist:
+        if args.share_text:
+            sec_uid = await resolve_sec_uid(args.share_text)
+            watchlist.add(sec_uid, extract_url(args.share_text))
+            print(f"已关注作者: {sec_uid}")
+            if not args.sync:
+                return [{"sec_uid": sec_uid, "watched": True}]
+            return [await sync_author(watchlist, sec_uid, args.output, manifest=manifest, faststart=args.faststart)]
+        return await sync_all(watchlist, args.output, manifest=manifest, faststart=args.faststart)
 
 
 def main():
@@ -24,14 +74,24 @@ def main():
 示例:
   %(prog)s "2.56 复制打开抖音，看看... https://v.douyin.com/xxx/"
   %(prog)s "https://v.douyin.com/xxx/" -o ./videos
+  %(prog)s "https://v.douyin.com/xxx/" -o ./videos --force
+  %(prog)s "https://v.douyin.com/xxx/" -o ./videos --faststart
+  %(prog)s "https://v.douyin.com/xxx/" -o ./music --audio-only
+  %(prog)s "https://v.douyin.com/xxx/" -o ./videos --max-size 20
   %(prog)s "https://v.douyin.com/xxx/" --parse-only
   %(prog)s "https://v.douyin.com/xxx/" --parse-only --json
+  %(prog)s "https://v.douyin.com/user_link/" --author -o ./author_videos
+  %(prog)s "https://v.douyin.com/user_link/" --watch -o ./archive
+  %(prog)s --sync -o ./archive
+  %(prog)s --export ndjson --input links.txt > posts.ndjson
+  cat links.txt | %(prog)s --export csv --input - --fields aweme_id,title,author
         """,
     )
 
     parser.add_argument(
         "share_text",
-        help="抖音分享文本或视频链接",
+        nargs="?",
+        help="抖音分享文本或视频链接 (--sync 时可省略)",
     )
     parser.add_argument(
         "-o", "--output",
@@ -43,6 +103,48 @@ def main():
         action="store_true",
         help="仅解析视频信息，不下载",
     )
+    parser.add_argument(
+        "--author",
+        action="store_true",
+        help="作者模式：输入为作者主页链接，下载该作者的全部作品",
+    )
+    parser.add_argument(
+        "--max-posts",
+        type=int,
+        default=None,
+        help="作者模式下最多处理的作品数 (默认: 全部)",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="将作者主页链接加入下载目录的关注列表",
+    )
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="增量同步关注列表中的作者，只下载上次同步之后的新作品",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="忽略下载清单，重新下载已下载过的作品",
+    )
+    parser.add_argument(
+        "--faststart",
+        action="store_true",
+        help="下载后校验视频完整性，并把 moov 移到文件开头以便边下边播",
+    )
+    parser.add_argument(
+        "--audio-only",
+        action="store_true",
+        help="只解析和下载背景音乐 / 原声，不下载视频",
+    )
+    parser.add_argument(
+        "--max-size",
+        type=float,
+        metavar="MB",
+        help="文件大小上限 (MB)：先探测各画质的大小，下载不超过上限的最高画质",
+    )
     parser.add_argument(
         "--json",
         action="store_true",
@@ -50,22 +152,109 @@ def main():
         help="以 JSON 格式输出结果",
     )
 
+    parser.add_argument(
+        "--export",
+        choices=("ndjson", "csv"),
+        help="批量导出模式：逐行解析链接，每解析完一条立即输出一行 (不下载)",
+    )
+    parser.add_argument(
+        "--input",
+        help="导出模式的输入文件，每行一个分享文本或链接，- 表示标准输入",
+    )
+    parser.add_argument(
+        "--fields",
+        help="导出的字段，逗号分隔 (默认: NDJSON 全部字段，CSV 常用字段)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="导出模式同时解析的链接数 (默认: 8)",
+    )
+
     args = parser.parse_args()
+    if args.export:
+        if not args.share_text and not args.input:
+            parser.error("导出模式需要 --input 或分享文本")
+        try:
+            run_export(args, parser)
+        except KeyboardInterrupt:
+            sys.exit(130)
+        except BrokenPipeError:
+            # 下游提前退出（如 head）：把 stdout 指向 /dev/null，避免退出时 flush 再次报错
+            import os
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.exit(1)
+        except Exception as e:
+            print(f"\n错误: {e}", file=sys.stderr)
+            sys.exit(1)
+        return
+    if args.input or args.fields:
+        parser.error("--input / --fields 只能与 --export 一起使用")
+    if not args.share_text and not args.sync:
+        parser.error("缺少分享文本或链接")
+    if args.audio_only and (args.author or args.watch or args.sync):
+        parser.error("--audio-only 只能用于单个作品")
+    if args.max_size is not None:
+        if args.author or args.watch or args.sync:
+            parser.error("--max-size 只能用于单个作品")
+        if args.max_size <= 0:
+            parser.error("--max-size 必须大于 0")
+
+    import asyncio
+    from models import dumps
 
+    manifest = None
     try:
+        if not args.parse_only and not args.audio_only:
+            # 下载目录中的清单记录已下载的作品，重复运行时跳过
+            # (仅解析时不需要 sqlite，走不加载清单的快速路径；清单按作品记录，音频模式不使用)
+            from manifest import Manifest
+            manifest = Manifest(args.output)
+
+        if args.watch or args.sync:
+            results = asyncio.run(run_watchlist(args, manifest))
+            if args.json_output:
+                print(dumps(results, indent=True).decode())
+            return
+
+        if args.author:
+            from author import crawl_author
+            summary = asyncio.run(
+                crawl_author(
+                    share_text=args.share_text,
+                    output_dir=args.output,
+                    only_parse=args.parse_only,
+                    manifest=manifest,
+                    force=args.force,
+                    max_posts=args.max_posts,
+                    faststart=args.faststart,
+                )
+            )
+            if args.json_output:
+                print(dumps(summary, indent=True).decode())
+            return
+
+        from douyin_core import parse_and_download
         info = asyncio.run(
             parse_and_download(
                 share_text=args.share_text,
                 output_dir=args.output,
                 only_parse=args.parse_only,
+                manifest=manifest,
+                force=args.force,
+                faststart=args.faststart,
+                audio_only=args.audio_only,
+                max_bytes=int(args.max_size * 1024 * 1024) if args.max_size else None,
             )
         )
 
         if args.json_output:
-            print(json.dumps(info, ensure_ascii=False, indent=2))
+            print(dumps(info, indent=True).decode())
         elif args.parse_only:
             content_type = info.get("type", "video")
-            print(f"\n--- {'图文' if content_type == 'images' else '视频'}信息 ---")
+            label = {"images": "图文", "audio": "音频"}.get(content_type, "视频")
+            print(f"\n--- {label}信息 ---")
             print(f"标题: {info['title']}")
             print(f"作者: {info['author']}")
             print(f"ID: {info['aweme_id']}")
@@ -75,6 +264,11 @@ def main():
                 print(f"视频地址:")
                 for i, u in enumerate(info["video_urls"], 1):
                     print(f"  [{i}] {u}")
+            elif content_type == "audio":
+                print(f"时长: {info['duration']}s")
+                print(f"音频地址:")
+                for i, u in enumerate(info["audio_urls"], 1):
+                    print(f"  [{i}] {u}")
             else:
                 print(f"图片数量: {len(info.get('image_urls', []))}")
                 print(f"图片地址:")
@@ -87,6 +281,9 @@ def main():
     except Exception as e:
         print(f"\n错误: {e}", file=sys.stderr)
         sys.exit(1)
+    finally:
+        if manifest is not None:
+            manifest.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,224 @@
+"""
+异步 DNS 缓存
+
+每次请求 aweme.snssdk.com、*.douyinvod.com、*.douyinpic.com、www.iesdouyin.com 都会重新解析域名。
+这里在 httpcore 的网络层前面加一层缓存：
+
+- 解析结果按 TTL 缓存；安装了 aiodns 时使用记录自带的 TTL，否则用 getaddrinfo + 默认 TTL
+- 同一域名的并发解析只发一次查询
+- 连接时依次尝试缓存的地址，全部失败时清掉该域名的缓存
+
+TLS 的 SNI 和证书校验仍使用原始域名（httpcore 在 start_tls 时使用请求 URL 的 host），
+替换的只是 TCP 连接的目标地址。
+
+环境变量中配置了代理 (HTTP(S)_PROXY / ALL_PROXY) 时，域名由代理解析，transport() 返回 None，
+由 httpx 按环境变量创建带代理的 transport（传入 transport 会让 httpx 忽略环境变量代理）。
+
+httpx 没有公开 network_backend 参数，缓存需要替换连接池的私有属性 (_install_backend)；
+requirements.txt 固定了 httpx / httpcore 的主版本，属性不存在时退回不带缓存的 transport。
+httpx / httpcore 在创建 transport 时才导入，不影响 cli 的启动时间。
+
+用法:
+    httpx.AsyncClient(transport=dns_cache.transport())
+"""
+
+import time
+import socket
+import functools
+import asyncio
+import ipaddress
+import urllib.request
+
+try:
+    import aiodns
+except ImportError:  # 可选依赖，没有时使用 getaddrinfo
+    aiodns = None
+
+# 没有 TTL 信息时的缓存时间（秒）
+DEFAULT_TTL = 60
+# TTL 上下限，避免过于频繁地解析或长期使用失效地址
+MIN_TTL = 5
+MAX_TTL = 3600
+# 最多缓存的域名数（CDN 子域名很多），超出时先清理过期的，再淘汰最早写入的
+MAX_ENTRIES = 1024
+
+
+def _is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+class DNSCache:
+    """
+    按 TTL 缓存的域名解析
+
+    Args:
+        default_ttl: 无 TTL 信息时的缓存秒数
+        use_aiodns: 安装了 aiodns 时是否使用（可获得真实 TTL）
+        max_entries: 最多缓存的域名数
+    """
+
+    def __init__(self, default_ttl: float = DEFAULT_TTL, use_aiodns: bool = True, max_entries: int = MAX_ENTRIES):
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.use_aiodns = use_aiodns and aiodns is not None
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._pending = {}
+        self._resolver = None
+
+    def stats(self) -> dict:
+        return {"hosts": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def invalidate(self, host: str = None):
+        """清除某个域名（或全部）的缓存"""
+        if host is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(host, None)
+
+    async def resolve(self, host: str, port: int = 443) -> list:
+        """返回 host 的地址列表（IP 字符串）"""
+        if _is_ip(host):
+            return [host]
+
+        entry = self._entries.get(host)
+        if entry is not None and entry[1] > time.monotonic():
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        # 同一域名的并发解析共用一次查询
+        task = self._pending.get(host)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(self._lookup(host, port))
+            self._pending[host] = task
+            task.add_done_callback(lambda t: self._lookup_done(host, t))
+        addresses, ttl = await asyncio.shield(task)
+        ttl = min(max(ttl, MIN_TTL), MAX_TTL)
+        self._store(host, addresses, time.monotonic() + ttl)
+        return addresses
+
+    def _store(self, host: str, addresses: list, expires: float):
+        # 重新插入到末尾，字典顺序即写入顺序
+        self._entries.pop(host, None)
+        self._entries[host] = (addresses, expires)
+        if len(self._entries) <= self.max_entries:
+            return
+        now = time.monotonic()
+        for key in [k for k, (_, exp) in self._entries.items() if exp <= now]:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+    def _lookup_done(self, host: str, task):
+        if self._pending.get(host) is task:
+            del self._pending[host]
+        if not task.cancelled():
+            task.exception()  # 所有等待者都已取消时，避免 "exception never retrieved" 警告
+
+    async def _lookup(self, host: str, port: int):
+        """实际解析，返回 (地址列表, TTL)"""
+        if self.use_aiodns:
+            try:
+                if self._resolver is None or self._resolver.loop is not asyncio.get_running_loop():
+                    self._resolver = aiodns.DNSResolver(loop=asyncio.get_running_loop())
+                records = await self._resolver.query(host, "A")
+                if records:
+                    return [r.host for r in records], min(r.ttl for r in records)
+            except Exception:
+                # 解析器出错（如只有 AAAA 记录）时回退到系统解析
+                pass
+
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        if not addresses:
+            raise OSError(f"无法解析域名: {host}")
+        return addresses, self.default_ttl
+
+
+class CachingNetworkBackend:
+    """在 httpcore 网络层 (httpcore.AsyncNetworkBackend 接口) 前加 DNS 缓存，其余操作委托给原始 backend"""
+
+    def __init__(self, cache: DNSCache, backend):
+        self.cache = cache
+        self._backend = backend
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        import httpcore
+
+        try:
+            addresses = await self.cache.resolve(host, port)
+        except OSError as e:
+            raise httpcore.ConnectError(str(e)) from e
+
+        last_error = None
+        for address in addresses:
+            try:
+                return await self._backend.connect_tcp(
+                    address, port, timeout=timeout, local_address=local_address, socket_options=socket_options
+                )
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                last_error = e
+        # 缓存的地址全部不可用，下次重新解析
+        self.cache.invalidate(host)
+        raise last_error
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float):
+        await self._backend.sleep(seconds)
+
+
+# 进程内共享的缓存
+DNS_CACHE = DNSCache()
+
+
+@functools.cache
+def _ssl_context():
+    import httpx
+
+    return httpx.create_ssl_context()
+
+
+def _env_proxies() -> bool:
+    """环境变量中是否配置了 HTTP(S) 代理（与 httpx trust_env 读取的变量相同）"""
+    proxies = urllib.request.getproxies()
+    return any(proxies.get(scheme) for scheme in ("http", "https", "all"))
+
+
+def _install_backend(t, cache: DNSCache) -> bool:
+    """把 DNS 缓存装到 transport 的连接池上（依赖 httpcore 连接池的私有属性）"""
+    pool = getattr(t, "_pool", None)
+    backend = getattr(pool, "_network_backend", None)
+    if backend is None:
+        return False
+    pool._network_backend = CachingNetworkBackend(cache, backend)
+    return True
+
+
+def transport(cache: DNSCache = None, **kwargs):
+    """
+    创建使用 DNS 缓存的 httpx transport
+
+    环境变量配置了代理时返回 None（httpx 使用环境变量代理），kwargs 中的连接参数 (limits 等)
+    需要同时传给 AsyncClient 才能在这种情况下生效。
+
+    Args:
+        cache: DNS 缓存，默认进程共享的 DNS_CACHE
+        **kwargs: 传给 httpx.AsyncHTTPTransport（如 limits、retries）
+    """
+    if _env_proxies():
+        return None
+    import httpx
+
+    # 加载 CA 证书较慢，所有 transport 共用一个 SSL context
+    kwargs.setdefault("verify", _ssl_context())
+    t = httpx.AsyncHTTPTransport(**kwargs)
+    _install_backend(t, cache or DNS_CACHE)
+    return t
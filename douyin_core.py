@@ -11,9 +11,22 @@
 
 import re
 import os
+import sys
 import json
+import queue
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import AsyncExitStack, suppress
+from urllib.parse import urljoin, urlsplit
 import httpx
 
+import dns_cache
+from retry_policy import PAGE, MEDIA, deadline
+from parse_cache import NEGATIVE_CACHE, PostUnavailableError
+from models import VideoInfo, ImagePostInfo, AudioInfo
+from mp4 import finalize_mp4
+
 # 从分享文本中提取 URL
 SHARE_URL_PATTERN = re.compile(r"https?://[^\s]+")
 
@@ -23,13 +36,17 @@ VIDEO_ID_PATTERNS = [
     re.compile(r"note/(\d+)"),
     re.compile(r"modal_id=(\d+)"),
     re.compile(r"[?&]vid=(\d+)"),
+    re.compile(r"slides/(\d+)"),
 ]
 
 # 从分享页提取 _ROUTER_DATA
 ROUTER_DATA_PATTERN = re.compile(r"window\._ROUTER_DATA\s*=\s*(\{.*?\})</script>", re.DOTALL)
 
-# 从 /share/slides/{id}/ 路径中提取 aweme_id
-SLIDES_PATH_PATTERN = re.compile(r"/share/slides/(\d+)")
+# 分享页地址：/share/slides/ 等 CSR 页面不含 _ROUTER_DATA，统一请求 /share/video/{id}/
+SHARE_VIDEO_URL = "https://www.iesdouyin.com/share/video/{aweme_id}/"
+
+# 跟随短链接重定向的最大次数
+MAX_REDIRECTS = 10
 
 # 移动端 UA (用于触发 iesdouyin 分享页，该页面包含视频数据)
 MOBILE_UA = (
@@ -37,12 +54,29 @@ MOBILE_UA = (
     "AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148"
 )
 
+# 下载媒体文件（视频、图片、音频）的请求头
+MEDIA_HEADERS = {
+    "User-Agent": MOBILE_UA,
+    "Referer": "https://www.douyin.com/",
+}
+
 DEFAULT_HEADERS = {
     "User-Agent": MOBILE_UA,
     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
     "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
 }
 
+# 磁盘写入：网络按 64 KiB 读取，攒够 WRITE_BUFFER_SIZE 再交给写线程一次写入
+WRITE_BUFFER_SIZE = 1024 * 1024
+# 写线程队列中最多积压的 buffer 数，超过后下载协程会等待（背压）
+WRITE_QUEUE_SIZE = 8
+
+# 分享页大小的估计（字节）：限速时在请求发出前按此计入带宽，页面更大时再补上差额
+SHARE_PAGE_ESTIMATE = 128 * 1024
+
+# 分享页解析 (正则 + json.loads) 放到线程池 / 进程池的页面大小阈值（字节），小页面仍在事件循环中直接解析
+PARSE_OFFLOAD_THRESHOLD = 64 * 1024
+
 
 def extract_url(share_text: str) -> str:
     """从分享文本中提取 URL"""
@@ -52,57 +86,197 @@ def extract_url(share_text: str) -> str:
     return match.group(0)
 
 
-async def resolve_share_url(url: str) -> str:
-    """跟随重定向，获取最终 URL"""
-    async with httpx.AsyncClient(
-        headers=DEFAULT_HEADERS,
-        follow_redirects=True,
-        timeout=15,
-    ) as client:
-        resp = await client.get(url)
-        resp.raise_for_status()
-        return str(resp.url)
+async def _follow_redirects(client, url: str, stop=None) -> str:
+    """
+    只读取 Location 头跟随重定向，不下载任何页面的 body
 
+    Args:
+        client: httpx.AsyncClient
+        url: 起始 URL
+        stop: 可选回调 stop(url) -> bool，返回 True 时不再请求该 URL，直接返回
 
-def extract_aweme_id(url: str) -> str:
-    """从完整 URL 中提取 aweme_id"""
+    Returns:
+        最终 URL（或 stop 命中的 URL）
+    """
+    async def hop(timeout):
+        resp = await client.send(
+            client.build_request("GET", url, timeout=timeout),
+            stream=True,
+            follow_redirects=False,
+        )
+        try:
+            if not resp.is_redirect:
+                resp.raise_for_status()
+                return None
+            return resp.headers["location"]
+        finally:
+            # 不读取 body 直接关闭
+            await resp.aclose()
+
+    for _ in range(MAX_REDIRECTS + 1):
+        if stop is not None and stop(url):
+            return url
+        location = await PAGE.call(hop)
+        if location is None:
+            return url
+        url = urljoin(url, location)
+    raise RuntimeError(f"重定向次数过多: {url}")
+
+
+async def resolve_share_url(url: str, stop=None) -> str:
+    """
+    跟随重定向，获取最终 URL（只读取响应头，不下载页面）
+
+    Args:
+        url: 分享链接
+        stop: 可选回调 stop(url) -> bool，中途的 URL 已满足需要时提前返回
+    """
+    with deadline(PAGE.total):
+        async with httpx.AsyncClient(
+            headers=DEFAULT_HEADERS,
+            timeout=PAGE.timeout(),
+            transport=dns_cache.transport(),
+        ) as client:
+            return await _follow_redirects(client, url, stop=stop)
+
+
+def _find_aweme_id(url: str):
+    """extract_aweme_id 的不抛异常版本，匹配不到返回 None"""
     for pattern in VIDEO_ID_PATTERNS:
         match = pattern.search(url)
         if match:
             return match.group(1)
-    raise ValueError(f"无法从 URL 中提取视频 ID: {url}")
+    return None
 
 
-async def fetch_video_detail(share_url: str) -> dict:
+def extract_aweme_id(url: str) -> str:
+    """从完整 URL 中提取 aweme_id"""
+    aweme_id = _find_aweme_id(url)
+    if aweme_id is None:
+        raise ValueError(f"无法从 URL 中提取视频 ID: {url}")
+    return aweme_id
+
+
+async def fetch_video_detail(share_url: str, throttle=None) -> dict:
     """
     通过移动端 UA 访问分享链接，从 iesdouyin.com 分享页面的
     _ROUTER_DATA 中提取视频详情。
 
-    如果重定向到 /share/slides/ 页面（CSR，无 _ROUTER_DATA），
-    则从 URL 中提取 aweme_id，改用 /share/video/ 路径重新请求。
+    短链接只读取重定向的 Location 头，一旦能从中提取出 aweme_id 就停止，
+    直接请求 /share/video/{id}/（/share/slides/ 等 CSR 页面不含 _ROUTER_DATA，
+    也不需要先下载一遍）。完整的 douyin.com/video/<id> 链接不发重定向请求。
 
     这种方式不需要 Cookie 或签名算法。
+
+    重定向和分享页请求共用 retry_policy.PAGE 的整体预算，可重试的错误按退避重试。
+
+    已删除、不可用的作品 (PostUnavailableError) 按分享链接和 aweme_id 记入
+    parse_cache.NEGATIVE_CACHE，缓存期内重复请求直接抛出同样的错误。
+
+    throttle: 可选的限速回调 async throttle(nbytes)，请求前按 SHARE_PAGE_ESTIMATE 取得令牌，
+        页面超出估计的部分在收到后补上
     """
-    async with httpx.AsyncClient(
-        headers=DEFAULT_HEADERS,
-        follow_redirects=True,
-        timeout=15,
-    ) as client:
-        resp = await client.get(share_url)
+    async def get_page(timeout):
+        resp = await client.get(page_url, timeout=timeout)
         resp.raise_for_status()
-        final_url = str(resp.url)
-
-        # /share/slides/ 页面是纯 CSR，不包含 _ROUTER_DATA
-        # 需要提取 aweme_id 后改用 /share/video/ 路径请求
-        slides_match = SLIDES_PATH_PATTERN.search(final_url)
-        if slides_match:
-            aweme_id = slides_match.group(1)
-            video_url = f"https://www.iesdouyin.com/share/video/{aweme_id}/"
-            resp = await client.get(video_url)
-            resp.raise_for_status()
+        return resp
+
+    aweme_id = _find_aweme_id(share_url)
+    cached = NEGATIVE_CACHE.get(share_url, aweme_id)
+    if cached is not None:
+        raise cached
+
+    if throttle is not None:
+        # 令牌在请求之前取得：限速约束的是这次解析，而不是下一次
+        await throttle(SHARE_PAGE_ESTIMATE)
+
+    with deadline(PAGE.total):
+        async with httpx.AsyncClient(
+            headers=DEFAULT_HEADERS,
+            follow_redirects=True,
+            timeout=PAGE.timeout(),
+            transport=dns_cache.transport(),
+        ) as client:
+            final_url = share_url
+            if aweme_id is None:
+                final_url = await _follow_redirects(client, share_url, stop=_find_aweme_id)
+                aweme_id = _find_aweme_id(final_url)
+                # 不同短链接可能指向同一个已知不可用的作品
+                cached = NEGATIVE_CACHE.get(aweme_id)
+                if cached is not None:
+                    NEGATIVE_CACHE.put(cached, share_url)
+                    raise cached
+
+            # 落地页无法识别 ID 时，退回到直接解析落地页
+            page_url = SHARE_VIDEO_URL.format(aweme_id=aweme_id) if aweme_id else final_url
+            resp = await PAGE.call(get_page)
+
+    if throttle is not None and len(resp.content) > SHARE_PAGE_ESTIMATE:
+        await throttle(len(resp.content) - SHARE_PAGE_ESTIMATE)
 
     html = resp.text
+    try:
+        # 阈值按响应字节数比较（与 DY_PARSE_OFFLOAD_MIN_KB 的单位一致），中文页面的字符数要少得多
+        if _parse_executor is not None and len(resp.content) >= _parse_threshold:
+            return await asyncio.get_running_loop().run_in_executor(_parse_executor, parse_router_data, html)
+        return parse_router_data(html)
+    except PostUnavailableError as e:
+        NEGATIVE_CACHE.put(e, share_url, aweme_id)
+        raise
+
+
+# 分享页解析的执行器，None 表示在事件循环中直接解析 (见 configure_parse_offload)
+_parse_executor = None
+_parse_threshold = PARSE_OFFLOAD_THRESHOLD
+
+
+def _gil_enabled() -> bool:
+    is_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_enabled() if is_enabled is not None else True
+
+
+def configure_parse_offload(mode: str = "off", threshold: int = PARSE_OFFLOAD_THRESHOLD, workers: int = None):
+    """
+    设置 fetch_video_detail 中分享页解析的执行位置
+
+    正则匹配和 json.loads 都持有 GIL，大页面（几百 KB）在事件循环中解析会卡住并发的代理流。
 
+    Args:
+        mode: "off" 在事件循环中解析；"process" 进程池；"thread" 线程池
+            （只有无 GIL 的 Python 才有效果）；"auto" 无 GIL 时用线程池，否则用进程池
+        threshold: 页面字节数达到该值才放到执行器中，小页面的调度开销大于解析本身
+        workers: 执行器的 worker 数，默认 min(4, CPU 数)
+    """
+    global _parse_executor, _parse_threshold
+    shutdown_parse_offload()
+    _parse_threshold = threshold
+    if mode == "auto":
+        mode = "process" if _gil_enabled() else "thread"
+    workers = workers or min(4, os.cpu_count() or 1)
+    if mode == "process":
+        import multiprocessing
+        # spawn：不 fork 持有写线程、事件循环的服务进程
+        _parse_executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+    elif mode == "thread":
+        _parse_executor = ThreadPoolExecutor(workers, thread_name_prefix="dy-parse")
+    elif mode != "off":
+        raise ValueError(f"未知的解析方式: {mode}")
+
+
+def shutdown_parse_offload():
+    """关闭解析执行器，恢复为在事件循环中解析"""
+    global _parse_executor
+    executor, _parse_executor = _parse_executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def parse_router_data(html: str) -> dict:
+    """
+    从分享页 HTML 中提取作品详情 (_ROUTER_DATA → videoInfoRes.item_list[0])
+
+    纯函数，不访问网络，可在进程池中执行。
+    """
     # 提取 _ROUTER_DATA
     match = ROUTER_DATA_PATTERN.search(html)
     if not match:
@@ -127,16 +301,53 @@ async def fetch_video_detail(share_url: str) -> dict:
             break
 
     if not video_info_res:
-        raise RuntimeError("未在页面数据中找到 videoInfoRes")
+        raise PostUnavailableError("未在页面数据中找到 videoInfoRes", "unavailable")
 
     item_list = video_info_res.get("item_list", [])
     if not item_list:
-        raise RuntimeError("视频列表为空，该视频可能已被删除或不可用")
+        raise PostUnavailableError("视频列表为空，该视频可能已被删除或不可用", "deleted")
 
     return item_list[0]
 
 
-def extract_video_urls(detail: dict) -> dict:
+# 签名地址中的过期时间：查询参数 (x-expires 等，unix 秒)，
+# 或 douyinvod 等视频 CDN 路径中的 16 进制时间戳 /<32 位签名>/<8 位过期时间>/video/...
+_EXPIRY_PARAMS = {"x-expires", "expires", "expire"}
+_EXPIRY_PATH_PATTERN = re.compile(r"/[0-9a-f]{32}/([0-9a-f]{8})/")
+# 路径中的 16 进制段只有落在该范围内才视为时间戳
+_EXPIRY_RANGE = (1_500_000_000, 4_000_000_000)
+
+
+def url_expires_at(url: str) -> int | None:
+    """签名地址的过期时间 (unix 秒)，地址中没有过期时间时返回 None"""
+    # 先用子串判断，大多数地址不需要跑正则（extract_video_urls 在热路径上）
+    if "expire" in url:
+        for param in url.partition("?")[2].split("&"):
+            key, _, value = param.partition("=")
+            if key in _EXPIRY_PARAMS and value.isdigit():
+                ts = int(value)
+                # 毫秒时间戳
+                return ts // 1000 if ts >= 10**12 else ts
+    match = _EXPIRY_PATH_PATTERN.search(url) if "/video/" in url else None
+    if match:
+        ts = int(match.group(1), 16)
+        if _EXPIRY_RANGE[0] < ts < _EXPIRY_RANGE[1]:
+            return ts
+    return None
+
+
+def _earliest_expiry(urls) -> int | None:
+    expiries = [ts for ts in map(url_expires_at, urls) if ts is not None]
+    return min(expiries) if expiries else None
+
+
+def _audio_urls(detail: dict) -> list:
+    """背景音乐 / 原声地址 (music.play_url)"""
+    play_url = (detail.get("music") or {}).get("play_url") or {}
+    return list(play_url.get("url_list") or [])
+
+
+def extract_video_urls(detail: dict, audio_only: bool = False) -> VideoInfo | ImagePostInfo | AudioInfo:
     """
     从视频/图文详情中提取内容信息。
 
@@ -144,7 +355,10 @@ def extract_video_urls(detail: dict) -> dict:
         - aweme_type == 2: 图文帖，提取 images 数组中的图片 URL
         - 其他: 视频帖，提取 play_addr 中的视频 URL
 
-    返回:
+    audio_only 时只提取背景音乐 / 原声 (music.play_url)，返回 type 为 "audio" 的 AudioInfo，
+    只需要音轨时不必下载整个视频。
+
+    返回 VideoInfo / ImagePostInfo (见 models.py)，可以像 dict 一样使用:
         {
             "type": "video" 或 "images",
             "title": 标题,
@@ -152,19 +366,35 @@ def extract_video_urls(detail: dict) -> dict:
             "aweme_id": ID,
             "video_urls": [无水印视频URL列表],
             "image_urls": [图片URL列表],
+            "audio_urls": [音频URL列表],
             "cover_url": 封面URL,
             "duration": 视频时长(秒),
+            "expires_at": 返回的签名地址中最早的过期时间 (unix 秒)，都不过期时为 None,
         }
     """
     author_info = detail.get("author", {})
     desc = detail.get("desc", "未知标题")
     aweme_type = detail.get("aweme_type", 0)
 
-    base_info = {
-        "title": desc,
-        "author": author_info.get("nickname", "未知作者"),
-        "aweme_id": str(detail.get("aweme_id", "")),
-    }
+    title = desc
+    author = author_info.get("nickname", "未知作者")
+    aweme_id = str(detail.get("aweme_id", ""))
+    audio_urls = _audio_urls(detail)
+
+    if audio_only:
+        music = detail.get("music") or {}
+        cover = (music.get("cover_hd") or music.get("cover_large") or {}).get("url_list") or [""]
+        # music.duration 单位为秒，没有时用视频时长
+        duration = music.get("duration") or detail.get("video", {}).get("duration", 0) // 1000
+        return AudioInfo(
+            title=title,
+            author=author,
+            aweme_id=aweme_id,
+            audio_urls=audio_urls,
+            cover_url=cover[0],
+            duration=duration,
+            expires_at=_earliest_expiry(audio_urls),
+        )
 
     # 图文帖
     if aweme_type == 2:
@@ -175,14 +405,15 @@ def extract_video_urls(detail: dict) -> dict:
             if url_list:
                 image_urls.append(url_list[0])
         cover_url = image_urls[0] if image_urls else ""
-        return {
-            **base_info,
-            "type": "images",
-            "video_urls": [],
-            "image_urls": image_urls,
-            "cover_url": cover_url,
-            "duration": 0,
-        }
+        return ImagePostInfo(
+            title=title,
+            author=author,
+            aweme_id=aweme_id,
+            image_urls=image_urls,
+            audio_urls=audio_urls,
+            cover_url=cover_url,
+            expires_at=_earliest_expiry([*image_urls, *audio_urls]),
+        )
 
     # 视频帖
     video = detail.get("video", {})
@@ -218,36 +449,238 @@ def extract_video_urls(detail: dict) -> dict:
     duration = video.get("duration", 0)
     cover = video.get("cover", {}).get("url_list", [""])[0]
 
-    return {
-        **base_info,
-        "type": "video",
-        "video_urls": unique_urls,
-        "image_urls": [],
-        "cover_url": cover,
-        "duration": duration // 1000 if duration > 1000 else duration,
-    }
+    return VideoInfo(
+        title=title,
+        author=author,
+        aweme_id=aweme_id,
+        video_urls=unique_urls,
+        audio_urls=audio_urls,
+        cover_url=cover,
+        duration=duration // 1000 if duration > 1000 else duration,
+        expires_at=_earliest_expiry([*unique_urls, *audio_urls, cover]),
+    )
+
+
+class _FileWriter:
+    """
+    在独立线程中写文件，避免 f.write() 阻塞事件循环。
+
+    事件循环一侧只做内存拼接，攒满 buffer_size 后放入有界队列交给写线程。
+    写线程跟不上时 write() 会挂起等待，对网络读取形成背压，不会无限占用内存。
+
+    Args:
+        path: 目标文件路径
+        buffer_size: 合并写入的块大小
+        queue_size: 队列中最多积压的块数
+        preallocate: 预分配的字节数 (0 表示不预分配)，结束时按实际写入量截断
+        fsync: 关闭前是否 fsync 落盘
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        buffer_size: int = WRITE_BUFFER_SIZE,
+        queue_size: int = WRITE_QUEUE_SIZE,
+        preallocate: int = 0,
+        fsync: bool = False,
+    ):
+        self.path = path
+        self.written = 0
+        self._buffer_size = buffer_size
+        self._preallocate = preallocate
+        self._fsync = fsync
+        self._buf = bytearray()
+        self._slots = asyncio.Semaphore(queue_size)
+        self._queue = queue.SimpleQueue()
+        self._error = None
+        self._loop = None
+        self._done = None
+
+    async def __aenter__(self):
+        self._loop = asyncio.get_running_loop()
+        self._done = self._loop.create_future()
+        threading.Thread(target=self._run, name="dy-file-writer", daemon=True).start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                await self._flush()
+        finally:
+            # 无论成功与否都要让写线程退出并关闭文件
+            self._queue.put(None)
+            await self._done
+        if exc_type is None and self._error:
+            raise self._error
+        return False
+
+    async def write(self, data: bytes):
+        if self._error:
+            raise self._error
+        self._buf += data
+        if len(self._buf) >= self._buffer_size:
+            await self._flush()
+
+    async def _flush(self):
+        if not self._buf:
+            return
+        await self._slots.acquire()
+        if self._error:
+            self._slots.release()
+            raise self._error
+        self._queue.put(bytes(self._buf))
+        self._buf.clear()
+
+    # ---- 以下在写线程中执行 ----
+
+    def _run(self):
+        error = None
+        f = None
+        try:
+            f = open(self.path, "wb")
+            if self._preallocate > 0 and hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(f.fileno(), 0, self._preallocate)
+        except OSError as e:
+            error = e
+
+        while True:
+            data = self._queue.get()
+            if data is None:
+                break
+            # 出错后继续消费队列，只释放槽位，保证事件循环侧不会卡住
+            if error is None:
+                try:
+                    f.write(data)
+                    self.written += len(data)
+                except OSError as e:
+                    error = e
+            self._notify(self._on_chunk_done, error)
+
+        if f is not None:
+            try:
+                if error is None:
+                    if self._preallocate > 0 and self.written != self._preallocate:
+                        f.truncate(self.written)
+                    f.flush()
+                    if self._fsync:
+                        os.fsync(f.fileno())
+            except OSError as e:
+                error = e
+            finally:
+                f.close()
+        self._notify(self._on_finished, error)
+
+    def _notify(self, callback, *args):
+        try:
+            self._loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # 事件循环已关闭（例如进程退出时被取消），无需再通知
+            pass
+
+    # ---- 以下在事件循环中执行 ----
+
+    def _on_chunk_done(self, error):
+        if error and not self._error:
+            self._error = error
+        self._slots.release()
+
+    def _on_finished(self, error):
+        if error and not self._error:
+            self._error = error
+        if not self._done.done():
+            self._done.set_result(None)
+
+
+async def download_video(
+    url: str,
+    save_path: str,
+    *,
+    preallocate: bool = False,
+    fsync: bool = False,
+    reserve=None,
+    throttle=None,
+    postprocess=None,
+    retry=MEDIA,
+) -> str:
+    """
+    下载视频到本地文件
+
+    磁盘写入在后台线程完成 (见 _FileWriter)，不会阻塞事件循环。
 
+    Args:
+        url: 视频地址
+        save_path: 保存路径
+        preallocate: 按 content-length 预分配磁盘空间，减少碎片
+        fsync: 写完后 fsync 落盘
+        reserve: 可选的磁盘配额回调 async reserve(content_length, save_path)，
+            在收到响应头、写入文件之前调用，可抛异常拒绝下载；同一 save_path 的预留应互相替换
+            (见 storage.DiskBudget.reserver)。回调有 try_reserve 方法时，配额需要排队则先关闭上游响应，
+            拿到配额后重新请求，连接不会在排队期间空闲到读超时
+        throttle: 可选的限速回调 async throttle(nbytes)，每收到一块数据调用一次
+            (见 bandwidth.BandwidthScheduler)
+        postprocess: 可选的后处理 postprocess(save_path, content_length)，写完后在线程中调用，
+            抛异常表示文件不可用 (见 mp4.finalize_mp4)
+        retry: 重试与超时策略 (见 retry_policy)，默认 retry_policy.MEDIA
+    """
+    async def open_stream(timeout):
+        stack = AsyncExitStack()
+        resp = await stack.enter_async_context(client.stream("GET", url, timeout=timeout))
+        try:
+            resp.raise_for_status()
+        except BaseException:
+            await stack.aclose()
+            raise
+        return stack, resp
+
+    async def reserve_space(stack, resp):
+        total = int(resp.headers.get("content-length", 0))
+        try_reserve = getattr(reserve, "try_reserve", None)
+        if try_reserve is not None:
+            if try_reserve(total, save_path):
+                return stack, resp
+            # 排队期间不占用上游连接
+            await stack.aclose()
+            await reserve(total, save_path)
+            stack, resp = await retry.call(open_stream)
+            # 重新打开后大小可能变化：已经持有预留，不能再排队等待（会与其他请求互相等待）
+            total = int(resp.headers.get("content-length", 0))
+            if not try_reserve(total, save_path):
+                from storage import DiskBudgetExceeded
 
-async def download_video(url: str, save_path: str) -> str:
-    """下载视频到本地文件"""
-    headers = {
-        "User-Agent": MOBILE_UA,
-        "Referer": "https://www.douyin.com/",
-    }
+                await stack.aclose()
+                raise DiskBudgetExceeded("磁盘配额已满，请稍后重试")
+            return stack, resp
+        try:
+            await reserve(total, save_path)
+        except BaseException:
+            await stack.aclose()
+            raise
+        return stack, resp
 
     async with httpx.AsyncClient(
-        headers=headers,
+        headers=MEDIA_HEADERS,
         follow_redirects=True,
-        timeout=120,
+        timeout=retry.timeout(),
+        transport=dns_cache.transport(),
     ) as client:
-        async with client.stream("GET", url) as resp:
-            resp.raise_for_status()
+        # 只重试收到响应头之前的失败；开始写文件后出错交给调用方换下一个地址
+        stack, resp = await retry.call(open_stream)
+        if reserve is not None:
+            stack, resp = await reserve_space(stack, resp)
+        async with stack:
             total = int(resp.headers.get("content-length", 0))
             downloaded = 0
 
-            with open(save_path, "wb") as f:
+            async with _FileWriter(
+                save_path,
+                preallocate=total if preallocate else 0,
+                fsync=fsync,
+            ) as writer:
                 async for chunk in resp.aiter_bytes(chunk_size=65536):
-                    f.write(chunk)
+                    if throttle is not None:
+                        await throttle(len(chunk))
+                    await writer.write(chunk)
                     downloaded += len(chunk)
                     if total > 0:
                         pct = downloaded / total * 100
@@ -256,9 +689,26 @@ async def download_video(url: str, save_path: str) -> str:
             if total > 0:
                 print()  # 换行
 
+    if postprocess is not None:
+        # 后处理（如 MP4 校验与重排）涉及整文件读写，放到线程中执行
+        await asyncio.to_thread(postprocess, save_path, total)
+
     return save_path
 
 
+# 音频文件扩展名，地址中识别不出时使用第一个
+AUDIO_EXTENSIONS = (".mp3", ".m4a", ".aac")
+
+
+def audio_extension(url: str) -> str:
+    """音频地址对应的文件扩展名"""
+    path = urlsplit(url).path.lower()
+    for ext in AUDIO_EXTENSIONS:
+        if path.endswith(ext):
+            return ext
+    return AUDIO_EXTENSIONS[0]
+
+
 def sanitize_filename(name: str, max_len: int = 80) -> str:
     """清理文件名中的非法字符"""
     name = re.sub(r'[\\/:*?"<>|\n\r\t]', "_", name)
@@ -268,10 +718,47 @@ def sanitize_filename(name: str, max_len: int = 80) -> str:
     return name or "douyin_video"
 
 
+def _skipped_info(record: dict) -> dict:
+    """由下载清单记录构造返回值（已下载，跳过）"""
+    info = dict(record["info"])
+    info["downloaded"] = True
+    info["skipped"] = True
+    print(f"已下载过，跳过: {', '.join(record['paths'])}")
+    return info
+
+
+_TYPE_LABELS = {"video": "视频", "images": "图文", "audio": "音频"}
+
+
+async def select_within_budget(info, max_bytes: int, throttle=None):
+    """
+    探测视频 / 音频候选地址的大小，只保留不超过 max_bytes 的地址（保持画质顺序）
+
+    在 info 中写入 size（选中地址的大小）。图文帖不处理。
+    throttle: 可选的限速回调 async throttle(nbytes)，探测请求计入带宽
+
+    Raises:
+        probe.NoCandidateFits: 没有符合条件的地址
+    """
+    from probe import select_within
+
+    field = "audio_urls" if info.get("type") == "audio" else "video_urls"
+    fitting = await select_within(info[field], max_bytes, headers=MEDIA_HEADERS, throttle=throttle)
+    info[field] = [r.url for r in fitting]
+    info["size"] = fitting[0].size
+    print(f"      不超过 {max_bytes / 1024 / 1024:.1f}MB 的地址: {len(fitting)} 个，选中 {fitting[0].size} bytes")
+    return fitting
+
+
 async def parse_and_download(
     share_text: str,
     output_dir: str = ".",
     only_parse: bool = False,
+    manifest=None,
+    force: bool = False,
+    faststart: bool = False,
+    audio_only: bool = False,
+    max_bytes: int = None,
 ) -> dict:
     """
     完整流程：解析 → 获取详情 → 下载
@@ -280,6 +767,12 @@ async def parse_and_download(
         share_text: 抖音分享文本或链接
         output_dir: 下载目录
         only_parse: 仅解析不下载
+        manifest: 下载清单 (manifest.Manifest)，已下载过的作品直接跳过
+        force: 忽略下载清单，强制重新下载
+        faststart: 下载后校验 MP4 并把 moov 移到文件开头 (见 mp4.finalize_mp4)
+        audio_only: 只解析和下载背景音乐 / 原声（下载清单按作品记录，音频模式不使用）
+        max_bytes: 文件大小预算：先并发探测各候选地址的大小，只保留不超过预算的地址
+            (按画质从高到低)，没有符合的地址时抛出 probe.NoCandidateFits
 
     Returns:
         视频信息字典
@@ -288,26 +781,81 @@ async def parse_and_download(
     url = extract_url(share_text)
     print(f"[1/4] 提取到链接: {url}")
 
+    use_manifest = manifest is not None and not only_parse and not audio_only
+    if use_manifest and not force:
+        # 链接已知时，连分享页都不需要请求
+        record = manifest.lookup(url)
+        if record:
+            return _skipped_info(record)
+
     # 2. 获取视频详情 (直接从分享页提取，不需要额外 API)
     print("[2/4] 正在解析视频信息...")
     detail = await fetch_video_detail(url)
-    info = extract_video_urls(detail)
+    info = extract_video_urls(detail, audio_only=audio_only)
     aweme_id = info["aweme_id"]
     content_type = info.get("type", "video")
     print(f"[3/4] ID: {aweme_id}")
-    print(f"      类型: {'图文' if content_type == 'images' else '视频'}")
+    print(f"      类型: {_TYPE_LABELS.get(content_type, '视频')}")
     print(f"      标题: {info['title']}")
     print(f"      作者: {info['author']}")
     if content_type == "video":
         print(f"      时长: {info['duration']}s")
         print(f"      找到 {len(info['video_urls'])} 个视频地址")
+    elif content_type == "audio":
+        print(f"      时长: {info['duration']}s")
+        print(f"      找到 {len(info['audio_urls'])} 个音频地址")
     else:
         print(f"      找到 {len(info['image_urls'])} 张图片")
 
+    if use_manifest:
+        manifest.link(url, aweme_id)
+        if not force:
+            record = manifest.get(aweme_id)
+            if record:
+                return _skipped_info(record)
+
+    if max_bytes is not None and content_type in ("video", "audio"):
+        await select_within_budget(info, max_bytes)
+
     if only_parse:
         info["downloaded"] = False
         return info
 
+    return await download_post(
+        info,
+        output_dir,
+        manifest=manifest if use_manifest else None,
+        share_url=url,
+        faststart=faststart,
+    )
+
+
+async def download_post(
+    info: dict,
+    output_dir: str = ".",
+    base_name: str = None,
+    manifest=None,
+    share_url: str = "",
+    faststart: bool = False,
+) -> dict:
+    """
+    下载已解析的作品（extract_video_urls 的返回值）
+
+    视频（音频）依次尝试 video_urls (audio_urls) 中的地址直到成功；图文逐张下载图片。
+    成功后在 info 中写入 save_path / save_paths 和 downloaded。
+
+    Args:
+        info: 作品信息
+        output_dir: 下载目录
+        base_name: 文件名（不含扩展名），默认 "作者_标题"
+        manifest: 下载清单，成功后记录
+        share_url: 分享链接，随清单一起记录
+        faststart: 视频下载后校验 MP4 结构并重排为 fast-start，结构损坏视为该地址下载失败
+    """
+    content_type = info.get("type", "video")
+    if base_name is None:
+        base_name = sanitize_filename(f"{info['author']}_{info['title']}")
+
     os.makedirs(output_dir, exist_ok=True)
 
     if content_type == "images":
@@ -315,7 +863,6 @@ async def parse_and_download(
         if not info["image_urls"]:
             raise RuntimeError("未找到可下载的图片地址")
 
-        base_name = sanitize_filename(f"{info['author']}_{info['title']}")
         saved_paths = []
         for i, img_url in enumerate(info["image_urls"], 1):
             ext = ".webp"
@@ -333,31 +880,43 @@ async def parse_and_download(
 
         info["save_paths"] = saved_paths
         info["downloaded"] = True
+        if manifest is not None:
+            await manifest.record(info, saved_paths, share_url=share_url)
         print(f"下载完成: 共 {len(saved_paths)} 张图片")
         return info
 
-    # 视频帖
-    if not info["video_urls"]:
-        raise RuntimeError("未找到可下载的视频地址")
+    # 视频帖 / 音频
+    if content_type == "audio":
+        urls, noun, postprocess = info["audio_urls"], "音频", None
+    else:
+        urls, noun = info["video_urls"], "视频"
+        postprocess = finalize_mp4 if faststart else None
+    if not urls:
+        raise RuntimeError(f"未找到可下载的{noun}地址")
 
     # 4. 下载视频
-    filename = sanitize_filename(f"{info['author']}_{info['title']}") + ".mp4"
-    save_path = os.path.join(output_dir, filename)
-
-    print(f"[4/4] 正在下载到: {save_path}")
+    print(f"[4/4] 正在下载到: {output_dir}")
 
-    # 尝试多个 URL，直到成功
+    # 尝试多个 URL，直到成功；音频的扩展名取自当前尝试的地址
     last_error = None
-    for video_url in info["video_urls"]:
+    for video_url in urls:
+        ext = audio_extension(video_url) if content_type == "audio" else ".mp4"
+        save_path = os.path.join(output_dir, base_name + ext)
         try:
-            await download_video(video_url, save_path)
+            await download_video(video_url, save_path, postprocess=postprocess)
             info["save_path"] = save_path
             info["downloaded"] = True
+            if manifest is not None:
+                await manifest.record(info, [save_path], url=video_url, share_url=share_url)
             print(f"下载完成: {save_path}")
             return info
         except Exception as e:
             last_error = e
+            if content_type == "audio":
+                # 下一个地址的扩展名可能不同，不会覆盖这次留下的残缺文件
+                with suppress(FileNotFoundError):
+                    os.remove(save_path)
             print(f"该地址下载失败，尝试下一个...")
             continue
 
-    raise RuntimeError(f"所有视频地址均下载失败: {last_error}")
+    raise RuntimeError(f"所有{noun}地址均下载失败: {last_error}")
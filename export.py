@@ -0,0 +1,153 @@
+"""
+批量解析导出 (NDJSON / CSV)
+
+逐行读取分享链接，有限并发解析，每解析完一条立即写出一行并 flush，
+下游工具（jq、数据导入脚本等）可以在运行过程中边读边处理：
+
+- 输入按需读取，读取队列有界：内存占用与输入规模无关
+- 结果按完成顺序写出，每行带上原始输入 (input) 便于对应
+- 单条解析失败不中断整个导出，该行记录 error
+
+用法:
+    python cli.py --export ndjson --input links.txt > posts.ndjson
+    cat links.txt | python cli.py --export csv --input - --fields aweme_id,title,author
+"""
+
+import csv
+import asyncio
+import dataclasses
+
+from douyin_core import extract_url, fetch_video_detail, extract_video_urls
+from models import PostInfo, dumps
+
+# 可导出的字段（PostInfo 的数据字段）
+FIELDS = tuple(f.name for f in dataclasses.fields(PostInfo) if f.name != "extra")
+# CSV 默认导出的字段
+DEFAULT_CSV_FIELDS = ("aweme_id", "type", "title", "author", "duration", "cover_url", "video_urls", "image_urls")
+# 默认并发解析数
+DEFAULT_CONCURRENCY = 8
+
+
+def parse_fields(value: str) -> tuple:
+    """解析 --fields 参数（逗号分隔），未知字段抛 ValueError"""
+    fields = tuple(f.strip() for f in value.split(",") if f.strip())
+    unknown = [f for f in fields if f not in FIELDS]
+    if unknown:
+        raise ValueError(f"未知字段: {', '.join(unknown)}（可选: {', '.join(FIELDS)}）")
+    if not fields:
+        raise ValueError("--fields 不能为空")
+    return fields
+
+
+def _next_line(lines):
+    """读取下一条有效输入，忽略空行和 # 注释；读完返回 None"""
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            return line
+    return None
+
+
+class _NdjsonWriter:
+    def __init__(self, out, fields=None):
+        self.out = out
+        self.fields = fields
+
+    def write(self, text: str, info=None, error: Exception = None):
+        record = {"input": text}
+        if error is not None:
+            record["error"] = str(error)
+        elif self.fields:
+            record.update((name, info[name]) for name in self.fields)
+        else:
+            record.update(info.to_dict())
+        self.out.write(dumps(record).decode() + "\n")
+
+
+class _CsvWriter:
+    """列为 input、所选字段、error；列表字段以空格连接"""
+
+    def __init__(self, out, fields=None):
+        self.fields = fields or DEFAULT_CSV_FIELDS
+        self._writer = csv.writer(out)
+        self._writer.writerow(["input", *self.fields, "error"])
+
+    def write(self, text: str, info=None, error: Exception = None):
+        if error is not None:
+            self._writer.writerow([text, *([""] * len(self.fields)), str(error)])
+            return
+        row = [text]
+        for name in self.fields:
+            value = info[name]
+            row.append(" ".join(value) if isinstance(value, list) else value)
+        row.append("")
+        self._writer.writerow(row)
+
+
+WRITERS = {"ndjson": _NdjsonWriter, "csv": _CsvWriter}
+
+
+async def _parse(text: str):
+    url = extract_url(text)
+    detail = await fetch_video_detail(url)
+    return extract_video_urls(detail)
+
+
+async def export_links(
+    lines,
+    out,
+    fmt: str = "ndjson",
+    fields: tuple = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> dict:
+    """
+    解析 lines 中的每个分享链接，结果逐行写入 out
+
+    Args:
+        lines: 可迭代的输入行（文件对象、sys.stdin 等），按需读取
+        out: 文本输出流，每条记录写完后 flush
+        fmt: "ndjson" 或 "csv"
+        fields: 导出的字段，None 时 NDJSON 导出全部字段、CSV 导出 DEFAULT_CSV_FIELDS
+        concurrency: 同时解析的链接数
+
+    Returns:
+        {"ok": 成功条数, "failed": 失败条数}
+    """
+    writer = WRITERS[fmt](out, fields)
+    out.flush()
+    stats = {"ok": 0, "failed": 0}
+    concurrency = max(1, concurrency)
+    # 最多预读 concurrency 条，解析跟不上时暂停读取输入
+    queue = asyncio.Queue(maxsize=concurrency)
+    lines = iter(lines)
+
+    async def read_input():
+        # 读 stdin 可能阻塞，放到线程中
+        while (text := await asyncio.to_thread(_next_line, lines)) is not None:
+            await queue.put(text)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def worker():
+        while (text := await queue.get()) is not None:
+            try:
+                info = await _parse(text)
+            except Exception as e:
+                stats["failed"] += 1
+                writer.write(text, error=e)
+            else:
+                stats["ok"] += 1
+                writer.write(text, info)
+            out.flush()
+
+    tasks = [asyncio.create_task(read_input())]
+    tasks += [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        # 读输入或写输出出错（如下游关闭管道）时立即停止
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+    return stats
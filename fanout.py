@@ -0,0 +1,458 @@
+"""
+相同代理地址的请求合并 (fan-out)
+
+视频被分享到群里时，很多浏览器会在同一时刻请求同一个 /api/proxy?url=...，
+每个请求各自打开一个上游流。这里按规范化后的 URL 合并：
+
+- 第一个请求发起上游下载 (经 upstream.UpstreamPool，占一个连接名额)
+- 之后的请求挂到同一次下载上：先从缓冲区重放已收到的数据，再跟随实时数据
+- 只有前 replay_limit 字节可以重放 (加入窗口)：窗口内缓冲区保留从头开始的全部数据，
+  内存超过 memory_limit 后落盘到 spill_dir 下的临时文件（按 replay_limit 计入磁盘配额，
+  配额不足时提前关闭窗口）；超出窗口后不再接受新读者（之后的请求重新发起），
+  缓冲区只保留最慢读者之后的数据，单个读者时相当于直通
+- 上游下载最多领先最快的读者 readahead 字节；窗口关闭后最慢的读者落后超过 memory_limit 时
+  上游也暂停，慢客户端不会让缓冲区无限增长，保留 upstream 模块的背压语义
+- 所有读者都断开时取消上游下载；下载结束后从表中移除，之后的请求重新发起
+
+预热 (warm)：/api/parse 之后客户端几乎总会紧接着代理第一个视频或图片地址。
+warm() 在后台以一个"预热读者"打开第一个可用的候选地址，只读取前 warm_bytes 字节
+（读者级的 readahead，到量后上游暂停），保留 warm_hold 秒或直到真实请求加入；
+随后的 /api/proxy 直接从缓冲区开始发送，不再等待跳转和首字节。
+同时进行的预热数有上限，连接池繁忙时不预热。
+"""
+
+import os
+import asyncio
+import tempfile
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from upstream import CHUNK_SIZE
+
+# 内存缓冲上限，超过后落盘
+MEMORY_LIMIT = 4 * 1024 * 1024
+
+# 可以重放给后加入读者的字节数（加入窗口）
+REPLAY_LIMIT = 16 * 1024 * 1024
+
+# 上游下载最多领先最快读者的字节数
+READAHEAD = 1024 * 1024
+
+# 预热读取的字节数、预热结果保留的秒数
+WARM_BYTES = 256 * 1024
+WARM_HOLD = 15
+
+
+def normalize_url(url: str) -> str:
+    """规范化 URL 作为合并键：scheme/host 小写，查询参数排序，去掉 fragment"""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", query, ""))
+
+
+class SpillBuffer:
+    """
+    按偏移读写的缓冲区，保存 [start, size) 区间的数据
+
+    append(data, spill=True) 时内存中的数据超过 memory_limit 后整体转存到 spill_dir 下的
+    匿名临时文件（创建后即从目录中删除，进程退出时由系统回收），之后 spill=True 的数据继续写入文件；
+    spill=False 的数据写入内存。trim(offset) 丢弃 offset 之前的数据，文件中的数据都被越过后关闭文件。
+
+    文件用 pread/pwrite 按偏移读写，读写在线程中执行，不阻塞事件循环。
+    关闭文件会等到进行中的读写线程结束，避免文件描述符在使用中被关闭后复用。
+
+    Args:
+        on_close: 临时文件关闭后调用（归还磁盘配额）
+    """
+
+    def __init__(self, memory_limit: int = MEMORY_LIMIT, spill_dir: str = None, on_close=None):
+        self.memory_limit = memory_limit
+        self.spill_dir = spill_dir
+        self.on_close = on_close
+        self.start = 0
+        self.size = 0
+        self._memory = bytearray()
+        # 内存保存 [_memory_start, size)，文件保存 [_file_start, _file_end)
+        self._memory_start = 0
+        self._file = None
+        self._file_start = 0
+        self._file_end = 0
+        self._io = set()
+        # 等待读写线程结束后关闭的文件
+        self._closing = []
+
+    @property
+    def spilled(self) -> bool:
+        return self._file is not None
+
+    @property
+    def in_memory(self) -> int:
+        return len(self._memory)
+
+    def would_spill(self, n: int) -> bool:
+        """再追加 n 字节是否会开始落盘"""
+        return self._file is None and len(self._memory) + n > self.memory_limit
+
+    async def _run(self, func, *args):
+        """在线程中执行文件读写；调用方被取消时线程仍会执行完，期间不关闭文件"""
+        fut = asyncio.ensure_future(asyncio.to_thread(func, *args))
+        self._io.add(fut)
+        fut.add_done_callback(self._io_done)
+        return await asyncio.shield(fut)
+
+    def _io_done(self, fut):
+        self._io.discard(fut)
+        if not fut.cancelled():
+            fut.exception()
+        if not self._io:
+            while self._closing:
+                self._close_file(self._closing.pop())
+
+    async def append(self, data: bytes, spill: bool = True):
+        if spill and self.would_spill(len(data)):
+            os.makedirs(self.spill_dir or tempfile.gettempdir(), exist_ok=True)
+            f = tempfile.TemporaryFile(dir=self.spill_dir)
+            try:
+                # 转存期间读者仍从内存读取
+                await self._run(os.pwrite, f.fileno(), bytes(self._memory), 0)
+            except BaseException:
+                self._defer_close(f)
+                raise
+            self._file = f
+            self._file_start = self._memory_start
+            self._file_end = self.size
+            self._memory = bytearray()
+            self._memory_start = self.size
+        if spill and self._file is not None and self._file_end == self.size:
+            await self._run(os.pwrite, self._file.fileno(), data, self._file_end - self._file_start)
+            self._file_end += len(data)
+            self._memory_start = self._file_end
+        else:
+            self._memory += data
+        self.size += len(data)
+
+    async def read(self, offset: int, n: int) -> bytes:
+        if self._file is not None and offset < self._file_end:
+            n = min(n, self._file_end - offset)
+            return await self._run(os.pread, self._file.fileno(), n, offset - self._file_start)
+        n = min(n, self.size - offset)
+        index = offset - self._memory_start
+        return bytes(self._memory[index:index + n])
+
+    def trim(self, offset: int):
+        """丢弃 offset 之前的数据（所有读者都已越过）"""
+        offset = min(offset, self.size)
+        if offset <= self.start:
+            return
+        self.start = offset
+        if self._file is not None and offset >= self._file_end:
+            self._release_file()
+        if offset > self._memory_start:
+            del self._memory[:offset - self._memory_start]
+            self._memory_start = offset
+
+    def _release_file(self):
+        f, self._file = self._file, None
+        self._defer_close(f)
+
+    def _defer_close(self, f):
+        if self._io:
+            self._closing.append(f)
+        else:
+            self._close_file(f)
+
+    def _close_file(self, f):
+        f.close()
+        if self.on_close is not None:
+            self.on_close()
+
+    def close(self):
+        if self._file is not None:
+            self._release_file()
+        self._memory = bytearray()
+
+
+class _Fetch:
+    """一次上游下载及其所有读者"""
+
+    def __init__(self, hub, key: str, url: str):
+        self.hub = hub
+        self.key = key
+        self.url = url
+        self.headers = None
+        self.buffer = SpillBuffer(hub.memory_limit, hub.spill_dir, on_close=self._release_budget)
+        self.done = False
+        self.error = None
+        self.readers = set()
+        # 仍在加入窗口内：缓冲区保留从头开始的数据，新读者可以加入
+        self.joinable = True
+        # 有非预热读者加入
+        self.joined = asyncio.Event()
+        self._budget_key = None
+        self._data = asyncio.Event()
+        self._progress = asyncio.Event()
+        self._task = asyncio.create_task(self._pump())
+
+    @property
+    def finished(self) -> bool:
+        return self.done or self.error is not None
+
+    def _notify_data(self):
+        event, self._data = self._data, asyncio.Event()
+        event.set()
+
+    def notify_progress(self):
+        if not self.joinable and self.readers:
+            self.buffer.trim(min(r.offset for r in self.readers))
+        event, self._progress = self._progress, asyncio.Event()
+        event.set()
+
+    async def wait_data(self):
+        await self._data.wait()
+
+    def _close_window(self):
+        """不再接受新读者，开始丢弃所有读者都已读过的数据"""
+        if self.joinable:
+            self.joinable = False
+            self.hub._forget(self)
+            self.notify_progress()
+
+    def _can_spill(self) -> bool:
+        """落盘前按 replay_limit 预留磁盘配额，配额不足时返回 False"""
+        budget = self.hub.disk_budget
+        if budget is None:
+            return True
+        self._budget_key = f"fanout:{id(self)}"
+        if budget.try_reserve(self._budget_key, self.hub.replay_limit):
+            return True
+        self._budget_key = None
+        return False
+
+    def _release_budget(self):
+        if self._budget_key is not None:
+            self.hub.disk_budget.release(self._budget_key)
+            self._budget_key = None
+
+    def _paused(self) -> bool:
+        if not self.readers:
+            return False
+        # 领先最快的读者太多
+        if self.buffer.size > max(r.offset + r.readahead for r in self.readers):
+            return True
+        # 窗口关闭后，最慢的读者落后太多
+        return not self.joinable and self.buffer.in_memory > self.hub.memory_limit
+
+    async def _pump(self):
+        stream = None
+        try:
+            stream = await self.hub.pool.open(self.url)
+            self.headers = stream.headers
+            self._notify_data()
+            async for chunk in stream.aiter_bytes(CHUNK_SIZE):
+                if self.joinable and (
+                    self.buffer.size + len(chunk) > self.hub.replay_limit
+                    or (self.buffer.would_spill(len(chunk)) and not self._can_spill())
+                ):
+                    self._close_window()
+                await self.buffer.append(chunk, spill=self.joinable)
+                self._notify_data()
+                while self._paused():
+                    await self._progress.wait()
+            self.done = True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            if stream is not None:
+                await stream.aclose()
+            # 预热完整读完的小文件（如图片）保留到预热读者离开，之后的请求直接重放
+            if not (self.done and any(r.speculative for r in self.readers)):
+                self.hub._forget(self)
+            if not self.readers:
+                self.buffer.close()
+            self._notify_data()
+
+    async def ready(self):
+        """等待上游响应头，上游请求失败时抛出对应异常"""
+        while self.headers is None:
+            if self.error is not None:
+                raise self.error
+            await self.wait_data()
+
+    def detach(self, reader):
+        self.readers.discard(reader)
+        self.notify_progress()
+        if self.readers:
+            return
+        self.hub._forget(self)
+        if not self.finished:
+            # 没有读者了，停止上游下载；缓冲区在 _pump 退出时关闭
+            self._task.cancel()
+        elif self._task.done():
+            self.buffer.close()
+
+
+class FanoutStream:
+    """挂在一次上游下载上的读者，接口与 upstream.UpstreamStream 相同"""
+
+    def __init__(self, fetch: _Fetch, readahead: int, speculative: bool = False):
+        self._fetch = fetch
+        self.headers = fetch.headers
+        self.offset = 0
+        self.readahead = readahead
+        self.speculative = speculative
+        self._closed = False
+
+    async def aiter_bytes(self, chunk_size: int = CHUNK_SIZE):
+        fetch = self._fetch
+        while True:
+            if self.offset < fetch.buffer.size:
+                data = await fetch.buffer.read(self.offset, chunk_size)
+                self.offset += len(data)
+                fetch.notify_progress()
+                yield data
+                continue
+            if fetch.error is not None:
+                raise fetch.error
+            if fetch.done:
+                return
+            await fetch.wait_data()
+
+    async def aclose(self):
+        if not self._closed:
+            self._closed = True
+            self._fetch.detach(self)
+
+
+class FanoutHub:
+    """
+    按 URL 合并进行中的上游下载
+
+    Args:
+        pool: upstream.UpstreamPool
+        memory_limit: 每次下载的内存缓冲上限，超过后落盘
+        replay_limit: 可以重放给后加入读者的字节数，超出后不再合并新请求
+        readahead: 上游下载最多领先最快读者的字节数
+        spill_dir: 落盘临时文件目录，默认系统临时目录
+        disk_budget: 落盘计入的磁盘配额 (storage.DiskBudget)，None 表示不限
+        warm_limit: 同时进行的预热上限，0 表示不预热
+        warm_bytes: 每次预热读取的字节数（预热占用的内存上限约为 warm_limit * warm_bytes）
+        warm_hold: 预热结果等待真实请求的秒数
+    """
+
+    def __init__(
+        self,
+        pool,
+        memory_limit: int = MEMORY_LIMIT,
+        replay_limit: int = REPLAY_LIMIT,
+        readahead: int = READAHEAD,
+        spill_dir: str = None,
+        disk_budget=None,
+        warm_limit: int = 0,
+        warm_bytes: int = WARM_BYTES,
+        warm_hold: float = WARM_HOLD,
+    ):
+        self.pool = pool
+        self.memory_limit = memory_limit
+        self.replay_limit = replay_limit
+        self.readahead = readahead
+        self.spill_dir = spill_dir
+        self.disk_budget = disk_budget
+        self.warm_limit = warm_limit
+        self.warm_bytes = warm_bytes
+        self.warm_hold = warm_hold
+        self._fetches = {}
+        self._warming = {}
+        self.warm_started = 0
+        self.warm_used = 0
+        self.warm_skipped = 0
+
+    @property
+    def inflight(self) -> int:
+        return len(self._fetches)
+
+    @property
+    def readers(self) -> int:
+        return sum(len(f.readers) for f in self._fetches.values())
+
+    def _forget(self, fetch: _Fetch):
+        if self._fetches.get(fetch.key) is fetch:
+            del self._fetches[fetch.key]
+
+    def warm_stats(self) -> dict:
+        return {
+            "warming": len(self._warming),
+            "started": self.warm_started,
+            "used": self.warm_used,
+            "skipped": self.warm_skipped,
+        }
+
+    async def open(self, url: str, speculative: bool = False) -> FanoutStream:
+        """
+        打开（或加入）url 的代理流，收到上游响应头后返回；返回的流必须 aclose()
+
+        Args:
+            speculative: 预热读者，只让上游领先 warm_bytes 字节
+
+        Raises:
+            与 UpstreamPool.open 相同
+        """
+        key = normalize_url(url)
+        fetch = self._fetches.get(key)
+        if fetch is None:
+            fetch = self._fetches[key] = _Fetch(self, key, url)
+        elif not speculative and any(r.speculative for r in fetch.readers):
+            self.warm_used += 1
+
+        reader = FanoutStream(fetch, self.warm_bytes if speculative else self.readahead, speculative)
+        fetch.readers.add(reader)
+        if not speculative:
+            fetch.joined.set()
+            # 真实读者的 readahead 更大，唤醒可能已暂停的上游
+            fetch.notify_progress()
+        try:
+            await fetch.ready()
+        except BaseException:
+            await reader.aclose()
+            raise
+        reader.headers = fetch.headers
+        return reader
+
+    def warm(self, urls: list) -> bool:
+        """
+        在后台预热 urls 中第一个能打开的地址（按顺序尝试候选地址）
+
+        预热数达到上限、连接池有请求在排队或该地址已在下载时跳过，返回是否开始预热。
+        """
+        if not urls:
+            return False
+        key = normalize_url(urls[0])
+        if (
+            len(self._warming) >= self.warm_limit
+            or key in self._warming
+            or key in self._fetches
+            or self.pool.waiting
+            or self.pool.active >= self.pool.max_streams
+        ):
+            self.warm_skipped += 1
+            return False
+        self.warm_started += 1
+        task = self._warming[key] = asyncio.create_task(self._warm(urls))
+        task.add_done_callback(lambda t: self._warming.pop(key, None))
+        return True
+
+    async def _warm(self, urls: list):
+        for url in urls:
+            try:
+                reader = await self.open(url, speculative=True)
+            except Exception:
+                # 预热失败不影响之后的真实请求，尝试下一个候选地址
+                continue
+            try:
+                await asyncio.wait_for(reader._fetch.joined.wait(), self.warm_hold)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                await reader.aclose()
+            return url
+        return None
@@ -0,0 +1,463 @@
+"""
+持久化任务队列
+
+worker.py 从这里领取 解析 / 下载 任务。两种后端接口相同：
+
+- SQLiteQueue: 单机多进程共享一个 SQLite 文件（WAL 模式）
+- RedisQueue: 多机共享一个 Redis 协议的服务（Redis / Valkey / KeyDB 等，需支持 Lua），
+  需要安装可选依赖 redis
+
+语义（至少执行一次）：
+- lease() 领取任务时加租约 (visibility timeout)，处理期间 extend() 续租
+- worker 崩溃或失联导致租约过期后，任务自动回到队列由其他 worker 领取
+- ack() 完成；fail() 按指数退避延迟重试，超过 max_attempts 次移入死信 (dead)
+- 死信可以查看并用 requeue() 重新入队
+
+用法:
+    queue = open_queue("sqlite:///archive/jobs.sqlite3")
+    queue.enqueue("download", {"share_text": "https://v.douyin.com/xxx/"})
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+try:
+    import redis
+except ImportError:  # 可选依赖，只有 RedisQueue 需要
+    redis = None
+
+# 默认租约时长（秒）：超过该时间没有续租的任务会被重新分配
+VISIBILITY_TIMEOUT = 300
+# 默认最多尝试次数，超过后进入死信
+MAX_ATTEMPTS = 5
+# 重试退避基数（秒），第 n 次失败后等待 backoff * 2^(n-1)
+RETRY_BACKOFF = 30
+# 单次退避上限（秒）
+MAX_BACKOFF = 3600
+
+
+@dataclass(slots=True)
+class Job:
+    """
+    领取到的任务
+
+    Attributes:
+        id: 任务 ID
+        kind: 任务类型 ("parse" / "download")
+        payload: 任务参数
+        attempts: 已尝试次数（含本次）
+        lease: 本次租约的标识，ack / fail / extend 时校验，租约过期被他人领取后旧 worker 的操作无效
+        last_error: 上次失败的错误信息
+    """
+
+    id: str
+    kind: str
+    payload: dict
+    attempts: int = 0
+    lease: str = ""
+    last_error: str = None
+
+
+def retry_delay(attempts: int, backoff: float = RETRY_BACKOFF) -> float:
+    """第 attempts 次失败后的重试等待秒数"""
+    return min(MAX_BACKOFF, backoff * 2 ** max(attempts - 1, 0))
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind         TEXT NOT NULL,
+    payload      TEXT NOT NULL,
+    status       TEXT NOT NULL DEFAULT 'ready',
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    lease        TEXT,
+    lease_until  REAL,
+    last_error   TEXT,
+    result       TEXT,
+    created_at   REAL NOT NULL,
+    updated_at   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, available_at);
+"""
+
+
+class SQLiteQueue:
+    """
+    SQLite 任务队列，同一主机上的多个 worker 进程可以共享
+
+    Args:
+        path: 数据库文件路径
+        visibility_timeout: 租约时长（秒）
+        max_attempts: 最多尝试次数
+        backoff: 重试退避基数（秒）
+    """
+
+    def __init__(
+        self,
+        path: str,
+        visibility_timeout: float = VISIBILITY_TIMEOUT,
+        max_attempts: int = MAX_ATTEMPTS,
+        backoff: float = RETRY_BACKOFF,
+    ):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        # 自动提交模式，领取任务时显式 BEGIN IMMEDIATE，保证多进程下同一任务只被一个 worker 领取
+        # worker 在线程中调用（asyncio.to_thread），同一连接上的操作由 _lock 串行化
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def enqueue(self, kind: str, payload: dict, delay: float = 0) -> str:
+        now = time.time()
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO jobs (kind, payload, available_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, json.dumps(payload, ensure_ascii=False), now + delay, now, now),
+            )
+            return str(cur.lastrowid)
+
+    def lease(self) -> Job | None:
+        """领取一个可执行的任务（含租约已过期的任务），没有时返回 None"""
+        with self._lock:
+            return self._lease()
+
+    def _lease(self) -> Job | None:
+        now = time.time()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            # 租约过期且次数已用完的任务（如反复让 worker 崩溃的任务）直接进入死信
+            self._db.execute(
+                "UPDATE jobs SET status = 'dead', lease = NULL, updated_at = ?,"
+                " last_error = COALESCE(last_error, '租约过期')"
+                " WHERE status = 'leased' AND lease_until <= ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            row = self._db.execute(
+                "SELECT * FROM jobs WHERE (status = 'ready' AND available_at <= ?)"
+                " OR (status = 'leased' AND lease_until <= ?)"
+                " ORDER BY available_at, id LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if row is None:
+                self._db.execute("COMMIT")
+                return None
+            lease = uuid.uuid4().hex
+            self._db.execute(
+                "UPDATE jobs SET status = 'leased', lease = ?, lease_until = ?,"
+                " attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (lease, now + self.visibility_timeout, now, row["id"]),
+            )
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return Job(
+            id=str(row["id"]),
+            kind=row["kind"],
+            payload=json.loads(row["payload"]),
+            attempts=row["attempts"] + 1,
+            lease=lease,
+            last_error=row["last_error"],
+        )
+
+    def _update_leased(self, job: Job, sql: str, params: tuple) -> bool:
+        with self._lock:
+            cur = self._db.execute(
+                f"UPDATE jobs SET {sql}, updated_at = ? WHERE id = ? AND status = 'leased' AND lease = ?",
+                (*params, time.time(), int(job.id), job.lease),
+            )
+            return cur.rowcount == 1
+
+    def extend(self, job: Job) -> bool:
+        """续租；租约已失效（过期后被他人领取）时返回 False"""
+        return self._update_leased(job, "lease_until = ?", (time.time() + self.visibility_timeout,))
+
+    def ack(self, job: Job, result: dict = None) -> bool:
+        """标记任务完成，可附带结果"""
+        return self._update_leased(
+            job,
+            "status = 'done', lease = NULL, result = ?",
+            (json.dumps(result, ensure_ascii=False) if result is not None else None,),
+        )
+
+    def fail(self, job: Job, error: str, retry: bool = True) -> bool:
+        """任务失败：未超过次数时延迟重试，否则（或 retry=False）进入死信"""
+        if retry and job.attempts < self.max_attempts:
+            return self._update_leased(
+                job,
+                "status = 'ready', lease = NULL, available_at = ?, last_error = ?",
+                (time.time() + retry_delay(job.attempts, self.backoff), error),
+            )
+        return self._update_leased(job, "status = 'dead', lease = NULL, last_error = ?", (error,))
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (int(job_id),)).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": str(row["id"]),
+            "kind": row["kind"],
+            "payload": json.loads(row["payload"]),
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "last_error": row["last_error"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+        }
+
+    def dead(self, limit: int = 100) -> list:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id FROM jobs WHERE status = 'dead' ORDER BY updated_at LIMIT ?", (limit,)
+            ).fetchall()
+        return [self.get(row["id"]) for row in rows]
+
+    def requeue(self, job_id: str) -> bool:
+        """死信重新入队，尝试次数清零"""
+        now = time.time()
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE jobs SET status = 'ready', attempts = 0, available_at = ?, updated_at = ?"
+                " WHERE id = ? AND status = 'dead'",
+                (now, now, int(job_id)),
+            )
+            return cur.rowcount == 1
+
+    def stats(self) -> dict:
+        counts = {"ready": 0, "leased": 0, "done": 0, "dead": 0}
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        for row in rows:
+            counts[row["status"]] = row["n"]
+        return counts
+
+
+# ---- Redis 后端 ----
+# 键: {prefix}:ready (zset, 分数=可执行时间)  {prefix}:leased (zset, 分数=租约到期时间)
+#     {prefix}:dead (zset, 分数=进入死信时间)  {prefix}:job:{id} (hash)  {prefix}:seq (计数器)
+
+# KEYS: ready, leased, dead, job 前缀；ARGV: now, 租约时长, 最多次数, 新租约
+_LEASE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)
+for _, id in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], id)
+    local key = KEYS[4] .. id
+    if tonumber(redis.call('HGET', key, 'attempts')) >= tonumber(ARGV[3]) then
+        if redis.call('HEXISTS', key, 'last_error') == 0 then
+            redis.call('HSET', key, 'last_error', 'lease expired')
+        end
+        redis.call('HSET', key, 'status', 'dead')
+        redis.call('ZADD', KEYS[3], now, id)
+    else
+        redis.call('HSET', key, 'status', 'ready')
+        redis.call('ZADD', KEYS[1], now, id)
+    end
+end
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now, 'LIMIT', 0, 1)
+if #ids == 0 then
+    return nil
+end
+local id = ids[1]
+local key = KEYS[4] .. id
+redis.call('ZREM', KEYS[1], id)
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[2]), id)
+redis.call('HINCRBY', key, 'attempts', 1)
+redis.call('HSET', key, 'status', 'leased', 'lease', ARGV[4])
+return {id, redis.call('HGET', key, 'kind'), redis.call('HGET', key, 'payload'),
+        redis.call('HGET', key, 'attempts'), redis.call('HGET', key, 'last_error') or ''}
+"""
+
+# 校验租约后修改任务状态
+# KEYS: ready, leased, dead, job；ARGV: lease, action, 分数, last_error/result
+_UPDATE_SCRIPT = """
+if redis.call('HGET', KEYS[4], 'lease') ~= ARGV[1] or redis.call('HGET', KEYS[4], 'status') ~= 'leased' then
+    return 0
+end
+local id = string.match(KEYS[4], '[^:]+$')
+local action = ARGV[2]
+if action == 'extend' then
+    redis.call('ZADD', KEYS[2], ARGV[3], id)
+    return 1
+end
+redis.call('ZREM', KEYS[2], id)
+redis.call('HDEL', KEYS[4], 'lease')
+if action == 'done' then
+    redis.call('HSET', KEYS[4], 'status', 'done', 'result', ARGV[4])
+elseif action == 'retry' then
+    redis.call('HSET', KEYS[4], 'status', 'ready', 'last_error', ARGV[4])
+    redis.call('ZADD', KEYS[1], ARGV[3], id)
+else
+    redis.call('HSET', KEYS[4], 'status', 'dead', 'last_error', ARGV[4])
+    redis.call('ZADD', KEYS[3], ARGV[3], id)
+end
+return 1
+"""
+
+
+class RedisQueue:
+    """
+    Redis 协议的任务队列，多台机器上的 worker 共享（领取和状态变更都在 Lua 脚本中原子执行）
+
+    Args:
+        client: redis.Redis 客户端（需 decode_responses=True）
+        prefix: 键名前缀
+        其余参数同 SQLiteQueue
+    """
+
+    def __init__(
+        self,
+        client,
+        prefix: str = "dy:jobs",
+        visibility_timeout: float = VISIBILITY_TIMEOUT,
+        max_attempts: int = MAX_ATTEMPTS,
+        backoff: float = RETRY_BACKOFF,
+    ):
+        self._redis = client
+        self.prefix = prefix
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._keys = [f"{prefix}:ready", f"{prefix}:leased", f"{prefix}:dead"]
+        self._lease = client.register_script(_LEASE_SCRIPT)
+        self._update = client.register_script(_UPDATE_SCRIPT)
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.prefix}:job:{job_id}"
+
+    def close(self):
+        self._redis.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def enqueue(self, kind: str, payload: dict, delay: float = 0) -> str:
+        job_id = str(self._redis.incr(f"{self.prefix}:seq"))
+        now = time.time()
+        pipe = self._redis.pipeline()
+        pipe.hset(self._job_key(job_id), mapping={
+            "kind": kind,
+            "payload": json.dumps(payload, ensure_ascii=False),
+            "status": "ready",
+            "attempts": 0,
+            "created_at": now,
+        })
+        pipe.zadd(self._keys[0], {job_id: now + delay})
+        pipe.execute()
+        return job_id
+
+    def lease(self) -> Job | None:
+        lease = uuid.uuid4().hex
+        res = self._lease(
+            keys=[*self._keys, f"{self.prefix}:job:"],
+            args=[time.time(), self.visibility_timeout, self.max_attempts, lease],
+        )
+        if not res:
+            return None
+        job_id, kind, payload, attempts, last_error = res
+        return Job(
+            id=str(job_id),
+            kind=kind,
+            payload=json.loads(payload),
+            attempts=int(attempts),
+            lease=lease,
+            last_error=last_error or None,
+        )
+
+    def _change(self, job: Job, action: str, score: float = 0, value: str = "") -> bool:
+        return bool(self._update(
+            keys=[*self._keys, self._job_key(job.id)],
+            args=[job.lease, action, score, value],
+        ))
+
+    def extend(self, job: Job) -> bool:
+        return self._change(job, "extend", time.time() + self.visibility_timeout)
+
+    def ack(self, job: Job, result: dict = None) -> bool:
+        return self._change(job, "done", value=json.dumps(result, ensure_ascii=False) if result is not None else "")
+
+    def fail(self, job: Job, error: str, retry: bool = True) -> bool:
+        if retry and job.attempts < self.max_attempts:
+            return self._change(job, "retry", time.time() + retry_delay(job.attempts, self.backoff), error)
+        return self._change(job, "dead", time.time(), error)
+
+    def get(self, job_id: str) -> dict | None:
+        data = self._redis.hgetall(self._job_key(job_id))
+        if not data:
+            return None
+        return {
+            "id": str(job_id),
+            "kind": data["kind"],
+            "payload": json.loads(data["payload"]),
+            "status": data["status"],
+            "attempts": int(data["attempts"]),
+            "last_error": data.get("last_error"),
+            "result": json.loads(data["result"]) if data.get("result") else None,
+        }
+
+    def dead(self, limit: int = 100) -> list:
+        return [self.get(job_id) for job_id in self._redis.zrange(self._keys[2], 0, limit - 1)]
+
+    def requeue(self, job_id: str) -> bool:
+        if not self._redis.zrem(self._keys[2], job_id):
+            return False
+        pipe = self._redis.pipeline()
+        pipe.hset(self._job_key(job_id), mapping={"status": "ready", "attempts": 0})
+        pipe.zadd(self._keys[0], {job_id: time.time()})
+        pipe.execute()
+        return True
+
+    def stats(self) -> dict:
+        # 已完成的任务不单独建索引，不统计
+        return {
+            "ready": self._redis.zcard(self._keys[0]),
+            "leased": self._redis.zcard(self._keys[1]),
+            "dead": self._redis.zcard(self._keys[2]),
+        }
+
+
+def open_queue(url: str, **kwargs):
+    """
+    按 URL 打开任务队列
+
+    - sqlite:///绝对路径 、sqlite://相对路径 或直接给文件路径 → SQLiteQueue
+    - redis://host:port/db → RedisQueue（需要安装 redis）
+
+    kwargs 传给队列（visibility_timeout、max_attempts、backoff）
+    """
+    parsed = urlparse(url)
+    if parsed.scheme in ("redis", "rediss"):
+        if redis is None:
+            raise RuntimeError("使用 Redis 队列需要安装 redis: pip install redis")
+        client = redis.Redis.from_url(url, decode_responses=True)
+        return RedisQueue(client, **kwargs)
+    if parsed.scheme == "sqlite":
+        return SQLiteQueue(url[len("sqlite://"):], **kwargs)
+    if parsed.scheme:
+        raise ValueError(f"不支持的队列地址: {url}")
+    return SQLiteQueue(url, **kwargs)
@@ -0,0 +1,57 @@
+"""
+事件循环延迟监控
+
+后台任务每隔 interval 秒 sleep 一次，实际醒来时间比预期晚多少即为事件循环延迟：
+同步的 CPU 计算（如大分享页的正则和 json.loads）、阻塞 IO 都会体现在这里。
+stats() 报告最近样本的 p50 / p99 和历史最大值，供 /api/metrics 观察优化效果。
+"""
+
+import asyncio
+from collections import deque
+
+# 采样间隔（秒）
+DEFAULT_INTERVAL = 0.05
+# 保留的最近样本数（默认约 1 分钟）
+DEFAULT_WINDOW = 1200
+
+
+class LoopLagMonitor:
+    """
+    Args:
+        interval: 采样间隔（秒）
+        window: 计算分位数使用的最近样本数
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, window: int = DEFAULT_WINDOW):
+        self.interval = interval
+        self.max_lag = 0.0
+        self.samples = deque(maxlen=window)
+
+    def record(self, lag: float):
+        lag = max(lag, 0.0)
+        self.samples.append(lag)
+        self.max_lag = max(self.max_lag, lag)
+
+    async def run(self):
+        """持续采样，直到任务被取消"""
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.record(loop.time() - start - self.interval)
+
+    def stats(self) -> dict:
+        ordered = sorted(self.samples)
+
+        def pct(p):
+            if not ordered:
+                return 0.0
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000, 2)
+
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": len(ordered),
+            "p50_ms": pct(0.5),
+            "p99_ms": pct(0.99),
+            "max_ms": round(self.max_lag * 1000, 2),
+        }
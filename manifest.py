@@ -0,0 +1,168 @@
+"""
+下载清单 (manifest)
+
+在下载目录中用 SQLite 记录已下载的作品，按 aweme_id 索引：
+保存路径、文件大小、实际使用的下载地址/画质以及 sha256。
+同时记录 分享链接 → aweme_id 的映射，重复运行时可以在请求分享页之前就跳过。
+"""
+
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+from urllib.parse import urlparse, parse_qs
+
+MANIFEST_FILENAME = ".dy_manifest.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    aweme_id    TEXT PRIMARY KEY,
+    type        TEXT NOT NULL,
+    paths       TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    url         TEXT,
+    ratio       TEXT,
+    sha256      TEXT NOT NULL,
+    info        TEXT NOT NULL,
+    created_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS links (
+    share_url   TEXT PRIMARY KEY,
+    aweme_id    TEXT NOT NULL
+);
+"""
+
+
+def file_sha256(path: str) -> str:
+    """计算文件 sha256（同步，调用方应放到线程中执行）"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _ratio_of(url: str) -> str:
+    """从下载地址中取出 ratio 参数（分享页兜底地址没有该参数）"""
+    if not url:
+        return ""
+    return parse_qs(urlparse(url).query).get("ratio", [""])[0]
+
+
+class Manifest:
+    """
+    下载目录中的清单数据库
+
+    Args:
+        output_dir: 下载目录，清单文件保存在该目录下
+    """
+
+    def __init__(self, output_dir: str):
+        os.makedirs(output_dir, exist_ok=True)
+        self.path = os.path.join(output_dir, MANIFEST_FILENAME)
+        # 同一下载目录可能被多个 worker 进程共享：WAL 模式下读写互不阻塞，写锁冲突时等待而不是报错
+        self._db = sqlite3.connect(self.path, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def aweme_id_for(self, share_url: str):
+        """返回分享链接对应的 aweme_id，未记录时返回 None"""
+        row = self._db.execute(
+            "SELECT aweme_id FROM links WHERE share_url = ?", (share_url,)
+        ).fetchone()
+        return row["aweme_id"] if row else None
+
+    def get(self, aweme_id: str):
+        """
+        返回已下载作品的记录，文件缺失或大小不符时返回 None
+
+        记录为 dict: aweme_id, type, paths, size, url, ratio, sha256, info
+        """
+        if not aweme_id:
+            return None
+        row = self._db.execute(
+            "SELECT * FROM downloads WHERE aweme_id = ?", (aweme_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        paths = json.loads(row["paths"])
+        try:
+            size = sum(os.path.getsize(p) for p in paths)
+        except OSError:
+            return None
+        if size != row["size"]:
+            return None
+
+        return {
+            "aweme_id": row["aweme_id"],
+            "type": row["type"],
+            "paths": paths,
+            "size": row["size"],
+            "url": row["url"],
+            "ratio": row["ratio"],
+            "sha256": json.loads(row["sha256"]),
+            "info": json.loads(row["info"]),
+        }
+
+    def lookup(self, share_url: str):
+        """按分享链接查找已下载记录（不发起任何网络请求）"""
+        aweme_id = self.aweme_id_for(share_url)
+        return self.get(aweme_id) if aweme_id else None
+
+    def link(self, share_url: str, aweme_id: str):
+        """记录分享链接 → aweme_id"""
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO links (share_url, aweme_id) VALUES (?, ?)",
+                (share_url, aweme_id),
+            )
+
+    async def record(self, info: dict, paths: list, url: str = "", share_url: str = ""):
+        """
+        记录一次成功的下载
+
+        Args:
+            info: extract_video_urls 返回的信息
+            paths: 保存的文件路径列表
+            url: 实际使用的下载地址（视频）
+            share_url: 分享链接，记录后重复运行可在请求分享页之前跳过
+        """
+        # 计算哈希需要读取整个文件，放到线程中避免阻塞事件循环
+        hashes = await asyncio.to_thread(lambda: [file_sha256(p) for p in paths])
+        size = sum(os.path.getsize(p) for p in paths)
+        aweme_id = info["aweme_id"]
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO downloads "
+                "(aweme_id, type, paths, size, url, ratio, sha256, info, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    aweme_id,
+                    info.get("type", "video"),
+                    json.dumps(paths, ensure_ascii=False),
+                    size,
+                    url,
+                    _ratio_of(url),
+                    json.dumps(hashes),
+                    json.dumps(dict(info), ensure_ascii=False),
+                    time.time(),
+                ),
+            )
+            if share_url:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO links (share_url, aweme_id) VALUES (?, ?)",
+                    (share_url, aweme_id),
+                )
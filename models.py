@@ -0,0 +1,135 @@
+"""
+作品信息模型
+
+extract_video_urls 返回 VideoInfo / ImagePostInfo / AudioInfo：
+- 使用 __slots__ 的 dataclass，字段固定，创建和访问都比 dict 便宜
+- 同时实现 MutableMapping，info["title"]、info.get(...)、dict(info) 等旧用法不变；
+  不属于字段的键 (downloaded、save_path 等) 存在 extra 中
+
+dumps() 提供快速 JSON 编码：安装了 orjson 时使用 orjson，否则回退到标准库 json。
+"""
+
+import json
+from collections.abc import MutableMapping
+from dataclasses import dataclass, field
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+
+@dataclass(slots=True, eq=False)
+class PostInfo(MutableMapping):
+    """作品信息基类，字段顺序即序列化顺序"""
+
+    title: str = ""
+    author: str = ""
+    aweme_id: str = ""
+    type: str = ""
+    video_urls: list = field(default_factory=list)
+    image_urls: list = field(default_factory=list)
+    # 背景音乐 / 原声地址
+    audio_urls: list = field(default_factory=list)
+    cover_url: str = ""
+    duration: int = 0
+    # 返回的签名地址中最早的过期时间 (unix 秒)，地址都不过期时为 None
+    expires_at: int | None = None
+    extra: dict = field(default_factory=dict)
+
+    # ---- dict 兼容 ----
+
+    def __getitem__(self, key):
+        if key in _FIELDS:
+            return getattr(self, key)
+        return self.extra[key]
+
+    def __setitem__(self, key, value):
+        if key in _FIELDS:
+            setattr(self, key, value)
+        else:
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        if key in _FIELDS:
+            raise KeyError(f"不能删除字段: {key}")
+        del self.extra[key]
+
+    def __iter__(self):
+        yield from _FIELDS
+        yield from self.extra
+
+    def __len__(self):
+        return len(_FIELDS) + len(self.extra)
+
+    def __contains__(self, key):
+        return key in _FIELDS or key in self.extra
+
+    def copy(self):
+        return type(self)(**{name: getattr(self, name) for name in _FIELDS}, extra=dict(self.extra))
+
+    def to_dict(self) -> dict:
+        data = {
+            "title": self.title,
+            "author": self.author,
+            "aweme_id": self.aweme_id,
+            "type": self.type,
+            "video_urls": self.video_urls,
+            "image_urls": self.image_urls,
+            "audio_urls": self.audio_urls,
+            "cover_url": self.cover_url,
+            "duration": self.duration,
+            "expires_at": self.expires_at,
+        }
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+
+@dataclass(slots=True, eq=False)
+class VideoInfo(PostInfo):
+    type: str = "video"
+
+
+@dataclass(slots=True, eq=False)
+class ImagePostInfo(PostInfo):
+    type: str = "images"
+
+
+@dataclass(slots=True, eq=False)
+class AudioInfo(PostInfo):
+    """只取音频 (extract_video_urls(detail, audio_only=True))"""
+
+    type: str = "audio"
+
+
+# 作为 dict 键暴露的字段（extra 除外）
+_FIELDS = (
+    "title", "author", "aweme_id", "type", "video_urls", "image_urls", "audio_urls", "cover_url", "duration", "expires_at",
+)
+
+
+def _default(obj):
+    if isinstance(obj, PostInfo):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _ORJSON_OPTS = orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+
+
+def dumps(obj, indent: bool = False) -> bytes:
+    """
+    编码为 UTF-8 JSON（中文不转义）
+
+    Args:
+        obj: 可包含 PostInfo 的任意 JSON 数据
+        indent: 是否缩进 2 格（用于命令行输出）
+    """
+    if orjson is not None:
+        option = _ORJSON_OPTS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, default=_default, option=option)
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2, default=_default).encode()
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default).encode()
@@ -0,0 +1,249 @@
+"""
+MP4 完整性检查与 fast-start 重排（纯 Python）
+
+aweme/v1/play 返回的文件经常把 moov (索引) 放在文件末尾，浏览器要等整个文件下载完才能开始播放。
+这里提供：
+
+- iter_boxes: 遍历顶层 box
+- check_mp4: 校验文件大小与 content-length 是否一致、box 是否被截断、是否缺少 moov/mdat
+- faststart: 把 moov 移到 mdat 之前，修正 stco/co64 中的 chunk 偏移，
+  媒体数据一次顺序流式拷贝 (moov 本身通常只有几百 KB，读入内存处理)
+
+分片 MP4 (含 moof) 不需要也不支持重排。
+"""
+
+import os
+import struct
+
+# 流式拷贝的块大小
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# 包含子 box 的容器类型（只需要能走到 stco/co64 所在的 stbl）
+CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"edts", b"dinf", b"mvex"}
+
+_UINT32_MAX = 0xFFFFFFFF
+
+
+class Mp4Error(RuntimeError):
+    """MP4 文件不完整或结构损坏"""
+
+
+def _read_header(data: bytes, offset: int, end: int, remaining: int = None):
+    """
+    解析 data[offset:] 处的 box 头，返回 (类型, box 大小, 头部大小)
+
+    remaining 为 box 所在范围剩余的字节数（大小为 0 的 box 延伸到范围末尾），默认 end - offset
+    """
+    if end - offset < 8:
+        raise Mp4Error(f"box 头部被截断 (offset={offset})")
+    size, box_type = struct.unpack_from(">I4s", data, offset)
+    header = 8
+    if size == 1:
+        if end - offset < 16:
+            raise Mp4Error(f"box 头部被截断 (offset={offset})")
+        size = struct.unpack_from(">Q", data, offset + 8)[0]
+        header = 16
+    elif size == 0:
+        size = remaining if remaining is not None else end - offset
+    if size < header:
+        raise Mp4Error(f"无效的 box 大小 {size} ({box_type!r}, offset={offset})")
+    return box_type, size, header
+
+
+def iter_boxes(f, file_size: int):
+    """
+    遍历文件的顶层 box
+
+    Yields:
+        (类型, 偏移, 大小)
+
+    Raises:
+        Mp4Error: box 超出文件末尾（文件被截断）
+    """
+    offset = 0
+    while offset < file_size:
+        f.seek(offset)
+        head = f.read(16)
+        box_type, size, _ = _read_header(head, 0, len(head), file_size - offset)
+        if offset + size > file_size:
+            raise Mp4Error(
+                f"文件被截断: {box_type.decode('latin-1')} box 需要 {offset + size} 字节，实际只有 {file_size} 字节"
+            )
+        yield box_type, offset, size
+        offset += size
+
+
+def check_mp4(path: str, expected_size: int = None) -> dict:
+    """
+    校验 MP4 文件完整性
+
+    Args:
+        path: 文件路径
+        expected_size: 期望大小 (content-length)，不知道时传 None
+
+    Returns:
+        {"size": 文件大小, "boxes": [顶层 box 类型], "faststart": moov 是否在 mdat 之前}
+
+    Raises:
+        Mp4Error: 大小不符、被截断或缺少必需的 box
+    """
+    size = os.path.getsize(path)
+    if expected_size is not None and expected_size > 0 and size != expected_size:
+        raise Mp4Error(f"文件大小 {size} 与 content-length {expected_size} 不符")
+
+    with open(path, "rb") as f:
+        boxes = [box_type for box_type, _, _ in iter_boxes(f, size)]
+
+    if not boxes or boxes[0] != b"ftyp":
+        raise Mp4Error("不是 MP4 文件 (缺少 ftyp)")
+    if b"moov" not in boxes:
+        raise Mp4Error("缺少 moov，文件不完整")
+    if b"mdat" not in boxes:
+        raise Mp4Error("缺少 mdat，文件不完整")
+
+    return {
+        "size": size,
+        "boxes": [b.decode("latin-1") for b in boxes],
+        "faststart": boxes.index(b"moov") < boxes.index(b"mdat"),
+    }
+
+
+def _patch_offsets(moov: bytes, shift, to_co64: bool) -> bytes:
+    """
+    递归修正 moov 中 stco/co64 的 chunk 偏移
+
+    Args:
+        moov: 完整的 moov box
+        shift: shift(原偏移) -> 新偏移
+        to_co64: 是否把 stco 转换为 64 位的 co64（偏移超过 4 GB 时需要）
+    """
+
+    def rebuild(data: bytes, start: int, end: int) -> bytes:
+        out = bytearray()
+        offset = start
+        while offset < end:
+            box_type, size, header = _read_header(data, offset, end)
+            if offset + size > end:
+                raise Mp4Error(f"moov 内 {box_type!r} box 越界")
+            body_start = offset + header
+            body_end = offset + size
+
+            if box_type in CONTAINER_BOXES:
+                body = rebuild(data, body_start, body_end)
+            elif box_type in (b"stco", b"co64"):
+                version_flags, count = struct.unpack_from(">II", data, body_start)
+                code = "I" if box_type == b"stco" else "Q"
+                entries = [shift(e) for e in struct.unpack_from(f">{count}{code}", data, body_start + 8)]
+                if box_type == b"stco" and to_co64:
+                    box_type, code = b"co64", "Q"
+                body = struct.pack(">II", version_flags, count) + struct.pack(f">{count}{code}", *entries)
+            else:
+                out += data[offset:body_end]
+                offset = body_end
+                continue
+
+            out += struct.pack(">I4s", 8 + len(body), box_type) + body
+            offset = body_end
+        return bytes(out)
+
+    return rebuild(bytes(moov), 0, len(moov))
+
+
+def faststart(path: str, out_path: str = None) -> bool:
+    """
+    把 moov 移到 mdat 之前（fast-start），原地替换或写到 out_path
+
+    Returns:
+        是否做了重排（已经是 fast-start 或是分片 MP4 时返回 False）
+
+    Raises:
+        Mp4Error: 文件结构损坏
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        boxes = list(iter_boxes(f, size))
+        types = [b[0] for b in boxes]
+        if b"moov" not in types or b"mdat" not in types:
+            raise Mp4Error("缺少 moov 或 mdat，无法重排")
+        if b"moof" in types:
+            return False
+
+        moov_index = types.index(b"moov")
+        mdat_index = types.index(b"mdat")
+        if moov_index < mdat_index:
+            return False
+
+        _, moov_offset, moov_size = boxes[moov_index]
+        insert_at = boxes[mdat_index][1]
+        f.seek(moov_offset)
+        moov = f.read(moov_size)
+
+        # moov 插入到第一个 mdat 之前：位于 [insert_at, moov_offset) 的数据后移 len(新 moov)，
+        # 原 moov 之后的数据只受新旧 moov 大小差影响（stco 转 co64 时才不为 0）
+        to_co64 = False
+        new_size = len(_patch_offsets(moov, lambda o: o, False))
+        if _max_chunk_offset(moov) + new_size > _UINT32_MAX:
+            to_co64 = True
+            new_size = len(_patch_offsets(moov, lambda o: o, True))
+
+        def shift(o):
+            if insert_at <= o < moov_offset:
+                return o + new_size
+            if o >= moov_offset:
+                return o + new_size - moov_size
+            return o
+
+        new_moov = _patch_offsets(moov, shift, to_co64)
+
+        tmp_path = (out_path or path) + ".faststart.tmp"
+        try:
+            with open(tmp_path, "wb") as out:
+                for box_type, offset, box_size in boxes:
+                    if offset == insert_at:
+                        out.write(new_moov)
+                    if box_type == b"moov" and offset == moov_offset:
+                        continue
+                    _copy_range(f, out, offset, box_size)
+            os.replace(tmp_path, out_path or path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return True
+
+
+def _max_chunk_offset(moov: bytes) -> int:
+    """moov 中最大的 stco 偏移（用于判断后移后是否超过 32 位）"""
+    found = [0]
+
+    def collect(o):
+        found[0] = max(found[0], o)
+        return o
+
+    _patch_offsets(moov, collect, False)
+    return found[0]
+
+
+def _copy_range(src, dst, offset: int, length: int):
+    src.seek(offset)
+    while length > 0:
+        chunk = src.read(min(COPY_CHUNK_SIZE, length))
+        if not chunk:
+            raise Mp4Error("拷贝时文件被截断")
+        dst.write(chunk)
+        length -= len(chunk)
+
+
+def finalize_mp4(path: str, expected_size: int = None) -> dict:
+    """
+    下载后处理：校验完整性，moov 在末尾时重排为 fast-start
+
+    Returns:
+        check_mp4 的结果，"faststart" 为处理后的状态，"relocated" 表示是否做了重排
+    """
+    report = check_mp4(path, expected_size)
+    report["relocated"] = False
+    if not report["faststart"] and "moof" not in report["boxes"]:
+        report["relocated"] = faststart(path)
+        report["faststart"] = report["relocated"]
+    return report
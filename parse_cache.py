@@ -0,0 +1,201 @@
+"""
+解析结果缓存
+
+NegativeCache — 不可用作品的负缓存
+    已删除、不可见的作品每次被重新转发都会走一遍重定向和分享页请求，结果总是同样的错误。
+    fetch_video_detail 把这类结果按分享链接和 aweme_id 缓存一段时间（按错误类别使用各自的 TTL），
+    重复请求直接抛出同样的错误，不访问网络。
+    只缓存 PostUnavailableError：网络错误、超时、页面结构变化等临时错误不缓存。
+
+ParseCache — 解析结果缓存 (stale-while-revalidate)
+    返回的 CDN 地址带签名和过期时间 (info.expires_at)。条目在地址过期前一段时间进入刷新窗口：
+    窗口内的请求仍立即返回缓存，同时在后台重新解析一次，热门链接始终拿到有效地址，
+    请求路径上不需要同步等待重新解析。过期的条目不再返回。
+"""
+
+import time
+import asyncio
+from collections import OrderedDict
+
+# 各错误类别的缓存时间（秒），0 表示不缓存
+NEGATIVE_TTL = {
+    # item_list 为空：作品已删除或仅自己可见，短时间内不会恢复
+    "deleted": 600,
+    # 页面数据中没有 videoInfoRes：可能是临时的风控页面，缓存时间较短
+    "unavailable": 60,
+}
+# 最多缓存的条目数，超出时淘汰最早写入的
+MAX_ENTRIES = 10000
+
+
+class PostUnavailableError(RuntimeError):
+    """作品不可用，category 为 NEGATIVE_TTL 中的错误类别"""
+
+    def __init__(self, message: str, category: str = "unavailable"):
+        super().__init__(message)
+        self.category = category
+
+    def __reduce__(self):
+        # 在解析进程池中抛出时需要能序列化回主进程
+        return type(self), (str(self), self.category)
+
+
+class NegativeCache:
+    """
+    Args:
+        ttl: 错误类别 -> 缓存秒数，默认 NEGATIVE_TTL
+        max_entries: 最多缓存的条目数
+    """
+
+    def __init__(self, ttl: dict = None, max_entries: int = MAX_ENTRIES):
+        self.ttl = dict(NEGATIVE_TTL if ttl is None else ttl)
+        self.max_entries = max_entries
+        self.hits = 0
+        self._entries = OrderedDict()
+
+    def get(self, *keys):
+        """任一 key 命中时返回新的 PostUnavailableError，否则返回 None（忽略为 None 的 key）"""
+        now = time.monotonic()
+        for key in keys:
+            entry = self._entries.get(key) if key is not None else None
+            if entry is None:
+                continue
+            message, category, expires = entry
+            if expires <= now:
+                del self._entries[key]
+                continue
+            self.hits += 1
+            return PostUnavailableError(message, category)
+        return None
+
+    def put(self, error: PostUnavailableError, *keys):
+        """按 error 类别的 TTL 缓存到每个 key 下"""
+        ttl = self.ttl.get(error.category, 0)
+        if ttl <= 0:
+            return
+        expires = time.monotonic() + ttl
+        for key in keys:
+            if key is None:
+                continue
+            self._entries.pop(key, None)
+            self._entries[key] = (str(error), error.category, expires)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits}
+
+
+# 进程内共享的缓存
+NEGATIVE_CACHE = NegativeCache()
+
+
+# 地址不带过期时间时的缓存秒数
+PARSE_TTL = 300
+# 距地址过期多少秒时开始后台刷新
+REFRESH_AHEAD = 120
+# 地址过期前多少秒停止返回缓存，给客户端留出开始下载的时间
+EXPIRY_MARGIN = 30
+# 最多缓存的解析结果数
+PARSE_MAX_ENTRIES = 1024
+
+
+class ParseCache:
+    """
+    Args:
+        ttl: 地址不带过期时间 (expires_at 为 None) 时的缓存秒数
+        refresh_ahead: 距失效多少秒时开始后台刷新
+        max_entries: 最多缓存的条目数，超出时淘汰最久未使用的；0 表示不缓存
+    """
+
+    def __init__(self, ttl: float = PARSE_TTL, refresh_ahead: float = REFRESH_AHEAD,
+                 max_entries: int = PARSE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self._entries = OrderedDict()
+        self._pending = {}
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+        }
+
+    def clear(self):
+        self._entries.clear()
+        self._pending.clear()
+
+    async def get(self, key: str, fetch):
+        """
+        返回 key 的解析结果
+
+        Args:
+            key: 缓存键（aweme_id 或分享链接）
+            fetch: 无参协程函数，未命中或需要刷新时调用，返回带 expires_at 的作品信息
+        """
+        if self.max_entries <= 0:
+            return await fetch()
+
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            info, refresh_at, valid_until = entry
+            if now < valid_until:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                if now >= refresh_at and key not in self._pending:
+                    self.refreshes += 1
+                    self._start(key, fetch)
+                return info
+            del self._entries[key]
+
+        self.misses += 1
+        # 同一 key 的并发请求（以及进行中的后台刷新）共用一次解析
+        task = self._pending.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = self._start(key, fetch)
+        return await asyncio.shield(task)
+
+    def _start(self, key: str, fetch):
+        task = asyncio.ensure_future(self._fetch(key, fetch))
+        self._pending[key] = task
+        task.add_done_callback(lambda t: self._fetch_done(key, t))
+        return task
+
+    async def _fetch(self, key: str, fetch):
+        try:
+            info = await fetch()
+        except PostUnavailableError:
+            # 作品已不可用，不再返回旧地址
+            self._entries.pop(key, None)
+            raise
+        self.put(key, info)
+        return info
+
+    def _fetch_done(self, key: str, task):
+        if self._pending.get(key) is task:
+            del self._pending[key]
+        if not task.cancelled():
+            task.exception()  # 后台刷新失败时保留旧条目，避免 "exception never retrieved" 警告
+
+    def put(self, key: str, info):
+        now = time.time()
+        expires_at = info.get("expires_at")
+        valid_until = now + self.ttl if expires_at is None else expires_at - EXPIRY_MARGIN
+        if valid_until <= now:
+            return
+        # 有效期比刷新提前量还短时，在有效期过半时刷新
+        refresh_at = max(valid_until - self.refresh_ahead, now + (valid_until - now) / 2)
+        self._entries.pop(key, None)
+        self._entries[key] = (info, refresh_at, valid_until)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -0,0 +1,204 @@
+"""
+候选地址探测与按大小选择画质
+
+extract_video_urls 返回的候选地址按画质从高到低排列，但不知道各自的大小，
+下载时只能依次尝试第一个能用的。这里并发地对每个候选地址发一个 Range: bytes=0-0 请求
+（跟随跳转，不读取正文），从 Content-Range / Content-Length 得到文件大小，
+同时记录是否可用以及编码提示 (h264 / h265)。
+
+select_within() 按画质顺序返回不超过预算的可用地址，用于 "不超过 N MB 的最高画质"。
+探测结果按地址缓存 (PROBE_CACHE)，同一作品重复选择时不再探测；
+缓存时间不超过地址签名的过期时间。
+
+探测与其他上游请求一样按 PROBE_RETRY 设置单次超时和重试，并受请求截止时间
+(retry_policy.deadline) 约束，超过时抛出 DeadlineExceeded；传入 throttle 时每个探测
+在发出前按 PROBE_BYTES 计入带宽。
+"""
+
+import re
+import time
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+
+import httpx
+
+import dns_cache
+from retry_policy import RetryPolicy
+
+# 探测的超时与重试：只需要响应头，超时比下载短
+PROBE_RETRY = RetryPolicy(connect=3, read=5, attempts=2)
+# 每个探测计入带宽的字节数（响应头的估计大小，正文只有 1 字节）
+PROBE_BYTES = 1024
+# 同时进行的探测数
+PROBE_CONCURRENCY = 8
+# 可用 / 不可用地址的探测结果缓存秒数
+PROBE_TTL = 300
+PROBE_FAILURE_TTL = 30
+# 最多缓存的探测结果数
+PROBE_MAX_ENTRIES = 4096
+
+_CONTENT_RANGE_PATTERN = re.compile(r"bytes\s+\d+-\d+/(\d+)")
+# 地址（跳转前后）或 Content-Type 中的编码提示；
+# 播放接口 ratio=1080p / 720p 返回 H.264，ratio=default 的编码不固定
+_CODEC_HINTS = (
+    ("bytevc1", "h265"), ("hevc", "h265"), ("h265", "h265"),
+    ("avc1", "h264"), ("h264", "h264"), ("ratio=1080p", "h264"), ("ratio=720p", "h264"),
+)
+
+
+class NoCandidateFits(RuntimeError):
+    """没有不超过预算的可用地址"""
+
+
+@dataclass(slots=True)
+class ProbeResult:
+    url: str
+    ok: bool
+    status: int = 0
+    # 文件总大小（字节），上游没有给出时为 None
+    size: int | None = None
+    codec: str | None = None
+    error: str = ""
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _total_size(resp: httpx.Response) -> int | None:
+    if resp.status_code == 206:
+        match = _CONTENT_RANGE_PATTERN.match(resp.headers.get("content-range", ""))
+        return int(match.group(1)) if match else None
+    length = resp.headers.get("content-length")
+    return int(length) if length and length.isdigit() else None
+
+
+def _codec_hint(url: str, resp: httpx.Response) -> str | None:
+    text = f"{url} {resp.url} {resp.headers.get('content-type', '')}".lower()
+    for needle, codec in _CODEC_HINTS:
+        if needle in text:
+            return codec
+    return None
+
+
+class ProbeCache:
+    """
+    Args:
+        max_entries: 最多缓存的探测结果数，超出时淘汰最早写入的
+    """
+
+    def __init__(self, max_entries: int = PROBE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self._entries = OrderedDict()
+
+    def get(self, url: str) -> ProbeResult | None:
+        entry = self._entries.get(url)
+        if entry is None:
+            return None
+        result, expires = entry
+        if expires <= time.time():
+            del self._entries[url]
+            return None
+        self.hits += 1
+        return result
+
+    def put(self, result: ProbeResult):
+        from douyin_core import url_expires_at
+
+        expires = time.time() + (PROBE_TTL if result.ok else PROBE_FAILURE_TTL)
+        signed = url_expires_at(result.url)
+        if signed is not None:
+            expires = min(expires, signed)
+        self._entries.pop(result.url, None)
+        self._entries[result.url] = (result, expires)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits}
+
+
+# 进程内共享的缓存
+PROBE_CACHE = ProbeCache()
+
+
+async def _probe_one(client: httpx.AsyncClient, url: str, throttle=None) -> ProbeResult:
+    async def attempt(timeout):
+        async with client.stream("GET", url, headers={"Range": "bytes=0-0"}, timeout=timeout) as resp:
+            if resp.status_code in PROBE_RETRY.statuses:
+                resp.raise_for_status()
+            if resp.status_code >= 400:
+                return ProbeResult(url, ok=False, status=resp.status_code)
+            return ProbeResult(url, ok=True, status=resp.status_code, size=_total_size(resp), codec=_codec_hint(url, resp))
+
+    if throttle is not None:
+        await throttle(PROBE_BYTES)
+    try:
+        return await PROBE_RETRY.call(attempt)
+    except httpx.HTTPStatusError as e:
+        return ProbeResult(url, ok=False, status=e.response.status_code)
+    except httpx.HTTPError as e:
+        return ProbeResult(url, ok=False, error=str(e) or type(e).__name__)
+
+
+async def probe_urls(urls: list, headers: dict = None, cache: ProbeCache = None, throttle=None) -> list:
+    """
+    并发探测 urls，按原顺序返回 ProbeResult 列表
+
+    Args:
+        urls: 候选地址
+        headers: 请求头（User-Agent、Referer 等，与下载时一致）
+        cache: 探测结果缓存，默认进程共享的 PROBE_CACHE
+        throttle: 可选的限速回调 async throttle(nbytes)
+
+    Raises:
+        DeadlineExceeded: 超过请求截止时间（不缓存）
+    """
+    cache = cache or PROBE_CACHE
+    results = {url: cache.get(url) for url in urls}
+    missing = [url for url, result in results.items() if result is None]
+    if missing:
+        limit = asyncio.Semaphore(PROBE_CONCURRENCY)
+
+        async def probe(url):
+            async with limit:
+                result = await _probe_one(client, url, throttle)
+            cache.put(result)
+            results[url] = result
+
+        async with httpx.AsyncClient(
+            headers=headers,
+            follow_redirects=True,
+            timeout=PROBE_RETRY.timeout(),
+            transport=dns_cache.transport(),
+        ) as client:
+            # 同一截止时间下其余探测也会很快结束，等全部结束后再抛出，client 关闭时没有进行中的请求
+            outcomes = await asyncio.gather(*(probe(url) for url in missing), return_exceptions=True)
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                raise outcome
+    return [results[url] for url in urls]
+
+
+async def select_within(urls: list, max_bytes: int, headers: dict = None, throttle=None) -> list:
+    """
+    按画质顺序（urls 的顺序）返回大小不超过 max_bytes 的可用地址的探测结果
+
+    大小未知的地址不能保证在预算内，不会被选中。
+
+    Raises:
+        NoCandidateFits: 没有符合条件的地址
+        DeadlineExceeded: 超过请求截止时间
+    """
+    results = await probe_urls(urls, headers=headers, throttle=throttle)
+    fitting = [r for r in results if r.ok and r.size is not None and r.size <= max_bytes]
+    if not fitting:
+        sizes = ", ".join(f"{r.size / 1024 / 1024:.1f}MB" for r in results if r.ok and r.size is not None)
+        raise NoCandidateFits(
+            f"没有不超过 {max_bytes / 1024 / 1024:.1f}MB 的可用地址" + (f"（可用: {sizes}）" if sizes else "")
+        )
+    return fitting
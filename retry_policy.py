@@ -0,0 +1,178 @@
+"""
+上游请求的重试与超时策略
+
+原先分享页固定 15 秒超时、视频固定 120 秒超时，连接和读取不分开，也没有重试：
+一次连接失败就直接换下一个地址，而 CDN 卡住时一个请求要等满 120 秒。这里统一为：
+
+- 连接 / 读取超时分开设置，另有整体预算 (total)
+- 可重试的错误（连接失败、超时、408/429/5xx）按指数退避 + 随机抖动重试，
+  429/503 带 Retry-After 时按其等待
+- 截止时间 (deadline) 通过 contextvar 从 API 接口一路传到底层请求：
+  每次尝试的连接超时不超过剩余时间，整个尝试（直到拿到响应头）也在剩余时间内完成，
+  剩余时间不够退避时直接失败，不会层层叠加等待
+
+截止时间约束的是建立连接、等待响应头和重试退避；已经开始传输的响应体只受读取超时约束，
+大文件不会因为截止时间到了被截断（读取超时不按剩余时间缩短，晚开始的尝试也按正常的间隔读取）。
+
+用法:
+    with deadline(20):
+        detail = await fetch_video_detail(url)
+
+    resp = await PAGE.call(lambda timeout: client.get(url, timeout=timeout))
+"""
+
+import time
+import random
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import httpx
+
+# 可重试的状态码
+RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+# 当前请求的截止时间 (time.monotonic())，None 表示不限
+_deadline = ContextVar("dy_deadline", default=None)
+
+
+class DeadlineExceeded(RuntimeError):
+    """请求已超过截止时间"""
+
+
+@contextmanager
+def deadline(seconds: float = None):
+    """
+    在 with 块内设置截止时间；已有更早的截止时间时保留更早的那个
+
+    seconds 为 None 或 <= 0 时不设置。
+    """
+    if not seconds or seconds <= 0:
+        yield
+        return
+    end = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(end if current is None else min(current, end))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> float | None:
+    """距截止时间的剩余秒数，未设置截止时间时返回 None"""
+    end = _deadline.get()
+    return None if end is None else end - time.monotonic()
+
+
+class RetryPolicy:
+    """
+    重试与超时策略
+
+    Args:
+        connect: 连接超时（秒，含 TLS 握手和连接池等待）
+        read: 读取超时（秒，两次收到数据的最长间隔）
+        total: 一次调用（含所有重试和退避）的整体预算，None 表示只受截止时间约束
+        attempts: 最多尝试次数
+        backoff: 首次重试前的退避基数（秒），之后每次翻倍
+        max_backoff: 单次退避上限（秒）
+        statuses: 可重试的 HTTP 状态码
+    """
+
+    def __init__(
+        self,
+        connect: float = 5,
+        read: float = 15,
+        total: float = None,
+        attempts: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 5,
+        statuses=RETRY_STATUSES,
+    ):
+        self.connect = connect
+        self.read = read
+        self.total = total
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = statuses
+
+    def timeout(self, budget: float = None) -> httpx.Timeout:
+        """
+        单次尝试的 httpx 超时：连接和连接池等待不超过 budget（剩余时间）
+
+        读取 / 写入超时是两次收发数据之间的间隔，流式响应体的每个分块都受它约束，
+        不按剩余时间缩短；截止时间由 call() 对响应头之前的阶段单独保证。
+        """
+        connect = self.connect if budget is None else min(self.connect, budget)
+        return httpx.Timeout(connect=connect, read=self.read, write=self.read, pool=connect)
+
+    def retryable(self, exc: Exception) -> bool:
+        if isinstance(exc, httpx.HTTPStatusError):
+            return exc.response.status_code in self.statuses
+        # 连接失败、超时、连接被重置等
+        return isinstance(exc, httpx.TransportError)
+
+    def delay(self, attempt: int, exc: Exception = None) -> float:
+        """第 attempt 次失败后的退避时间：full jitter，429/503 时参考 Retry-After"""
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+        if isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code in (429, 503):
+            value = exc.response.headers.get("retry-after")
+            if isinstance(value, str) and value.strip().isdigit():
+                delay = max(delay, min(float(value), self.max_backoff))
+        return delay
+
+    async def call(self, attempt):
+        """
+        执行 await attempt(timeout)，可重试的错误按退避重试
+
+        Args:
+            attempt: 执行一次请求的 async 函数，参数为本次尝试的 httpx.Timeout
+
+        Raises:
+            DeadlineExceeded: 尝试开始前已超过截止时间
+            其余为最后一次尝试的异常
+        """
+        end = _deadline.get()
+        if self.total is not None:
+            own = time.monotonic() + self.total
+            end = own if end is None else min(end, own)
+
+        for n in range(1, self.attempts + 1):
+            left = None if end is None else end - time.monotonic()
+            if left is not None and left <= 0:
+                raise DeadlineExceeded("上游请求超时（超过截止时间）")
+            try:
+                return await self._attempt(attempt, left)
+            except Exception as e:
+                if n >= self.attempts or not self.retryable(e):
+                    raise
+                wait = self.delay(n, e)
+                if end is not None and time.monotonic() + wait >= end:
+                    # 剩余时间不够退避后再试一次
+                    raise
+                await asyncio.sleep(wait)
+
+
+    async def _attempt(self, attempt, left: float | None):
+        """执行一次尝试；有截止时间时 attempt 本身（流式请求到拿到响应头为止）须在 left 秒内完成"""
+        if left is None:
+            return await attempt(self.timeout())
+        try:
+            async with asyncio.timeout(left) as scope:
+                return await attempt(self.timeout(left))
+        except TimeoutError as e:
+            if scope.expired():
+                raise DeadlineExceeded("上游请求超时（超过截止时间）") from e
+            raise
+
+
+# 分享页、重定向等小请求：失败快速重试
+PAGE = RetryPolicy(connect=5, read=10, total=15, attempts=3)
+# 视频、图片等媒体：读取允许更长的停顿；失败的地址重试一次，之后由调用方换下一个候选地址
+MEDIA = RetryPolicy(connect=5, read=30, attempts=2)
+
+
+def is_timeout(exc: Exception) -> bool:
+    """是否为超时类错误（接口据此返回 504）"""
+    return isinstance(exc, (DeadlineExceeded, httpx.TimeoutException))
@@ -6,33 +6,197 @@
     python server.py --port 8080 --host 0.0.0.0
 
 API:
-    POST /api/parse     - 解析视频信息
-    POST /api/download  - 解析并下载视频，返回文件
+    POST /api/parse     - 解析视频信息 (audio_only 时只返回音频地址，max_bytes 时只返回不超过该大小的地址)
+    POST /api/download  - 解析并下载视频，返回文件 (audio_only 时只下载音频，max_bytes 时下载不超过该大小的最高画质)
+    POST /api/author    - 解析作者主页全部作品 (NDJSON 流)
+    GET  /api/metrics   - 运行状态（排队深度、拒绝次数等）
     GET  /              - Web 界面
+    GET  /healthz       - 健康检查
 """
 
 import os
+import gzip
+import asyncio
+import hashlib
 import zipfile
 import tempfile
 import shutil
+from contextlib import asynccontextmanager
 from urllib.parse import quote, urlparse
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse, JSONResponse, Response
 from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import httpx
 
+try:
+    import brotli
+except ImportError:  # requirements.txt 中已列出；没有安装时只提供 gzip
+    brotli = None
+
 from douyin_core import (
     extract_url,
+    extract_aweme_id,
     fetch_video_detail,
     extract_video_urls,
     download_video,
     sanitize_filename,
+    audio_extension,
+    select_within_budget,
+    configure_parse_offload,
+    shutdown_parse_offload,
     MOBILE_UA,
 )
+from mp4 import finalize_mp4
+from admission import AdmissionController, Overloaded
+from storage import DiskBudget, DiskBudgetExceeded, run_janitor
+from upstream import UpstreamPool, UpstreamBusy, CHUNK_SIZE, run_prewarm
+from dns_cache import DNS_CACHE
+from parse_cache import NEGATIVE_CACHE, NEGATIVE_TTL, ParseCache, PARSE_TTL
+from probe import PROBE_CACHE, NoCandidateFits
+from loop_lag import LoopLagMonitor
+from retry_policy import deadline, is_timeout
+from fanout import FanoutHub
+from bandwidth import BandwidthScheduler, PRIORITY_PARSE, PRIORITY_PROXY, PRIORITY_BULK, PRIORITY_NAMES
+from author import resolve_sec_uid, iter_author_infos
+from models import dumps
+
+# 音频下载的 Content-Type
+AUDIO_MEDIA_TYPES = {".mp3": "audio/mpeg", ".m4a": "audio/mp4", ".aac": "audio/aac"}
+
+# 临时下载目录及清理策略，可通过环境变量调整
+TMP_DIR = os.environ.get("DY_TMP_DIR", "/tmp/douyin_downloads")
+# 请求目录超过该时间未更新即视为残留（秒）
+TMP_MAX_AGE = float(os.environ.get("DY_TMP_MAX_AGE", "3600"))
+# 清理间隔（秒）
+JANITOR_INTERVAL = float(os.environ.get("DY_JANITOR_INTERVAL", "300"))
+# 临时目录磁盘配额 (MB) 及配额不足时的排队等待时间（秒）
+DISK_BUDGET = DiskBudget(
+    limit=int(os.environ.get("DY_DISK_BUDGET_MB", "4096")) * 1024 * 1024,
+    wait_timeout=float(os.environ.get("DY_DISK_WAIT_TIMEOUT", "30")),
+)
+
+# 接口准入控制：同时处理数、排队上限及排队等待时间（秒），超出时返回 503
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("DY_ADMISSION_QUEUE_TIMEOUT", "10"))
+ADMISSION = {
+    "parse": AdmissionController(
+        "/api/parse",
+        max_inflight=int(os.environ.get("DY_PARSE_MAX_INFLIGHT", "32")),
+        max_queue=int(os.environ.get("DY_PARSE_MAX_QUEUE", "64")),
+        queue_timeout=ADMISSION_QUEUE_TIMEOUT,
+    ),
+    "download": AdmissionController(
+        "/api/download",
+        max_inflight=int(os.environ.get("DY_DOWNLOAD_MAX_INFLIGHT", "8")),
+        max_queue=int(os.environ.get("DY_DOWNLOAD_MAX_QUEUE", "16")),
+        queue_timeout=ADMISSION_QUEUE_TIMEOUT,
+    ),
+}
+
+# 各接口的截止时间（秒，从收到请求开始计，含排队）：上游请求的超时和重试都不会超过剩余时间，
+# 超时返回 504。/api/download 和 /api/proxy 只约束拿到上游响应头之前的阶段，不截断传输中的文件
+PARSE_DEADLINE = float(os.environ.get("DY_PARSE_DEADLINE", "20"))
+DOWNLOAD_DEADLINE = float(os.environ.get("DY_DOWNLOAD_DEADLINE", "60"))
+PROXY_DEADLINE = float(os.environ.get("DY_PROXY_DEADLINE", "15"))
+
+# 下载的视频是否校验 MP4 完整性并把 moov 移到开头 (fast-start)，浏览器可边下边播
+MP4_FASTSTART = os.environ.get("DY_MP4_FASTSTART", "0") == "1"
+
+# /api/proxy 共享上游连接池：最大并发代理流、单主机上限、排队上限及排队等待时间（秒）
+UPSTREAM = UpstreamPool(
+    max_streams=int(os.environ.get("DY_PROXY_MAX_STREAMS", "64")),
+    max_per_host=int(os.environ.get("DY_PROXY_MAX_PER_HOST", "16")),
+    max_queue=int(os.environ.get("DY_PROXY_MAX_QUEUE", "256")),
+    queue_timeout=float(os.environ.get("DY_PROXY_QUEUE_TIMEOUT", "10")),
+    headers={
+        "User-Agent": MOBILE_UA,
+        "Referer": "https://www.douyin.com/",
+    },
+)
+# 同一代理地址的并发请求合并为一次上游下载；每次下载的内存缓冲上限 (KB)，超过后落盘到 TMP_DIR
+# (计入 DISK_BUDGET)；前 DY_FANOUT_REPLAY_MB 可以重放给后加入的请求
+# /api/parse 之后的预热：同时预热数上限 (0 表示不预热)、每次读取的 KB 数、等待代理请求的秒数
+FANOUT = FanoutHub(
+    UPSTREAM,
+    memory_limit=int(os.environ.get("DY_FANOUT_MEMORY_KB", "4096")) * 1024,
+    replay_limit=int(os.environ.get("DY_FANOUT_REPLAY_MB", "16")) * 1024 * 1024,
+    spill_dir=TMP_DIR,
+    disk_budget=DISK_BUDGET,
+    warm_limit=int(os.environ.get("DY_WARMUP_MAX", "0")),
+    warm_bytes=int(os.environ.get("DY_WARMUP_KB", "256")) * 1024,
+    warm_hold=float(os.environ.get("DY_WARMUP_HOLD", "15")),
+)
+# 图文帖最多预热的图片数
+WARMUP_MAX_IMAGES = 4
+
+# 出站总带宽 (KB/s)，0 表示不限速；按 解析 > 代理 > 下载 的优先级分配
+BANDWIDTH = BandwidthScheduler(rate=int(os.environ.get("DY_BANDWIDTH_LIMIT_KB", "0")) * 1024)
+
+
+def _client_key(request: Request) -> str:
+    """同一优先级内按客户端地址平分带宽"""
+    return request.client.host if request.client else ""
+
+
+def _prewarm_hosts() -> list:
+    """DY_PREWARM_HOSTS 中属于允许代理范围的主机"""
+    hosts = os.environ.get("DY_PREWARM_HOSTS", "aweme.snssdk.com")
+    return [h.strip() for h in hosts.split(",") if h.strip() and _is_allowed_proxy_url(f"https://{h.strip()}/")]
+
+
+# 分享页主机：fetch_video_detail 每次新建 client，预热的连接用不上，只预先解析域名
+PREWARM_DNS_HOSTS = [
+    h.strip() for h in os.environ.get("DY_PREWARM_DNS_HOSTS", "www.iesdouyin.com,www.douyin.com").split(",") if h.strip()
+]
+
+
+# 预热间隔（秒），0 表示只在启动时预热一次
+PREWARM_INTERVAL = float(os.environ.get("DY_PREWARM_INTERVAL", "0"))
+
+# 分享页解析方式 (off / process / thread / auto) 及放到执行器中的最小页面大小 (KB)
+PARSE_OFFLOAD = os.environ.get("DY_PARSE_OFFLOAD", "off")
+PARSE_OFFLOAD_MIN_KB = int(os.environ.get("DY_PARSE_OFFLOAD_MIN_KB", "64"))
+
+# 已删除 / 不可用作品的负缓存时间（秒），0 表示不缓存
+NEGATIVE_CACHE.ttl.update(
+    deleted=float(os.environ.get("DY_NEGATIVE_TTL_DELETED", NEGATIVE_TTL["deleted"])),
+    unavailable=float(os.environ.get("DY_NEGATIVE_TTL_UNAVAILABLE", NEGATIVE_TTL["unavailable"])),
+)
 
-app = FastAPI(title="抖音无水印下载", version="1.0.0")
+# /api/parse 的解析结果缓存：地址过期前在后台刷新 (stale-while-revalidate)，0 个条目表示不缓存
+PARSE_CACHE = ParseCache(
+    ttl=float(os.environ.get("DY_PARSE_CACHE_TTL", PARSE_TTL)),
+    max_entries=int(os.environ.get("DY_PARSE_CACHE_SIZE", "1024")),
+)
+
+# 事件循环延迟，见 /api/metrics
+LOOP_LAG = LoopLagMonitor()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_parse_offload(PARSE_OFFLOAD, threshold=PARSE_OFFLOAD_MIN_KB * 1024)
+    tasks = [
+        asyncio.create_task(LOOP_LAG.run()),
+        asyncio.create_task(
+            run_janitor(TMP_DIR, TMP_MAX_AGE, JANITOR_INTERVAL, on_reap=DISK_BUDGET.release)
+        ),
+        # 预热在后台进行，不阻塞启动
+        asyncio.create_task(
+            run_prewarm(UPSTREAM, _prewarm_hosts(), PREWARM_INTERVAL, dns_hosts=PREWARM_DNS_HOSTS)
+        ),
+    ]
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        await UPSTREAM.aclose()
+        shutdown_parse_offload()
+
+
+app = FastAPI(title="抖音无水印下载", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -42,55 +206,188 @@ app.add_middleware(
 )
 
 
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """准入控制拒绝的请求快速返回 503，提示客户端稍后重试"""
+    return JSONResponse(
+        {"detail": str(exc)},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    直接用 models.dumps 编码（可用时走 orjson），不经过 FastAPI 的 jsonable_encoder。
+
+    接口直接返回该响应对象时，FastAPI 不会再对内容做通用编码。
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def _upstream_error(e: Exception, status_code: int = 400, detail: str = None) -> HTTPException:
+    """上游超时（含超过截止时间）返回 504，其余返回 status_code"""
+    if is_timeout(e):
+        return HTTPException(status_code=504, detail=f"上游请求超时: {e}" if str(e) else "上游请求超时")
+    return HTTPException(status_code=status_code, detail=detail or str(e))
+
+
 class ParseRequest(BaseModel):
     share_text: str
+    # 只解析 / 下载背景音乐和原声
+    audio_only: bool = False
+    # 文件大小预算（字节）：探测各候选地址的大小，只使用不超过预算的地址
+    max_bytes: int | None = Field(default=None, gt=0)
+
+
+def _parse_cache_key(url: str, audio_only: bool = False) -> str:
+    """能从链接中直接识别 aweme_id 时按作品缓存，否则按链接缓存；音频模式的结果单独缓存"""
+    try:
+        key = extract_aweme_id(url)
+    except ValueError:
+        key = url
+    return f"{key}#audio" if audio_only else key
 
 
 @app.post("/api/parse")
-async def api_parse(req: ParseRequest):
-    """解析视频信息，返回无水印视频地址"""
+async def api_parse(req: ParseRequest, request: Request):
+    """解析视频信息，返回无水印视频地址（命中 PARSE_CACHE 时不访问上游）"""
     try:
         url = extract_url(req.share_text)
-        detail = await fetch_video_detail(url)
-        info = extract_video_urls(detail)
-        return {"success": True, "data": info}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    throttle = BANDWIDTH.throttle(PRIORITY_PARSE, _client_key(request))
+
+    async def parse():
+        async with ADMISSION["parse"].admit():
+            detail = await fetch_video_detail(url, throttle=throttle)
+            return extract_video_urls(detail, audio_only=req.audio_only)
+
+    with deadline(PARSE_DEADLINE):
+        try:
+            info = await PARSE_CACHE.get(_parse_cache_key(url, req.audio_only), parse)
+        except Overloaded:
+            raise
+        except Exception as e:
+            raise _upstream_error(e)
+        if req.max_bytes is not None and info["type"] in ("video", "audio"):
+            # 缓存的是完整结果，按预算筛选副本
+            info = info.copy()
+            try:
+                await select_within_budget(info, req.max_bytes, throttle=throttle)
+            except NoCandidateFits as e:
+                raise HTTPException(status_code=404, detail=str(e))
+            except Exception as e:
+                raise _upstream_error(e)
+    if FANOUT.warm_limit:
+        _warm_media(info)
+    return FastJSONResponse({"success": True, "data": info})
+
+
+def _warm_media(info):
+    """预热客户端接下来多半会代理的地址：视频 / 音频取第一个可用的候选地址，图文取前几张图片"""
+    if info["type"] == "images":
+        for url in info["image_urls"][:WARMUP_MAX_IMAGES]:
+            if _is_allowed_proxy_url(url):
+                FANOUT.warm([url])
+    else:
+        urls = info["audio_urls"] if info["type"] == "audio" else info["video_urls"]
+        FANOUT.warm([url for url in urls if _is_allowed_proxy_url(url)])
+
+
+# /api/author 单次请求最多返回的作品数
+AUTHOR_MAX_POSTS = 200
+
+
+class AuthorRequest(BaseModel):
+    share_text: str
+    max_posts: int = 50
+
+
+@app.post("/api/author")
+async def api_author(req: AuthorRequest):
+    """解析作者主页的作品列表，以 NDJSON 逐行返回（每行一个作品）"""
+    try:
+        sec_uid = await resolve_sec_uid(req.share_text)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+    max_posts = max(1, min(req.max_posts, AUTHOR_MAX_POSTS))
+
+    async def stream_infos():
+        try:
+            async for info in iter_author_infos(sec_uid, max_posts=max_posts):
+                yield dumps(info) + b"\n"
+        except Exception as e:
+            # 响应已经开始，只能在流中报告错误
+            yield dumps({"error": str(e)}) + b"\n"
+
+    return StreamingResponse(
+        stream_infos(),
+        media_type="application/x-ndjson",
+        headers={"X-Sec-Uid": sec_uid},
+    )
+
+
+def _cleanup_request_dir(req_dir: str):
+    """删除请求目录并归还磁盘配额"""
+    shutil.rmtree(req_dir, ignore_errors=True)
+    DISK_BUDGET.release(req_dir)
+
 
 @app.post("/api/download")
-async def api_download(req: ParseRequest):
+async def api_download(req: ParseRequest, request: Request):
     """解析并下载视频/图片，返回文件"""
+    # 只限制解析和下载阶段，文件回传给客户端时不占用名额
+    with deadline(DOWNLOAD_DEADLINE):
+        async with ADMISSION["download"].admit():
+            return await _download(req, request)
+
+
+async def _download(req: ParseRequest, request: Request):
+    req_dir = None
+    client_key = _client_key(request)
+    throttle = BANDWIDTH.throttle(PRIORITY_BULK, client_key)
     try:
         url = extract_url(req.share_text)
-        detail = await fetch_video_detail(url)
-        info = extract_video_urls(detail)
+        detail = await fetch_video_detail(
+            url, throttle=BANDWIDTH.throttle(PRIORITY_PARSE, client_key)
+        )
+        info = extract_video_urls(detail, audio_only=req.audio_only)
         content_type = info.get("type", "video")
+        if req.max_bytes is not None and content_type in ("video", "audio"):
+            await select_within_budget(
+                info, req.max_bytes, throttle=BANDWIDTH.throttle(PRIORITY_PARSE, client_key)
+            )
 
-        tmp_dir = "/tmp/douyin_downloads"
-        os.makedirs(tmp_dir, exist_ok=True)
+        os.makedirs(TMP_DIR, exist_ok=True)
         base_name = sanitize_filename(f"{info['author']}_{info['title']}")
 
         # 每个请求使用独立临时目录，避免并发请求间文件名冲突
-        req_dir = tempfile.mkdtemp(dir=tmp_dir)
+        req_dir = tempfile.mkdtemp(dir=TMP_DIR)
+        reserve = DISK_BUDGET.reserver(req_dir)
 
         if content_type == "images":
             # 图文帖：下载所有图片，打包为 zip
             if not info.get("image_urls"):
-                shutil.rmtree(req_dir, ignore_errors=True)
+                _cleanup_request_dir(req_dir)
                 raise HTTPException(status_code=404, detail="未找到图片地址")
 
             saved = []
             for i, img_url in enumerate(info["image_urls"], 1):
                 img_path = os.path.join(req_dir, f"{base_name}_{i}.webp")
                 try:
-                    await download_video(img_url, img_path)
+                    await download_video(img_url, img_path, reserve=reserve, throttle=throttle)
                     saved.append(img_path)
+                except DiskBudgetExceeded:
+                    raise
                 except Exception:
                     continue
 
             if not saved:
-                shutil.rmtree(req_dir, ignore_errors=True)
+                _cleanup_request_dir(req_dir)
                 raise HTTPException(status_code=500, detail="所有图片下载失败")
 
             if len(saved) == 1:
@@ -100,12 +397,14 @@ async def api_download(req: ParseRequest):
                     saved[0],
                     media_type="image/webp",
                     filename=filename,
-                    background=BackgroundTask(shutil.rmtree, req_dir, ignore_errors=True),
+                    background=BackgroundTask(_cleanup_request_dir, req_dir),
                 )
 
             # 多张图片打包为 zip
             zip_filename = f"{base_name}.zip"
             zip_path = os.path.join(req_dir, zip_filename)
+            # zip 不压缩 (ZIP_STORED)，大小约为图片总和加上每个条目的头部
+            await reserve(sum(os.path.getsize(p) + 1024 for p in saved), zip_path)
             with zipfile.ZipFile(zip_path, "w") as zf:
                 for p in saved:
                     zf.write(p, os.path.basename(p))
@@ -114,38 +413,65 @@ async def api_download(req: ParseRequest):
                 zip_path,
                 media_type="application/zip",
                 filename=zip_filename,
-                background=BackgroundTask(shutil.rmtree, req_dir, ignore_errors=True),
+                background=BackgroundTask(_cleanup_request_dir, req_dir),
             )
 
-        # 视频帖
-        if not info["video_urls"]:
-            shutil.rmtree(req_dir, ignore_errors=True)
-            raise HTTPException(status_code=404, detail="未找到视频地址")
+        # 视频帖 / 音频
+        if content_type == "audio":
+            urls, noun, postprocess = info["audio_urls"], "音频", None
+        else:
+            urls, noun = info["video_urls"], "视频"
+            postprocess = finalize_mp4 if MP4_FASTSTART else None
+        if not urls:
+            _cleanup_request_dir(req_dir)
+            raise HTTPException(status_code=404, detail=f"未找到{noun}地址")
 
-        filename = base_name + ".mp4"
-        save_path = os.path.join(req_dir, filename)
+        # 所有候选地址写入同一个文件，磁盘预留按文件替换；
+        # 下载文件名的扩展名和 Content-Type 取自实际下载成功的地址
+        save_path = os.path.join(req_dir, base_name)
 
         last_error = None
-        for video_url in info["video_urls"]:
+        for video_url in urls:
+            if content_type == "audio":
+                ext = audio_extension(video_url)
+                media_type = AUDIO_MEDIA_TYPES.get(ext, "audio/mpeg")
+            else:
+                ext, media_type = ".mp4", "video/mp4"
+            filename = base_name + ext
             try:
-                await download_video(video_url, save_path)
+                await download_video(
+                    video_url,
+                    save_path,
+                    reserve=reserve,
+                    throttle=throttle,
+                    postprocess=postprocess,
+                )
                 return FileResponse(
                     save_path,
-                    media_type="video/mp4",
+                    media_type=media_type,
                     filename=filename,
-                    background=BackgroundTask(shutil.rmtree, req_dir, ignore_errors=True),
+                    background=BackgroundTask(_cleanup_request_dir, req_dir),
                 )
+            except DiskBudgetExceeded:
+                raise
             except Exception as e:
                 last_error = e
                 continue
 
-        shutil.rmtree(req_dir, ignore_errors=True)
-        raise HTTPException(status_code=500, detail=f"下载失败: {last_error}")
+        _cleanup_request_dir(req_dir)
+        raise _upstream_error(last_error, 500, f"下载失败: {last_error}")
 
     except HTTPException:
         raise
+    except NoCandidateFits as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except DiskBudgetExceeded as e:
+        _cleanup_request_dir(req_dir)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        if req_dir:
+            _cleanup_request_dir(req_dir)
+        raise _upstream_error(e)
 
 
 ALLOWED_PROXY_DOMAINS = {
@@ -163,6 +489,8 @@ ALLOWED_PROXY_DOMAINS = {
     "byted-static.com",
     "toutiaovod.com",
     "douyinpic.com",
+    # 背景音乐 / 原声
+    "douyinstatic.com",
 }
 
 
@@ -183,6 +511,7 @@ def _is_allowed_proxy_url(url: str) -> bool:
 
 @app.get("/api/proxy")
 async def api_proxy(
+    request: Request,
     url: str = Query(..., description="视频 URL"),
     filename: str = Query(None, description="下载文件名"),
 ):
@@ -190,47 +519,75 @@ async def api_proxy(
     if not _is_allowed_proxy_url(url):
         raise HTTPException(status_code=403, detail="该 URL 域名不在允许代理的范围内")
 
-    headers = {
-        "User-Agent": MOBILE_UA,
-        "Referer": "https://www.douyin.com/",
-    }
-
     try:
         # 用 GET 流式请求，从响应头中读取 content-type 和 content-length
         # 不再发 HEAD 预检，因为部分 CDN（如 douyinpic.com）不支持 HEAD 方法
-        client = httpx.AsyncClient(
-            headers=headers,
-            follow_redirects=True,
-            timeout=120,
-        )
-        resp = await client.send(
-            client.build_request("GET", url),
-            stream=True,
-        )
-        resp.raise_for_status()
-
-        resp_headers = {
-            "Content-Type": resp.headers.get("content-type", "video/mp4"),
-        }
-        if "content-length" in resp.headers:
-            resp_headers["Content-Length"] = resp.headers["content-length"]
-        if filename:
-            resp_headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{quote(filename)}"
-
-        async def stream_response():
-            try:
-                async for chunk in resp.aiter_bytes(chunk_size=65536):
-                    yield chunk
-            finally:
-                await resp.aclose()
-                await client.aclose()
-
-        return StreamingResponse(stream_response(), headers=resp_headers)
-
+        # 相同地址的并发请求共享同一次上游下载
+        with deadline(PROXY_DEADLINE):
+            stream = await FANOUT.open(url)
+    except UpstreamBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except httpx.HTTPStatusError as e:
         raise HTTPException(status_code=e.response.status_code, detail=f"代理请求失败: {e}")
     except Exception as e:
-        raise HTTPException(status_code=502, detail=f"代理请求失败: {e}")
+        raise _upstream_error(e, 502, f"代理请求失败: {e}")
+
+    resp_headers = {
+        "Content-Type": stream.headers.get("content-type", "video/mp4"),
+    }
+    if "content-length" in stream.headers:
+        resp_headers["Content-Length"] = stream.headers["content-length"]
+    if filename:
+        resp_headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{quote(filename)}"
+
+    throttle = BANDWIDTH.throttle(PRIORITY_PROXY, _client_key(request))
+
+    async def stream_response():
+        # 逐块转发：客户端取走一块才从上游读下一块，不在内存中缓冲
+        try:
+            async for chunk in stream.aiter_bytes(CHUNK_SIZE):
+                if throttle is not None:
+                    await throttle(len(chunk))
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    # 客户端在开始传输前断开时生成器不会运行，由后台任务兜底归还连接名额
+    return StreamingResponse(
+        stream_response(),
+        headers=resp_headers,
+        background=BackgroundTask(stream.aclose),
+    )
+
+
+@app.get("/api/metrics")
+async def api_metrics():
+    """运行状态：各接口排队深度与拒绝次数、代理连接池、带宽调度、事件循环延迟和磁盘配额"""
+    return FastJSONResponse({
+        "admission": {name: controller.stats() for name, controller in ADMISSION.items()},
+        "proxy": {
+            "active": UPSTREAM.active,
+            "waiting": UPSTREAM.waiting,
+            "fanout_inflight": FANOUT.inflight,
+            "fanout_readers": FANOUT.readers,
+            "warmup": FANOUT.warm_stats(),
+        },
+        "bandwidth": {
+            "limit": BANDWIDTH.rate,
+            "sent": dict(zip(PRIORITY_NAMES, BANDWIDTH.sent)),
+            "waiting": BANDWIDTH.waiting,
+        },
+        "dns": DNS_CACHE.stats(),
+        "negative_cache": NEGATIVE_CACHE.stats(),
+        "parse_cache": PARSE_CACHE.stats(),
+        "probe_cache": PROBE_CACHE.stats(),
+        "loop_lag": LOOP_LAG.stats(),
+        "disk": {
+            "limit": DISK_BUDGET.limit,
+            "available": DISK_BUDGET.available,
+            "waiting": DISK_BUDGET.waiting,
+        },
+    })
 
 
 # ==================== Web 前端 ====================
@@ -473,9 +830,72 @@ INDEX_HTML = """
 """
 
 
+# 首页在启动时预先压缩，每种编码一个强 ETag；浏览器缓存一天，之后用 ETag 重新验证
+INDEX_CACHE_CONTROL = "public, max-age=86400"
+
+
+def _build_index_variants(html: str) -> dict:
+    """返回 {编码: (内容, ETag)}，identity 为未压缩版本"""
+    raw = html.encode("utf-8")
+    digest = hashlib.sha256(raw).hexdigest()[:32]
+    variants = {
+        "identity": (raw, f'"{digest}"'),
+        "gzip": (gzip.compress(raw, compresslevel=9, mtime=0), f'"{digest}-gz"'),
+    }
+    if brotli is not None:
+        variants["br"] = (brotli.compress(raw, quality=11), f'"{digest}-br"')
+    return variants
+
+
+INDEX_VARIANTS = _build_index_variants(INDEX_HTML)
+
+
+def _choose_encoding(accept_encoding: str) -> str:
+    """按 Accept-Encoding 选择预压缩版本，优先 br，其次 gzip"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for encoding in ("br", "gzip"):
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if encoding in INDEX_VARIANTS and q > 0:
+            return encoding
+    return "identity"
+
+
 @app.get("/", response_class=HTMLResponse)
-async def index():
-    return INDEX_HTML
+async def index(request: Request):
+    encoding = _choose_encoding(request.headers.get("accept-encoding", ""))
+    body, etag = INDEX_VARIANTS[encoding]
+    headers = {
+        "ETag": etag,
+        "Cache-Control": INDEX_CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+    }
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match:
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        # 只认本次选中编码的 ETag：其他编码的缓存内容不能用于这次响应
+        if "*" in tags or etag in tags:
+            return Response(status_code=304, headers=headers)
+
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type="text/html; charset=utf-8", headers=headers)
+
+
+@app.get("/healthz")
+async def healthz():
+    """轻量健康检查，不渲染页面、不访问上游"""
+    return Response(b"ok", media_type="text/plain")
 
 
 def start_server():
@@ -0,0 +1,239 @@
+"""
+临时下载目录管理
+
+- reap_stale_dirs / run_janitor: 定期清理超时未删除的请求目录
+  (请求崩溃或客户端断开时 BackgroundTask 不会执行，目录会残留)
+- DiskBudget: 磁盘配额，下载开始前按 content-length 预留空间，
+  配额不足时排队等待，超时则拒绝
+"""
+
+import os
+import time
+import shutil
+import asyncio
+from collections import deque
+
+# content-length 未知时按此大小预留
+UNKNOWN_SIZE_ESTIMATE = 64 * 1024 * 1024
+
+
+class DiskBudgetExceeded(RuntimeError):
+    """磁盘配额不足，且在等待时间内未能获得空间"""
+
+
+def _latest_mtime(path: str) -> float:
+    """目录及其直接子文件中最新的修改时间（正在写入的文件会不断刷新 mtime）"""
+    latest = os.stat(path).st_mtime
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                latest = max(latest, entry.stat(follow_symlinks=False).st_mtime)
+            except OSError:
+                continue
+    return latest
+
+
+def reap_stale_dirs(root: str, max_age: float, on_reap=None) -> list:
+    """
+    删除 root 下超过 max_age 秒未更新的子目录
+
+    Args:
+        root: 临时目录根路径
+        max_age: 最大存活时间（秒）
+        on_reap: 每删除一个目录后回调 on_reap(path)
+
+    Returns:
+        被删除的目录列表
+    """
+    if not os.path.isdir(root):
+        return []
+
+    now = time.time()
+    reaped = []
+    with os.scandir(root) as it:
+        entries = [e for e in it if e.is_dir(follow_symlinks=False)]
+
+    for entry in entries:
+        try:
+            if now - _latest_mtime(entry.path) < max_age:
+                continue
+        except OSError:
+            # 目录在扫描期间已被正常清理
+            continue
+        shutil.rmtree(entry.path, ignore_errors=True)
+        reaped.append(entry.path)
+        if on_reap:
+            on_reap(entry.path)
+    return reaped
+
+
+async def run_janitor(root: str, max_age: float, interval: float, on_reap=None):
+    """后台循环清理过期目录，直到任务被取消"""
+    while True:
+        try:
+            reaped = await asyncio.to_thread(reap_stale_dirs, root, max_age)
+            for path in reaped:
+                if on_reap:
+                    on_reap(path)
+            if reaped:
+                print(f"[janitor] 清理过期临时目录 {len(reaped)} 个")
+        except Exception as e:
+            print(f"[janitor] 清理失败: {e}")
+        await asyncio.sleep(interval)
+
+
+class DiskBudget:
+    """
+    磁盘配额
+
+    每个请求以 key (通常是请求目录) 登记预留量，目录删除时调用 release(key)
+    一次性归还。预留按 FIFO 排队，配额释放后依次唤醒等待者。
+
+    预留可以指定 item (通常是文件路径)：同一 key 下相同 item 的预留互相替换而不是累加，
+    换候选地址重新下载到同一个文件时只补足差额。
+
+    已经持有预留的 key 不排队：配额够用时立即追加，否则直接抛出 DiskBudgetExceeded。
+    持有配额的请求再去排队等待会和其他同样持有配额的请求互相等待（hold-and-wait 死锁）。
+
+    Args:
+        limit: 配额总字节数
+        wait_timeout: 配额不足时最多等待的秒数，0 表示立即拒绝
+    """
+
+    def __init__(self, limit: int, wait_timeout: float = 30.0):
+        self.limit = limit
+        self.wait_timeout = wait_timeout
+        self.reserved = 0
+        self._by_key = {}
+        # key -> {item: 预留量}
+        self._items = {}
+        self._waiters = deque()
+
+    @property
+    def available(self) -> int:
+        return self.limit - self.reserved
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def reserver(self, key: str) -> "Reserver":
+        """返回绑定 key 的预留函数，供 download_video(reserve=...) 使用"""
+        return Reserver(self, key)
+
+    def _delta(self, key: str, nbytes: int, item) -> int:
+        """预留 nbytes 还需要的字节数（item 已有预留时扣除），检查单个文件是否超过配额"""
+        if nbytes <= 0:
+            nbytes = UNKNOWN_SIZE_ESTIMATE
+        if nbytes > self.limit:
+            raise DiskBudgetExceeded(f"文件过大 ({nbytes} bytes)，超过磁盘配额 {self.limit} bytes")
+        if item is None:
+            return nbytes
+        return nbytes - self._items.get(key, {}).get(item, 0)
+
+    def _record(self, key: str, item, delta: int):
+        if item is not None:
+            items = self._items.setdefault(key, {})
+            items[item] = items.get(item, 0) + delta
+
+    def _shrink(self, key: str, item, delta: int):
+        """item 的新预留量比原来小：归还差额"""
+        self._record(key, item, delta)
+        self.reserved += delta
+        self._by_key[key] += delta
+        if delta < 0:
+            self._wake()
+
+    async def reserve(self, key: str, nbytes: int, item=None):
+        """
+        为 key 预留 nbytes 字节，nbytes <= 0 时按 UNKNOWN_SIZE_ESTIMATE 预留
+
+        item 不为 None 时，nbytes 替换该 item 之前的预留量
+        """
+        delta = self._delta(key, nbytes, item)
+        if delta <= 0:
+            self._shrink(key, item, delta)
+            return
+        nbytes = delta
+
+        holding = bool(self._by_key.get(key))
+        if (holding or not self._waiters) and nbytes <= self.available:
+            self._grant(key, nbytes)
+            self._record(key, item, nbytes)
+            return
+        if holding:
+            raise DiskBudgetExceeded("磁盘配额已满，请稍后重试")
+
+        if self.wait_timeout <= 0:
+            raise DiskBudgetExceeded("磁盘配额已满，请稍后重试")
+
+        fut = asyncio.get_running_loop().create_future()
+        waiter = (key, nbytes, fut)
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(fut, self.wait_timeout)
+            self._record(key, item, nbytes)
+        except asyncio.TimeoutError:
+            raise DiskBudgetExceeded("磁盘配额已满，排队超时，请稍后重试")
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                # 队首离开后，后面较小的请求可能已经能满足
+                self._wake()
+
+    def try_reserve(self, key: str, nbytes: int, item=None) -> bool:
+        """不等待的预留：配额立即可用时预留并返回 True，否则（包括超过总配额）返回 False"""
+        try:
+            delta = self._delta(key, nbytes, item)
+        except DiskBudgetExceeded:
+            return False
+        if delta <= 0:
+            self._shrink(key, item, delta)
+            return True
+        if (self._waiters and not self._by_key.get(key)) or delta > self.available:
+            return False
+        self._grant(key, delta)
+        self._record(key, item, delta)
+        return True
+
+    def release(self, key: str):
+        """归还 key 的全部预留量（重复调用无副作用）"""
+        nbytes = self._by_key.pop(key, 0)
+        self._items.pop(key, None)
+        if nbytes:
+            self.reserved -= nbytes
+            self._wake()
+
+    def _grant(self, key: str, nbytes: int):
+        self.reserved += nbytes
+        self._by_key[key] = self._by_key.get(key, 0) + nbytes
+
+    def _wake(self):
+        while self._waiters:
+            key, nbytes, fut = self._waiters[0]
+            if fut.done():
+                self._waiters.popleft()
+                continue
+            if nbytes > self.available:
+                break
+            self._waiters.popleft()
+            self._grant(key, nbytes)
+            fut.set_result(None)
+
+
+class Reserver:
+    """
+    绑定 key 的预留函数：await reserve(nbytes, item=None)
+
+    try_reserve() 不等待，供下载在排队前先关闭上游响应。
+    """
+
+    def __init__(self, budget: DiskBudget, key: str):
+        self.budget = budget
+        self.key = key
+
+    async def __call__(self, nbytes: int, item=None):
+        await self.budget.reserve(self.key, nbytes, item)
+
+    def try_reserve(self, nbytes: int, item=None) -> bool:
+        return self.budget.try_reserve(self.key, nbytes, item)
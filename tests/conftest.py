@@ -2,6 +2,25 @@ import json
 import pytest
 
 
+@pytest.fixture(autouse=True)
+def clear_parse_caches():
+    """解析缓存是进程级的，避免一个测试缓存的结果影响其他测试"""
+    import sys
+    from parse_cache import NEGATIVE_CACHE
+    from probe import PROBE_CACHE
+
+    def clear():
+        NEGATIVE_CACHE.clear()
+        PROBE_CACHE.clear()
+        server = sys.modules.get("server")
+        if server is not None:
+            server.PARSE_CACHE.clear()
+
+    clear()
+    yield
+    clear()
+
+
 @pytest.fixture
 def sample_detail():
     """模拟 Douyin 视频详情 dict（fetch_video_detail 返回值）"""
@@ -99,3 +118,25 @@ def sample_router_data_html(sample_detail):
         f"<script>window._ROUTER_DATA = {json.dumps(router_data, ensure_ascii=False)}</script>"
         "</body></html>"
     )
+
+
+@pytest.fixture
+def mock_douyin():
+    """将所有 httpx.AsyncClient 请求转发到本地模拟抖音服务 (tests/mock_douyin.py)"""
+    from unittest.mock import patch
+    import httpx
+    from tests.mock_douyin import MockDouyin
+
+    server = MockDouyin()
+    transport = httpx.ASGITransport(app=server.app)
+    real_client = httpx.AsyncClient
+
+    class MockClient(real_client):
+        def __init__(self, *args, **kwargs):
+            # 替换真实网络的 transport (包括 dns_cache.transport())，测试自己连 ASGI 应用的除外
+            if not isinstance(kwargs.get("transport"), httpx.ASGITransport):
+                kwargs["transport"] = transport
+            super().__init__(*args, **kwargs)
+
+    with patch("httpx.AsyncClient", MockClient):
+        yield server
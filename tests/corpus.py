@@ -0,0 +1,247 @@
+"""
+分享页语料：真实大小的 iesdouyin 分享页，用于离线回放测试和 benchmarks/bench_extraction.py
+
+conftest 中的 fixture 只有几百字节，而真实分享页有几百 KB：大段内联的 CSS/JS、
+bit_rate 中多档画质的签名地址、音乐、话题、统计信息等。这里提供四类页面：
+
+    video    普通视频
+    images   图文帖 (aweme_type=2)
+    slides   带背景音乐和动图的图集 (aweme_type=68)
+    deleted  已删除作品（item_list 为空）
+
+tests/corpus/<名称>.html.gz 存在时使用录制的页面，否则按固定随机种子生成结构相同的页面。
+录制的页面在保存前经过 sanitize_html 脱敏（昵称、uid、签名参数等）:
+
+    python -m tests.corpus record video "https://v.douyin.com/xxx/"
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import random
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+KINDS = ("video", "images", "slides", "deleted")
+
+# 脱敏时替换取值的字段
+SENSITIVE_KEYS = {
+    "nickname", "uid", "sec_uid", "short_id", "unique_id", "signature",
+    "ip_location", "location", "city", "school_name", "enterprise_verify_reason",
+}
+# 脱敏时去掉的 URL 签名参数
+SIGNED_PARAMS = {"x-signature", "x-expires", "x-orig-sign", "sign", "signature", "tk", "l", "from_ssr", "policy"}
+
+_URL_PATTERN = re.compile(r"^https?://")
+
+
+# ---- 脱敏 ----
+
+def _sanitize_url(url: str) -> str:
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() not in SIGNED_PARAMS]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def sanitize(value, key: str = None):
+    """递归脱敏 _ROUTER_DATA：敏感字段替换为同长度占位符，URL 去掉签名参数"""
+    if isinstance(value, dict):
+        return {k: sanitize(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [sanitize(v, key) for v in value]
+    if isinstance(value, str):
+        if key in SENSITIVE_KEYS:
+            return "x" * len(value)
+        if _URL_PATTERN.match(value):
+            return _sanitize_url(value)
+    if key in SENSITIVE_KEYS and isinstance(value, int) and not isinstance(value, bool):
+        return 0
+    return value
+
+
+def sanitize_html(html: str) -> str:
+    """脱敏分享页 HTML 中的 _ROUTER_DATA，其余部分（样式、脚本）原样保留"""
+    from douyin_core import ROUTER_DATA_PATTERN
+
+    match = ROUTER_DATA_PATTERN.search(html)
+    if not match:
+        raise ValueError("页面中没有 _ROUTER_DATA")
+    data = sanitize(json.loads(match.group(1)))
+    blob = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return html[:match.start(1)] + blob + html[match.end(1):]
+
+
+# ---- 生成 ----
+
+def _token(rng: random.Random, n: int) -> str:
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(n))
+
+
+def _cdn_urls(rng: random.Random, path: str, count: int = 3) -> list:
+    hosts = ("v3-web.douyinvod.com", "v26-web.douyinvod.com", "v5-dy-o-abtest.zjcdn.com")
+    return [
+        f"https://{hosts[i % len(hosts)]}/{_token(rng, 32)}/{_token(rng, 8)}/{path}"
+        f"?a=6383&ch=10010&cr=3&dr=0&lr=all&cd=0%7C0%7C0%7C3&cv=1&br=1453&bt=1453&cs=0&ds=4"
+        f"&ft={_token(rng, 24)}&mime_type=video_mp4&qs=0&rc={_token(rng, 40)}&btag=e00030000&dy_q=1700000000"
+        for i in range(count)
+    ]
+
+
+def _image(rng: random.Random, name: str, size: int = 1080) -> dict:
+    base = f"tos-cn-i-0813/{_token(rng, 32)}~tplv-dy-{name}.webp"
+    return {
+        "uri": base,
+        "url_list": [f"https://p{i}-sign.douyinpic.com/{base}?lk3s=138a59ce&x-expires=1700000000&x-signature={_token(rng, 28)}"
+                     for i in (3, 6, 9)],
+        "download_url_list": [f"https://p3-sign.douyinpic.com/{base}?watermark=1&x-signature={_token(rng, 28)}"],
+        "width": size,
+        "height": size * 16 // 9,
+    }
+
+
+def _author(rng: random.Random) -> dict:
+    return {
+        "nickname": "语料作者",
+        "uid": "100000000001",
+        "sec_uid": "MS4wLjABAAAA" + _token(rng, 52),
+        "short_id": "0",
+        "unique_id": "corpus_author",
+        "signature": "个人简介" * 10,
+        "avatar_thumb": _image(rng, "avatar-100"),
+        "avatar_medium": _image(rng, "avatar-720"),
+        "follower_count": 123456,
+        "custom_verify": "",
+    }
+
+
+def _video(rng: random.Random, aweme_id: str) -> dict:
+    uri = "v0200fg10000" + _token(rng, 20)
+    bit_rate = [
+        {
+            "gear_name": f"{gear}_{bitrate}",
+            "quality_type": q,
+            "bit_rate": bitrate * 1000,
+            "is_h265": int(gear == "adapt_lowest"),
+            "play_addr": {"uri": uri, "url_list": _cdn_urls(rng, "video/tos/cn/"), "data_size": bitrate * 4000},
+        }
+        for q, (gear, bitrate) in enumerate(
+            [("normal_1080_0", 2120), ("normal_720_0", 1453), ("normal_540_0", 980),
+             ("low_720_0", 820), ("low_540_0", 610), ("adapt_lowest", 300)]
+        )
+    ]
+    return {
+        "play_addr": {
+            "uri": uri,
+            "url_list": [f"https://www.douyin.com/aweme/v1/playwm/?video_id={uri}&ratio=720p&line=0"],
+        },
+        "cover": _image(rng, "cover"),
+        "origin_cover": _image(rng, "origin-cover"),
+        "dynamic_cover": _image(rng, "dynamic-cover"),
+        "big_thumbs": [{"img_urls": _cdn_urls(rng, "thumb/", 2), "duration": 15.0} for _ in range(4)],
+        "bit_rate": bit_rate,
+        "duration": 35200,
+        "width": 1080,
+        "height": 1920,
+    }
+
+
+def _post(rng: random.Random, kind: str) -> dict:
+    aweme_id = {"video": "7300000000000000001", "images": "7300000000000000002", "slides": "7300000000000000003"}[kind]
+    post = {
+        "aweme_id": aweme_id,
+        "desc": "语料标题 🎬 带 #话题 和 @提及 的描述 " * 3,
+        "create_time": 1700000000,
+        "author": _author(rng),
+        "music": {
+            "id": 7300000000000000100,
+            "title": "原声",
+            "author": "语料作者",
+            "play_url": {"uri": _token(rng, 20), "url_list": _cdn_urls(rng, "music/", 2)},
+            "cover_hd": _image(rng, "music-cover"),
+            "duration": 35,
+        },
+        "statistics": {"digg_count": 12345, "comment_count": 678, "share_count": 90, "collect_count": 12},
+        "text_extra": [{"hashtag_name": f"话题{i}", "hashtag_id": str(1000 + i), "start": i, "end": i + 3} for i in range(8)],
+        "video_tag": [{"tag_id": i, "tag_name": f"标签{i}", "level": 1} for i in range(3)],
+        "risk_infos": {"content": "", "type": 0, "warn": False},
+        "share_info": {"share_url": f"https://www.iesdouyin.com/share/video/{aweme_id}/", "share_title": "分享标题"},
+    }
+    if kind == "video":
+        post["aweme_type"] = 0
+        post["video"] = _video(rng, aweme_id)
+    elif kind == "images":
+        post["aweme_type"] = 2
+        post["images"] = [_image(rng, f"image-{i}") for i in range(9)]
+        post["video"] = {"play_addr": {"uri": "", "url_list": []}, "duration": 0}
+    else:
+        # 图集：每张图可带一段动图视频，整体带背景音乐
+        post["aweme_type"] = 68
+        post["images"] = [{**_image(rng, f"slide-{i}"), "video": _video(rng, aweme_id)} for i in range(6)]
+        post["video"] = _video(rng, aweme_id)
+    return post
+
+
+def _page_shell(rng: random.Random) -> tuple:
+    """分享页外壳：内联样式和脚本（真实页面中占了大部分体积）"""
+    css = "".join(f".c-{_token(rng, 6)}{{display:flex;margin:{i % 16}px;color:#{_token(rng, 6)}}}" for i in range(1500))
+    js = "".join(f"function f{_token(rng, 6)}(a,b){{return a+b*{i}}};" for i in range(1500))
+    head = f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><style>{css}</style><script>{js}</script></head><body><div id=\"root\"></div>"
+    return head, "<script src=\"https://lf-douyin-mobile.bytecdn.com/obj/static/main.js\"></script></body></html>"
+
+
+def generate(kind: str) -> str:
+    """按固定种子生成 kind 类型的分享页"""
+    rng = random.Random(f"corpus-{kind}")
+    head, tail = _page_shell(rng)
+    if kind == "deleted":
+        res = {"item_list": [], "filter_list": [{"aweme_id": "7300000000000000004", "filter_reason": "status_deleted"}]}
+    else:
+        res = {"item_list": [_post(rng, kind)], "filter_list": [], "status_code": 0}
+    router_data = {
+        "loaderData": {
+            "video_layout": {"isSpider": False, "commonContext": {"host": "www.iesdouyin.com"}},
+            "video_(id)/page": {"videoInfoRes": res, "abTestData": {f"ab_{i}": i for i in range(200)}},
+        }
+    }
+    blob = json.dumps(router_data, ensure_ascii=False, separators=(",", ":"))
+    return f"{head}<script>window._ROUTER_DATA = {blob}</script>{tail}"
+
+
+def load(kind: str) -> str:
+    """kind 的分享页：优先使用录制的页面"""
+    path = os.path.join(CORPUS_DIR, f"{kind}.html.gz")
+    if os.path.exists(path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return f.read()
+    return generate(kind)
+
+
+def load_corpus() -> dict:
+    return {kind: load(kind) for kind in KINDS}
+
+
+async def record(kind: str, share_url: str) -> str:
+    """录制一个真实分享页，脱敏后保存到 tests/corpus/"""
+    import httpx
+    from douyin_core import DEFAULT_HEADERS, SHARE_VIDEO_URL, resolve_share_url, _find_aweme_id
+
+    final_url = await resolve_share_url(share_url, stop=_find_aweme_id)
+    aweme_id = _find_aweme_id(final_url)
+    async with httpx.AsyncClient(headers=DEFAULT_HEADERS, follow_redirects=True, timeout=15) as client:
+        resp = await client.get(SHARE_VIDEO_URL.format(aweme_id=aweme_id) if aweme_id else final_url)
+        resp.raise_for_status()
+
+    os.makedirs(CORPUS_DIR, exist_ok=True)
+    path = os.path.join(CORPUS_DIR, f"{kind}.html.gz")
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write(sanitize_html(resp.text))
+    return path
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "record" or sys.argv[2] not in KINDS:
+        sys.exit(f"用法: python -m tests.corpus record {{{','.join(KINDS)}}} <分享链接>")
+    import asyncio
+    print(asyncio.run(record(sys.argv[2], sys.argv[3])))
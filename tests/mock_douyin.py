@@ -0,0 +1,202 @@
+"""
+本地模拟抖音服务 (ASGI)
+
+模拟短链接重定向、iesdouyin 分享页 (_ROUTER_DATA)、作者作品列表接口以及 CDN 媒体，
+配合 conftest 中的 mock_douyin fixture，让所有 httpx 请求都发到这里，
+可以离线跑通 解析 → 翻页 → 下载 的完整流程。
+"""
+
+import json
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response
+
+SEC_UID = "MS4wLjABAAAAmockAuthor"
+AUTHOR = {"nickname": "MockAuthor", "uid": "1001", "sec_uid": SEC_UID}
+
+
+def make_music(aweme_id: str) -> dict:
+    """作品的原声"""
+    return {
+        "title": f"原声 {aweme_id}",
+        "play_url": {"url_list": [f"https://sf3-cdn-tos.douyinstatic.com/obj/ies-music/{aweme_id}.mp3"]},
+        "cover_hd": {"url_list": [f"https://p3-sign.douyinpic.com/img/music_{aweme_id}.jpeg"]},
+        "duration": 12,
+    }
+
+
+def make_video_post(aweme_id: str, create_time: int, with_media: bool = True, desc: str = None) -> dict:
+    """构造视频作品；with_media=False 时模拟列表接口不返回播放地址的情况"""
+    post = {
+        "aweme_id": aweme_id,
+        "desc": desc if desc is not None else f"视频 {aweme_id}",
+        "aweme_type": 0,
+        "create_time": create_time,
+        "author": AUTHOR,
+        "video": {
+            "play_addr": {
+                "uri": f"v0200mock{aweme_id}",
+                "url_list": [f"https://www.douyin.com/aweme/v1/playwm/?video_id=v0200mock{aweme_id}"],
+            },
+            "cover": {"url_list": [f"https://p3-sign.douyinpic.com/img/cover_{aweme_id}.jpeg"]},
+            "duration": 12000,
+        },
+        "music": make_music(aweme_id),
+    }
+    if not with_media:
+        post = {**post, "video": {"cover": post["video"]["cover"], "duration": 12000}}
+    return post
+
+
+def make_image_post(aweme_id: str, create_time: int, count: int = 2) -> dict:
+    return {
+        "aweme_id": aweme_id,
+        "desc": f"图文 {aweme_id}",
+        "aweme_type": 2,
+        "create_time": create_time,
+        "author": AUTHOR,
+        "images": [
+            {"url_list": [f"https://p3-sign.douyinpic.com/img/{aweme_id}_{i}.webp"]}
+            for i in range(1, count + 1)
+        ],
+        "video": {"play_addr": {"uri": "", "url_list": []}, "duration": 0},
+        "music": make_music(aweme_id),
+    }
+
+
+def default_posts() -> list:
+    """默认作者作品（按 create_time 倒序，与真实接口一致）"""
+    return [
+        make_video_post("7000000000000000005", 1700000500),
+        make_image_post("7000000000000000004", 1700000400),
+        make_video_post("7000000000000000003", 1700000300, with_media=False),
+        make_video_post("7000000000000000002", 1700000200),
+        make_video_post("7000000000000000001", 1700000100, with_media=False),
+    ]
+
+
+def router_data_html(item_list: list) -> str:
+    router_data = {
+        "loaderData": {
+            "video_(id)/page": {"videoInfoRes": {"item_list": item_list}},
+        }
+    }
+    return (
+        "<html><head></head><body>"
+        f"<script>window._ROUTER_DATA = {json.dumps(router_data, ensure_ascii=False)}</script>"
+        "</body></html>"
+    )
+
+
+def _media_response(request: Request, body: bytes, media_type: str) -> Response:
+    """支持单段 Range 请求（bytes=a-b / bytes=a-）的媒体响应"""
+    spec = request.headers.get("range", "")
+    if not spec.startswith("bytes="):
+        return Response(body, media_type=media_type)
+    start, _, end = spec[len("bytes="):].partition("-")
+    start = int(start)
+    end = min(int(end) if end else len(body) - 1, len(body) - 1)
+    return Response(
+        body[start:end + 1],
+        status_code=206,
+        media_type=media_type,
+        headers={"Content-Range": f"bytes {start}-{end}/{len(body)}"},
+    )
+
+
+class MockDouyin:
+    """
+    模拟服务实例
+
+    Attributes:
+        posts: 作者作品列表（可在测试中修改，模拟新发布的作品）
+        deleted: 已删除作品的 aweme_id，详情页返回空 item_list
+        short_links: 短链接 code → 重定向目标
+        requests: 收到的请求路径记录，便于断言请求次数
+        failures: 路径前缀 → 待返回的错误状态码列表，命中时依次弹出并返回（模拟上游抖动）
+        video_sizes: ratio → 视频文件大小，设置后播放地址返回的内容补齐到该大小
+    """
+
+    def __init__(self, posts: list = None):
+        self.posts = posts if posts is not None else default_posts()
+        self.deleted = set()
+        self.short_links = {
+            "author": f"https://www.iesdouyin.com/share/user/{SEC_UID}?from_ssr=1",
+        }
+        self.requests = []
+        self.failures = {}
+        self.video_sizes = {}
+        self.app = self._build_app()
+
+    def count(self, prefix: str) -> int:
+        return sum(1 for path in self.requests if path.startswith(prefix))
+
+    def _find(self, aweme_id: str):
+        for post in self.posts:
+            if post["aweme_id"] == aweme_id:
+                return post
+        return None
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.middleware("http")
+        async def record(request: Request, call_next):
+            self.requests.append(request.url.path)
+            for prefix, statuses in self.failures.items():
+                if statuses and request.url.path.startswith(prefix):
+                    return Response(status_code=statuses.pop(0))
+            return await call_next(request)
+
+        @app.get("/web/api/v2/aweme/post/")
+        async def author_posts(sec_uid: str, count: int = 18, max_cursor: int = 0):
+            if sec_uid != SEC_UID:
+                return JSONResponse({"status_code": 2053, "aweme_list": [], "has_more": False})
+            # max_cursor 为上一页最后一个作品的 create_time，0 表示第一页
+            remaining = [p for p in self.posts if not max_cursor or p["create_time"] < max_cursor]
+            page = remaining[:count]
+            return {
+                "status_code": 0,
+                "aweme_list": page,
+                "max_cursor": page[-1]["create_time"] if page else 0,
+                "has_more": len(remaining) > count,
+            }
+
+        @app.get("/share/user/{sec_uid}")
+        async def share_user(sec_uid: str):
+            return HTMLResponse("<html><body>user page</body></html>")
+
+        @app.get("/share/video/{aweme_id}/")
+        async def share_video(aweme_id: str):
+            post = self._find(aweme_id)
+            if post is None or aweme_id in self.deleted:
+                return HTMLResponse(router_data_html([]))
+            detail = dict(post)
+            if "play_addr" not in detail.get("video", {}) and detail.get("aweme_type") != 2:
+                # 详情页总是带完整播放地址
+                full = make_video_post(aweme_id, post["create_time"], desc=post["desc"])
+                detail["video"] = full["video"]
+            return HTMLResponse(router_data_html([detail]))
+
+        @app.get("/aweme/v1/play/")
+        async def play(request: Request, video_id: str, ratio: str = "default"):
+            body = f"MOCKVIDEO:{video_id}:{ratio}".encode()
+            if ratio in self.video_sizes:
+                body = body.ljust(self.video_sizes[ratio], b"\0")
+            return _media_response(request, body, "video/mp4")
+
+        @app.get("/obj/ies-music/{name}")
+        async def music(request: Request, name: str):
+            return _media_response(request, f"MOCKAUDIO:{name}".encode(), "audio/mpeg")
+
+        @app.get("/img/{name}")
+        async def image(name: str):
+            return Response(f"MOCKIMAGE:{name}".encode(), media_type="image/webp")
+
+        @app.get("/{code}/")
+        async def short_link(code: str):
+            target = self.short_links.get(code)
+            if target is None:
+                return Response(status_code=404)
+            return RedirectResponse(target, status_code=302)
+
+        return app
@@ -0,0 +1,125 @@
+import asyncio
+import httpx
+import pytest
+from unittest.mock import patch, AsyncMock
+
+from server import app
+from admission import AdmissionController, Overloaded
+
+
+@pytest.fixture
+async def client():
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app),
+        base_url="http://test",
+    ) as c:
+        yield c
+
+
+async def _hold(controller, release: asyncio.Event):
+    async with controller.admit():
+        await release.wait()
+
+
+async def test_requests_queue_beyond_inflight_limit():
+    controller = AdmissionController("test", max_inflight=1, max_queue=4, queue_timeout=5)
+    release = asyncio.Event()
+    holder = asyncio.create_task(_hold(controller, release))
+    await asyncio.sleep(0)
+
+    queued = asyncio.create_task(_hold(controller, asyncio.Event()))
+    await asyncio.sleep(0)
+    assert controller.stats()["waiting"] == 1
+
+    release.set()
+    await holder
+    await asyncio.sleep(0)
+    assert controller.inflight == 1 and controller.waiting == 0
+    queued.cancel()
+
+
+async def test_full_queue_sheds_immediately():
+    controller = AdmissionController("test", max_inflight=1, max_queue=0, queue_timeout=5)
+    release = asyncio.Event()
+    holder = asyncio.create_task(_hold(controller, release))
+    await asyncio.sleep(0)
+
+    with pytest.raises(Overloaded) as exc:
+        async with controller.admit():
+            pass
+    assert exc.value.retry_after >= 1
+    assert controller.shed["queue_full"] == 1
+
+    release.set()
+    await holder
+    assert controller.inflight == 0
+
+
+async def test_queue_timeout_sheds():
+    controller = AdmissionController("test", max_inflight=1, max_queue=4, queue_timeout=0.01)
+    release = asyncio.Event()
+    holder = asyncio.create_task(_hold(controller, release))
+    await asyncio.sleep(0)
+
+    with pytest.raises(Overloaded):
+        async with controller.admit():
+            pass
+    assert controller.shed["timeout"] == 1
+    assert controller.waiting == 0
+
+    release.set()
+    await holder
+
+
+async def test_slow_handlers_trigger_latency_shedding():
+    controller = AdmissionController("test", max_inflight=1, max_queue=100, queue_timeout=1)
+    # 近期每个请求要处理 2 秒，排队的请求注定等不到
+    controller.latency = 2.0
+    release = asyncio.Event()
+    holder = asyncio.create_task(_hold(controller, release))
+    await asyncio.sleep(0)
+
+    with pytest.raises(Overloaded) as exc:
+        async with controller.admit():
+            pass
+    assert controller.shed["latency"] == 1
+    assert exc.value.retry_after == 1
+
+    release.set()
+    await holder
+
+
+async def test_latency_ewma_is_tracked():
+    controller = AdmissionController("test", max_inflight=2, max_queue=2)
+    async with controller.admit():
+        await asyncio.sleep(0.02)
+    assert controller.latency >= 0.02
+    assert controller.stats()["admitted"] == 1
+
+
+async def test_api_parse_returns_503_when_overloaded(client, sample_detail):
+    controller = AdmissionController("/api/parse", max_inflight=1, max_queue=0)
+    release = asyncio.Event()
+    with patch.dict("server.ADMISSION", {"parse": controller}):
+        holder = asyncio.create_task(_hold(controller, release))
+        await asyncio.sleep(0)
+        resp = await client.post("/api/parse", json={"share_text": "https://v.douyin.com/xxx/"})
+        release.set()
+        await holder
+
+        with patch("server.fetch_video_detail", new_callable=AsyncMock, return_value=sample_detail):
+            ok = await client.post("/api/parse", json={"share_text": "https://v.douyin.com/xxx/"})
+
+    assert resp.status_code == 503
+    assert "Retry-After" in resp.headers
+    assert ok.status_code == 200
+
+
+async def test_api_metrics(client):
+    resp = await client.get("/api/metrics")
+    assert resp.status_code == 200
+    data = resp.json()
+    assert set(data["admission"]) == {"parse", "download"}
+    assert data["admission"]["parse"]["shed"] == {"queue_full": 0, "latency": 0, "timeout": 0}
+    assert {"active", "waiting", "fanout_inflight"} <= set(data["proxy"])
+    assert set(data["bandwidth"]["sent"]) == {"parse", "proxy", "bulk"}
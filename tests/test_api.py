@@ -43,7 +43,7 @@ async def test_api_download_success(client, sample_detail, tmp_path):
     video_file = tmp_path / "test.mp4"
     video_file.write_bytes(b"fake video content")
 
-    async def mock_download(url, save_path):
+    async def mock_download(url, save_path, **kwargs):
         import shutil
         shutil.copy(str(video_file), save_path)
         return save_path
@@ -138,7 +138,7 @@ async def test_api_download_image_post(client, sample_image_detail, tmp_path):
     img_file = tmp_path / "fake.webp"
     img_file.write_bytes(b"fake image content")
 
-    async def mock_download(url, save_path):
+    async def mock_download(url, save_path, **kwargs):
         import shutil
         shutil.copy(str(img_file), save_path)
         return save_path
@@ -159,7 +159,7 @@ async def test_api_download_concurrent_same_video(client, sample_detail, tmp_pat
     video_file = tmp_path / "test.mp4"
     video_file.write_bytes(b"fake video content")
 
-    async def mock_download(url, save_path):
+    async def mock_download(url, save_path, **kwargs):
         import shutil
         # 模拟下载耗时，增加并发冲突概率
         await asyncio.sleep(0.05)
@@ -209,3 +209,108 @@ async def test_api_proxy_image_url(client):
 
     assert resp.status_code == 200
     assert resp.headers.get("content-type") == "image/webp"
+
+
+async def test_api_download_disk_budget_exhausted(client, sample_detail, tmp_path):
+    """磁盘配额不足时返回 503 + Retry-After，并清理请求目录"""
+    from storage import DiskBudget
+
+    async def mock_download(url, save_path, reserve=None, **kwargs):
+        await reserve(1024)
+        return save_path
+
+    budget = DiskBudget(limit=100, wait_timeout=0)
+    with (
+        patch("server.fetch_video_detail", new_callable=AsyncMock, return_value=sample_detail),
+        patch("server.download_video", side_effect=mock_download),
+        patch("server.DISK_BUDGET", budget),
+        patch("server.TMP_DIR", str(tmp_path)),
+    ):
+        resp = await client.post("/api/download", json={"share_text": "https://v.douyin.com/xxx/"})
+
+    assert resp.status_code == 503
+    assert "Retry-After" in resp.headers
+    assert list(tmp_path.iterdir()) == []
+    assert budget.reserved == 0
+
+
+# ====== 作者模式 API 测试 ======
+
+
+async def test_api_author_streams_ndjson(client, mock_douyin):
+    import json
+
+    resp = await client.post("/api/author", json={"share_text": "https://v.douyin.com/author/", "max_posts": 3})
+
+    assert resp.status_code == 200
+    assert "application/x-ndjson" in resp.headers["content-type"]
+    lines = [json.loads(line) for line in resp.text.splitlines() if line]
+    assert len(lines) == 3
+    assert all(line["author"] == "MockAuthor" for line in lines)
+
+
+async def test_api_author_invalid_link(client):
+    resp = await client.post("/api/author", json={"share_text": "no url here"})
+    assert resp.status_code == 400
+
+
+async def test_api_parse_response_layout(client, sample_detail):
+    """模型序列化后与原 dict 结构一致，不暴露内部 extra 字段"""
+    with patch("server.fetch_video_detail", new_callable=AsyncMock, return_value=sample_detail):
+        resp = await client.post("/api/parse", json={"share_text": "https://v.douyin.com/xxx/"})
+
+    assert resp.headers["content-type"].startswith("application/json")
+    assert set(resp.json()["data"]) == {
+        "title", "author", "aweme_id", "type", "video_urls", "image_urls", "audio_urls", "cover_url", "duration", "expires_at",
+    }
+
+
+# ====== 首页缓存与健康检查 ======
+
+
+async def test_index_gzip_variant(client):
+    resp = await client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in resp.headers["vary"]
+    assert "max-age" in resp.headers["cache-control"]
+    assert "抖音无水印下载" in resp.text
+
+
+async def test_index_identity_when_not_accepted(client):
+    resp = await client.get("/", headers={"Accept-Encoding": "gzip;q=0, identity"})
+    assert resp.status_code == 200
+    assert "content-encoding" not in resp.headers
+    assert "抖音无水印下载" in resp.text
+
+
+async def test_index_etag_revalidation(client):
+    first = await client.get("/", headers={"Accept-Encoding": "gzip"})
+    etag = first.headers["etag"]
+    assert etag.startswith('"') and etag.endswith('"')
+
+    resp = await client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.content == b""
+    assert resp.headers["etag"] == etag
+
+    stale = await client.get("/", headers={"If-None-Match": '"outdated"'})
+    assert stale.status_code == 200
+
+    # 其他编码的 ETag 不能换来 304
+    other = await client.get("/", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert other.status_code == 200
+    assert other.headers["etag"] != etag and "content-encoding" not in other.headers
+
+
+async def test_index_variants_have_distinct_etags():
+    from server import INDEX_VARIANTS
+
+    etags = [etag for _, etag in INDEX_VARIANTS.values()]
+    assert len(etags) == len(set(etags))
+
+
+async def test_healthz(client):
+    resp = await client.get("/healthz")
+    assert resp.status_code == 200
+    assert resp.text == "ok"
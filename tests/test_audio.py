@@ -0,0 +1,104 @@
+import sys
+import httpx
+from urllib.parse import urlsplit
+import pytest
+from unittest.mock import patch
+
+from douyin_core import extract_video_urls, parse_and_download, download_post, audio_extension
+from models import AudioInfo
+from server import app
+
+VIDEO = "https://www.douyin.com/video/7000000000000000005"
+MUSIC_URL = "https://sf3-cdn-tos.douyinstatic.com/obj/ies-music/7345.mp3"
+
+
+@pytest.fixture
+def detail_with_music(sample_detail):
+    sample_detail["music"] = {
+        "title": "原声",
+        "play_url": {"uri": "7345", "url_list": [MUSIC_URL + "?x-expires=1700000000"]},
+        "cover_hd": {"url_list": ["https://p3-sign.douyinpic.com/music.jpeg"]},
+        "duration": 15,
+    }
+    return sample_detail
+
+
+def test_audio_only_returns_music_urls(detail_with_music):
+    info = extract_video_urls(detail_with_music, audio_only=True)
+    assert isinstance(info, AudioInfo)
+    assert info["type"] == "audio"
+    assert info["audio_urls"] == [MUSIC_URL + "?x-expires=1700000000"]
+    assert info["video_urls"] == [] and info["image_urls"] == []
+    assert info["cover_url"] == "https://p3-sign.douyinpic.com/music.jpeg"
+    assert info["duration"] == 15
+    assert info["expires_at"] == 1700000000
+
+
+def test_video_info_also_lists_audio(detail_with_music, sample_image_detail):
+    assert extract_video_urls(detail_with_music)["audio_urls"] == [MUSIC_URL + "?x-expires=1700000000"]
+    assert extract_video_urls(sample_image_detail)["audio_urls"] == []
+
+
+def test_audio_extension():
+    assert audio_extension(MUSIC_URL + "?a=1") == ".mp3"
+    assert audio_extension("https://x.douyinstatic.com/obj/a.M4A") == ".m4a"
+    assert audio_extension("https://x.douyinstatic.com/obj/ies-music/123") == ".mp3"
+
+
+async def test_download_without_music_fails(sample_detail, tmp_path):
+    info = extract_video_urls(sample_detail, audio_only=True)
+    with pytest.raises(RuntimeError, match="未找到可下载的音频地址"):
+        await download_post(info, str(tmp_path))
+
+
+async def test_parse_and_download_audio_only(mock_douyin, tmp_path):
+    info = await parse_and_download(VIDEO, output_dir=str(tmp_path), audio_only=True)
+    assert info["type"] == "audio" and info["downloaded"]
+    assert info["save_path"].endswith(".mp3")
+    with open(info["save_path"], "rb") as f:
+        assert f.read() == b"MOCKAUDIO:7000000000000000005.mp3"
+    # 不下载视频
+    assert mock_douyin.count("/aweme/v1/play/") == 0
+
+
+async def test_api_audio_only(mock_douyin):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        parsed = await client.post("/api/parse", json={"share_text": VIDEO, "audio_only": True})
+        video = await client.post("/api/parse", json={"share_text": VIDEO})
+        download = await client.post("/api/download", json={"share_text": VIDEO, "audio_only": True})
+
+    data = parsed.json()["data"]
+    assert data["type"] == "audio" and data["audio_urls"][0].endswith(".mp3")
+    # 音频模式与视频模式的解析结果分开缓存
+    assert video.json()["data"]["type"] == "video"
+    assert download.status_code == 200
+    assert download.headers["content-type"] == "audio/mpeg"
+    assert download.content == b"MOCKAUDIO:7000000000000000005.mp3"
+
+
+async def test_extension_follows_the_url_that_downloaded(mock_douyin, tmp_path):
+    music = mock_douyin.posts[0]["music"]["play_url"]
+    mp3 = music["url_list"][0]
+    music["url_list"] = [mp3, mp3.replace(".mp3", ".m4a")]
+    mock_douyin.failures[urlsplit(mp3).path] = [404] * 10
+
+    info = await parse_and_download(VIDEO, output_dir=str(tmp_path), audio_only=True)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        download = await client.post("/api/download", json={"share_text": VIDEO, "audio_only": True})
+
+    assert info["save_path"].endswith(".m4a")
+    # 失败地址的残缺文件不会留在输出目录
+    assert [p.suffix for p in tmp_path.iterdir()] == [".m4a"]
+    assert download.status_code == 200
+    assert download.headers["content-type"] == "audio/mp4"
+    assert ".m4a" in download.headers["content-disposition"]
+    assert download.content == b"MOCKAUDIO:7000000000000000005.m4a"
+
+
+def test_cli_rejects_audio_only_for_author_mode():
+    import cli
+
+    with patch.object(sys, "argv", ["cli.py", "https://v.douyin.com/x/", "--author", "--audio-only"]):
+        with pytest.raises(SystemExit) as exc:
+            cli.main()
+    assert exc.value.code == 2
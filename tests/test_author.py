@@ -0,0 +1,117 @@
+import sys
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from author import extract_sec_uid, crawl_author, iter_author_infos, resolve_sec_uid
+from manifest import Manifest
+from tests.mock_douyin import SEC_UID, make_video_post
+
+
+def test_extract_sec_uid_share_user_path():
+    url = "https://www.iesdouyin.com/share/user/MS4wLjABAAAAxyz-_1?from_ssr=1"
+    assert extract_sec_uid(url) == "MS4wLjABAAAAxyz-_1"
+
+
+def test_extract_sec_uid_query_param():
+    url = "https://www.iesdouyin.com/web/api/v2/aweme/post/?sec_uid=MS4wLjABAAAAabc&count=18"
+    assert extract_sec_uid(url) == "MS4wLjABAAAAabc"
+
+
+def test_extract_sec_uid_no_match_raises():
+    with pytest.raises(ValueError, match="无法从 URL 中提取作者 ID"):
+        extract_sec_uid("https://www.douyin.com/video/123")
+
+
+async def test_resolve_sec_uid_follows_short_link(mock_douyin):
+    sec_uid = await resolve_sec_uid("看看这个作者 https://v.douyin.com/author/ 复制打开抖音")
+    assert sec_uid == SEC_UID
+    # 只读取重定向头，不请求主页
+    assert mock_douyin.count("/share/user/") == 0
+
+
+async def test_iter_author_infos_pages_and_fetches_missing_details(mock_douyin):
+    infos = [info async for info in iter_author_infos(SEC_UID, page_size=2)]
+
+    assert sorted(i["aweme_id"] for i in infos) == sorted(p["aweme_id"] for p in mock_douyin.posts)
+    assert mock_douyin.count("/web/api/v2/aweme/post/") == 3
+    # 只有列表中缺少播放地址的 2 个作品需要请求详情页
+    assert mock_douyin.count("/share/video/") == 2
+    types = {i["aweme_id"]: i["type"] for i in infos}
+    assert types["7000000000000000004"] == "images"
+    assert all(i["video_urls"] for i in infos if i["type"] == "video")
+
+
+async def test_iter_author_infos_max_posts(mock_douyin):
+    infos = [info async for info in iter_author_infos(SEC_UID, max_posts=2, page_size=2)]
+    assert len(infos) == 2
+    assert mock_douyin.count("/web/api/v2/aweme/post/") == 1
+
+
+async def test_iter_author_infos_reports_deleted_post(mock_douyin):
+    mock_douyin.deleted.add("7000000000000000003")
+    infos = [info async for info in iter_author_infos(SEC_UID)]
+
+    errors = [i for i in infos if i.get("error")]
+    assert [e["aweme_id"] for e in errors] == ["7000000000000000003"]
+    assert "视频列表为空" in errors[0]["error"]
+
+
+async def test_iter_author_infos_unknown_author_raises(mock_douyin):
+    with pytest.raises(RuntimeError, match="获取作品列表失败"):
+        async for _ in iter_author_infos("unknown"):
+            pass
+
+
+async def test_crawl_author_downloads_all(mock_douyin, tmp_path):
+    summary = await crawl_author("https://v.douyin.com/author/", str(tmp_path))
+
+    assert summary["sec_uid"] == SEC_UID
+    assert summary["downloaded"] == 5
+    assert summary["failed"] == 0
+    # 4 个视频 + 1 个图文 (2 张图)
+    assert mock_douyin.count("/aweme/v1/play/") == 4
+    assert mock_douyin.count("/img/") == 2
+    files = sorted(p.name for p in tmp_path.iterdir())
+    assert len(files) == 6
+    assert any(name.startswith("7000000000000000005_") and name.endswith(".mp4") for name in files)
+
+
+async def test_crawl_author_parse_only(mock_douyin, tmp_path):
+    summary = await crawl_author("https://v.douyin.com/author/", str(tmp_path), only_parse=True)
+
+    assert len(summary["posts"]) == 5
+    assert summary["downloaded"] == 0
+    assert mock_douyin.count("/aweme/v1/play/") == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+async def test_crawl_author_skips_manifest_entries(mock_douyin, tmp_path):
+    with Manifest(str(tmp_path)) as manifest:
+        await crawl_author("https://v.douyin.com/author/", str(tmp_path), manifest=manifest)
+        mock_douyin.requests.clear()
+        mock_douyin.posts.insert(0, make_video_post("7000000000000000006", 1700000600))
+
+        summary = await crawl_author("https://v.douyin.com/author/", str(tmp_path), manifest=manifest)
+
+    assert summary["downloaded"] == 1
+    assert summary["skipped"] == 5
+    # 已下载的作品不再请求详情页和 CDN
+    assert mock_douyin.count("/share/video/") == 0
+    assert mock_douyin.count("/aweme/v1/play/") == 1
+
+
+async def test_crawl_author_passes_faststart(mock_douyin, tmp_path):
+    with patch("author.download_post", new_callable=AsyncMock) as download_post:
+        await crawl_author("https://v.douyin.com/author/", str(tmp_path), faststart=True)
+    assert download_post.await_count == 5
+    assert all(call.kwargs["faststart"] is True for call in download_post.await_args_list)
+
+
+def test_cli_author_mode_honours_faststart(tmp_path):
+    import cli
+
+    argv = ["cli.py", "https://v.douyin.com/author/", "--author", "--faststart", "-o", str(tmp_path)]
+    with patch.object(sys, "argv", argv), patch("author.crawl_author", new_callable=AsyncMock) as crawl:
+        crawl.return_value = {}
+        cli.main()
+    assert crawl.await_args.kwargs["faststart"] is True
@@ -0,0 +1,123 @@
+import time
+import asyncio
+import httpx
+from unittest.mock import patch
+
+from server import app
+from bandwidth import BandwidthScheduler, PRIORITY_PARSE, PRIORITY_PROXY, PRIORITY_BULK
+from douyin_core import SHARE_PAGE_ESTIMATE, download_video, fetch_video_detail
+
+
+async def _run_in_order(scheduler, requests):
+    """依次发起 (标签, 优先级, 客户端) 请求，返回获得带宽的先后顺序"""
+    order = []
+
+    async def consume(label, priority, key):
+        await scheduler.consume(1000, priority, key)
+        order.append(label)
+
+    tasks = []
+    for label, priority, key in requests:
+        tasks.append(asyncio.create_task(consume(label, priority, key)))
+        await asyncio.sleep(0)
+    await asyncio.wait_for(asyncio.gather(*tasks), 5)
+    return order
+
+
+def _exhausted(rate=1_000_000):
+    scheduler = BandwidthScheduler(rate=rate, burst=1000)
+    scheduler._tokens = -1000
+    return scheduler
+
+
+async def test_unlimited_scheduler_is_noop():
+    scheduler = BandwidthScheduler(rate=0)
+    assert scheduler.throttle(PRIORITY_BULK) is None
+    await scheduler.consume(10**9)
+    assert scheduler.sent == [0, 0, 0]
+
+
+async def test_total_rate_is_capped():
+    scheduler = BandwidthScheduler(rate=200_000, burst=10_000)
+    start = time.monotonic()
+    for _ in range(5):
+        await scheduler.consume(10_000)
+    elapsed = time.monotonic() - start
+    # 桶内 10 KB 立即发送，其余 40 KB 按 200 KB/s 约需 0.2 秒
+    assert 0.1 < elapsed < 1.0
+    assert scheduler.sent[PRIORITY_BULK] == 50_000
+
+
+async def test_higher_priority_goes_first():
+    scheduler = _exhausted()
+    order = await _run_in_order(
+        scheduler,
+        [
+            ("bulk1", PRIORITY_BULK, "a"),
+            ("bulk2", PRIORITY_BULK, "a"),
+            ("proxy", PRIORITY_PROXY, "b"),
+            ("parse", PRIORITY_PARSE, "c"),
+        ],
+    )
+    assert order == ["parse", "proxy", "bulk1", "bulk2"]
+
+
+async def test_clients_share_fairly_within_class():
+    scheduler = _exhausted()
+    order = await _run_in_order(
+        scheduler,
+        [("a1", PRIORITY_BULK, "a"), ("a2", PRIORITY_BULK, "a"), ("a3", PRIORITY_BULK, "a")]
+        + [("b1", PRIORITY_BULK, "b"), ("b2", PRIORITY_BULK, "b")],
+    )
+    assert order == ["a1", "b1", "a2", "b2", "a3"]
+
+
+async def test_cancelled_waiter_is_skipped():
+    scheduler = _exhausted(rate=100_000)
+    waiter = asyncio.create_task(scheduler.consume(1000, PRIORITY_BULK, "a"))
+    await asyncio.sleep(0)
+    waiter.cancel()
+
+    await asyncio.wait_for(scheduler.consume(1000, PRIORITY_BULK, "b"), 1)
+    assert scheduler.sent[PRIORITY_BULK] == 1000
+    assert scheduler.waiting == {"parse": 0, "proxy": 0, "bulk": 0}
+
+
+async def test_download_video_throttles_each_chunk(mock_douyin, tmp_path):
+    seen = []
+
+    async def throttle(nbytes):
+        seen.append(nbytes)
+
+    url = "https://www.douyin.com/aweme/v1/play/?video_id=v0200mock1"
+    await download_video(url, str(tmp_path / "v.mp4"), throttle=throttle)
+    assert sum(seen) == (tmp_path / "v.mp4").stat().st_size
+
+
+async def test_share_page_is_throttled_before_the_request(mock_douyin):
+    seen = []
+
+    async def throttle(nbytes):
+        seen.append((nbytes, mock_douyin.count("/share/video/")))
+
+    await fetch_video_detail("https://www.douyin.com/video/7000000000000000005", throttle=throttle)
+    assert seen[0] == (SHARE_PAGE_ESTIMATE, 0)
+
+    seen.clear()
+    mock_douyin.requests.clear()
+    with patch("douyin_core.SHARE_PAGE_ESTIMATE", 100):
+        await fetch_video_detail("https://www.douyin.com/video/7000000000000000004", throttle=throttle)
+    # 页面超出估计的部分在收到后补上
+    assert seen[0] == (100, 0) and seen[1][1] == 1 and seen[1][0] > 0
+
+
+async def test_api_proxy_counts_against_proxy_class(mock_douyin):
+    scheduler = BandwidthScheduler(rate=10**9)
+    url = "https://www.douyin.com/aweme/v1/play/?video_id=v0200mock1"
+    with patch("server.BANDWIDTH", scheduler):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            resp = await client.get("/api/proxy", params={"url": url})
+
+    assert resp.status_code == 200
+    assert scheduler.sent[PRIORITY_PROXY] == len(resp.content)
+    assert scheduler.sent[PRIORITY_BULK] == 0
@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+HEAVY_MODULES = ("asyncio", "httpx", "douyin_core", "sqlite3", "manifest", "author", "watchlist")
+
+
+def _loaded_modules(code: str) -> set:
+    proc = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return set(proc.stdout.split())
+
+
+def test_help_does_not_import_heavy_modules():
+    loaded = _loaded_modules(
+        "import sys, io, contextlib, cli\n"
+        "sys.argv = ['cli.py', '--help']\n"
+        "try:\n"
+        "    with contextlib.redirect_stdout(io.StringIO()):\n"
+        "        cli.main()\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    assert loaded == set()
+
+
+def test_parse_only_skips_manifest_and_sqlite():
+    loaded = _loaded_modules(
+        "import sys, io, contextlib, cli, douyin_core\n"
+        "async def fake(**kwargs):\n"
+        "    return {'type': 'video', 'title': 't', 'author': 'a', 'aweme_id': '1',\n"
+        "            'duration': 1, 'cover_url': '', 'video_urls': []}\n"
+        "douyin_core.parse_and_download = fake\n"
+        "sys.argv = ['cli.py', 'https://v.douyin.com/xxx/', '--parse-only']\n"
+        "with contextlib.redirect_stdout(io.StringIO()):\n"
+        "    cli.main()\n"
+        "print(' '.join(m for m in ('sqlite3', 'manifest', 'author', 'watchlist') if m in sys.modules))\n"
+    )
+    assert loaded == set()
+
+
+def test_importing_douyin_core_does_not_load_httpcore():
+    # httpcore (以及安装了时的 trio) 在创建第一个 transport 时才导入
+    loaded = _loaded_modules("import sys, douyin_core\nprint(' '.join(m for m in ('httpcore', 'trio') if m in sys.modules))\n")
+    assert loaded == set()
@@ -0,0 +1,62 @@
+import gzip
+import json
+import pytest
+
+import tests.corpus as corpus
+from douyin_core import ROUTER_DATA_PATTERN, parse_router_data, extract_video_urls
+from tests.corpus import load_corpus, generate, sanitize_html
+
+
+@pytest.fixture(scope="module")
+def pages():
+    return load_corpus()
+
+
+def test_corpus_pages_are_realistic_size(pages):
+    assert set(pages) == set(corpus.KINDS)
+    assert all(len(html) > 64 * 1024 for html in pages.values())
+
+
+def test_video_page(pages):
+    info = extract_video_urls(parse_router_data(pages["video"]))
+    assert info["type"] == "video"
+    assert info["video_urls"] and "playwm" not in info["video_urls"][0]
+
+
+def test_image_post_page(pages):
+    info = extract_video_urls(parse_router_data(pages["images"]))
+    assert info["type"] == "images"
+    assert len(info["image_urls"]) == 9
+
+
+def test_slides_page(pages):
+    detail = parse_router_data(pages["slides"])
+    assert detail["images"] and detail["music"]["play_url"]["url_list"]
+    assert extract_video_urls(detail)["video_urls"]
+
+
+def test_deleted_page(pages):
+    with pytest.raises(RuntimeError, match="视频列表为空"):
+        parse_router_data(pages["deleted"])
+
+
+def test_generation_is_deterministic():
+    assert generate("video") == generate("video")
+
+
+def test_sanitize_html_scrubs_identity_and_signatures():
+    html = sanitize_html(generate("images"))
+    data = json.loads(ROUTER_DATA_PATTERN.search(html).group(1))
+    author = data["loaderData"]["video_(id)/page"]["videoInfoRes"]["item_list"][0]["author"]
+    assert set(author["nickname"]) == {"x"} and set(author["sec_uid"]) == {"x"}
+    assert "x-signature" not in html and "x-expires" not in html
+    # 脱敏后的页面仍能正常解析
+    assert len(extract_video_urls(parse_router_data(html))["image_urls"]) == 9
+
+
+def test_recorded_pages_take_precedence(tmp_path, monkeypatch):
+    monkeypatch.setattr(corpus, "CORPUS_DIR", str(tmp_path))
+    with gzip.open(tmp_path / "video.html.gz", "wt", encoding="utf-8") as f:
+        f.write("<html>recorded</html>")
+    assert corpus.load("video") == "<html>recorded</html>"
+    assert corpus.load("images") == generate("images")
@@ -0,0 +1,192 @@
+import time
+import asyncio
+import httpx
+import httpcore
+import pytest
+from unittest.mock import patch
+
+import dns_cache
+from dns_cache import DNSCache, CachingNetworkBackend
+from upstream import UpstreamPool, run_prewarm
+
+
+def _counting_lookup(cache, addresses=("10.0.0.1",), ttl=300, delay=0):
+    calls = []
+
+    async def lookup(host, port):
+        calls.append(host)
+        await asyncio.sleep(delay)
+        return list(addresses), ttl
+
+    cache._lookup = lookup
+    return calls
+
+
+async def test_resolve_caches_until_ttl_expires():
+    cache = DNSCache()
+    calls = _counting_lookup(cache)
+
+    assert await cache.resolve("cdn.example") == ["10.0.0.1"]
+    assert await cache.resolve("cdn.example") == ["10.0.0.1"]
+    assert calls == ["cdn.example"]
+    assert cache.stats() == {"hosts": 1, "hits": 1, "misses": 1}
+
+    # 过期后重新解析
+    addresses, _ = cache._entries["cdn.example"]
+    cache._entries["cdn.example"] = (addresses, time.monotonic() - 1)
+    await cache.resolve("cdn.example")
+    assert len(calls) == 2
+
+
+async def test_ttl_is_clamped():
+    cache = DNSCache()
+    _counting_lookup(cache, ttl=0)
+    await cache.resolve("cdn.example")
+    expires = cache._entries["cdn.example"][1] - time.monotonic()
+    assert dns_cache.MIN_TTL - 1 < expires <= dns_cache.MIN_TTL
+
+
+async def test_concurrent_lookups_are_coalesced():
+    cache = DNSCache()
+    calls = _counting_lookup(cache, delay=0.01)
+    results = await asyncio.gather(*(cache.resolve("cdn.example") for _ in range(5)))
+    assert results == [["10.0.0.1"]] * 5
+    assert calls == ["cdn.example"]
+
+
+async def test_ip_literal_is_not_resolved():
+    cache = DNSCache()
+    calls = _counting_lookup(cache)
+    assert await cache.resolve("127.0.0.1") == ["127.0.0.1"]
+    assert calls == []
+
+
+async def test_getaddrinfo_fallback_uses_default_ttl():
+    cache = DNSCache(default_ttl=42, use_aiodns=False)
+    addresses, ttl = await cache._lookup("localhost", 80)
+    assert addresses and ttl == 42
+
+
+class FakeBackend:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.attempts = []
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        self.attempts.append(host)
+        if host in self.failing:
+            raise httpcore.ConnectError(f"refused: {host}")
+        return f"stream:{host}"
+
+
+async def test_backend_tries_each_cached_address():
+    cache = DNSCache()
+    _counting_lookup(cache, addresses=("10.0.0.1", "10.0.0.2"))
+    fake = FakeBackend(failing={"10.0.0.1"})
+    backend = CachingNetworkBackend(cache, fake)
+
+    assert await backend.connect_tcp("cdn.example", 443) == "stream:10.0.0.2"
+    assert fake.attempts == ["10.0.0.1", "10.0.0.2"]
+
+
+async def test_backend_invalidates_when_all_addresses_fail():
+    cache = DNSCache()
+    _counting_lookup(cache, addresses=("10.0.0.1",))
+    backend = CachingNetworkBackend(cache, FakeBackend(failing={"10.0.0.1"}))
+
+    with pytest.raises(httpcore.ConnectError):
+        await backend.connect_tcp("cdn.example", 443)
+    assert "cdn.example" not in cache._entries
+
+
+async def test_transport_serves_real_requests_through_cache():
+    async def handle(reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    cache = DNSCache(use_aiodns=False)
+    _counting_lookup(cache, addresses=("127.0.0.1",))
+    try:
+        async with httpx.AsyncClient(transport=dns_cache.transport(cache)) as client:
+            resp = await client.get(f"http://cdn.example:{port}/")
+        assert resp.text == "ok"
+        assert "cdn.example" in cache._entries
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+def test_env_proxy_disables_caching_transport(monkeypatch):
+    for name in ("HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY", "http_proxy", "https_proxy", "all_proxy"):
+        monkeypatch.delenv(name, raising=False)
+    assert isinstance(dns_cache.transport(), httpx.AsyncHTTPTransport)
+
+    monkeypatch.setenv("HTTPS_PROXY", "http://proxy.internal:3128")
+    assert dns_cache.transport() is None
+    # httpx 按环境变量挂载代理
+    client = httpx.AsyncClient(transport=dns_cache.transport())
+    assert any(isinstance(t, httpx.AsyncHTTPTransport) for t in client._mounts.values())
+
+
+async def test_prewarm_opens_connections_to_hot_hosts(mock_douyin):
+    pool = UpstreamPool()
+    # 周期预热开启时（run_prewarm interval > 0）才统计代理过的主机
+    pool.track_hot_hosts = True
+    stream = await pool.open("https://p3-sign.douyinpic.com/img/cover_1.jpeg")
+    await stream.aclose()
+
+    warmed = []
+    real_prewarm = pool.prewarm
+
+    async def recording_prewarm(hosts):
+        warmed.extend(hosts)
+        return await real_prewarm(hosts)
+
+    with patch.object(pool, "prewarm", recording_prewarm):
+        await run_prewarm(pool, ["www.iesdouyin.com"], interval=0)
+
+    assert warmed == ["www.iesdouyin.com", "p3-sign.douyinpic.com"]
+    assert not pool.hot_hosts
+    results = await real_prewarm(["www.iesdouyin.com"])
+    assert isinstance(results["www.iesdouyin.com"], int)
+    await pool.aclose()
+
+
+async def test_hot_hosts_not_counted_without_periodic_prewarm(mock_douyin):
+    pool = UpstreamPool()
+    await run_prewarm(pool, [], interval=0)
+    stream = await pool.open("https://p3-sign.douyinpic.com/img/cover_1.jpeg")
+    await stream.aclose()
+    assert not pool.hot_hosts
+    await pool.aclose()
+
+
+async def test_cache_size_is_bounded():
+    cache = DNSCache(use_aiodns=False, max_entries=3)
+    _counting_lookup(cache)
+    for i in range(3):
+        await cache.resolve(f"h{i}.douyinvod.com")
+    # 过期的条目先被清理
+    addresses, _ = cache._entries["h1.douyinvod.com"]
+    cache._entries["h1.douyinvod.com"] = (addresses, 0)
+    await cache.resolve("h3.douyinvod.com")
+    assert list(cache._entries) == ["h0.douyinvod.com", "h2.douyinvod.com", "h3.douyinvod.com"]
+    # 没有过期的条目时淘汰最早写入的
+    await cache.resolve("h4.douyinvod.com")
+    assert list(cache._entries) == ["h2.douyinvod.com", "h3.douyinvod.com", "h4.douyinvod.com"]
+
+
+async def test_prewarm_resolves_page_hosts_without_connecting(mock_douyin):
+    cache = DNSCache(use_aiodns=False)
+    calls = _counting_lookup(cache)
+    pool = UpstreamPool()
+    with patch.object(dns_cache, "DNS_CACHE", cache):
+        await run_prewarm(pool, [], interval=0, dns_hosts=["www.iesdouyin.com", "www.douyin.com"])
+
+    assert calls == ["www.iesdouyin.com", "www.douyin.com"]
+    assert mock_douyin.requests == []
+    await pool.aclose()
@@ -1,3 +1,4 @@
+import queue
 import pytest
 import httpx
 from unittest.mock import patch, AsyncMock, MagicMock
@@ -56,3 +57,71 @@ async def test_download_video_http_error(tmp_path):
     with patch("douyin_core.httpx.AsyncClient", return_value=mock_client):
         with pytest.raises(httpx.HTTPStatusError):
             await download_video("https://example.com/video.mp4", save_path)
+
+
+async def test_file_writer_coalesces_small_chunks(tmp_path):
+    from douyin_core import _FileWriter
+
+    save_path = str(tmp_path / "out.bin")
+    sizes = []
+
+    class RecordingQueue(queue.Queue):
+        def put(self, item, *args, **kwargs):
+            if item is not None:
+                sizes.append(len(item))
+            super().put(item, *args, **kwargs)
+
+    writer = _FileWriter(save_path, buffer_size=10)
+    writer._queue = RecordingQueue()
+    async with writer:
+        for _ in range(7):
+            await writer.write(b"abc")
+
+    with open(save_path, "rb") as f:
+        assert f.read() == b"abc" * 7
+    # 3 字节的小块被合并为 >=10 字节的大块写入，最后剩余部分在关闭时写出
+    assert sizes == [12, 9]
+    assert writer.written == 21
+
+
+async def test_file_writer_preallocate_truncates_to_written(tmp_path):
+    from douyin_core import _FileWriter
+
+    save_path = str(tmp_path / "out.bin")
+    async with _FileWriter(save_path, preallocate=1024, fsync=True) as writer:
+        await writer.write(b"x" * 100)
+
+    assert (tmp_path / "out.bin").stat().st_size == 100
+
+
+async def test_file_writer_open_error_propagates(tmp_path):
+    from douyin_core import _FileWriter
+
+    save_path = str(tmp_path / "missing_dir" / "out.bin")
+    with pytest.raises(OSError):
+        async with _FileWriter(save_path, buffer_size=1, queue_size=1) as writer:
+            for _ in range(5):
+                await writer.write(b"data")
+
+
+async def test_download_video_preallocate(tmp_path):
+    save_path = str(tmp_path / "test.mp4")
+
+    async def fake_aiter_bytes(chunk_size=None):
+        yield b"0123456789"
+
+    mock_stream_resp = MagicMock()
+    mock_stream_resp.raise_for_status = MagicMock()
+    # content-length 大于实际数据（模拟截断），预分配的空间应被截掉
+    mock_stream_resp.headers = {"content-length": "4096"}
+    mock_stream_resp.aiter_bytes = fake_aiter_bytes
+    mock_stream_resp.__aenter__ = AsyncMock(return_value=mock_stream_resp)
+    mock_stream_resp.__aexit__ = AsyncMock(return_value=False)
+
+    mock_client = _make_stream_mock_client(mock_stream_resp)
+
+    with patch("douyin_core.httpx.AsyncClient", return_value=mock_client):
+        await download_video("https://example.com/video.mp4", save_path, preallocate=True)
+
+    with open(save_path, "rb") as f:
+        assert f.read() == b"0123456789"
@@ -0,0 +1,111 @@
+import io
+import csv
+import sys
+import json
+import asyncio
+import pytest
+from unittest.mock import patch
+
+import cli
+from export import export_links, parse_fields
+
+VIDEO = "https://www.douyin.com/video/7000000000000000005"
+IMAGES = "看看这个 https://www.douyin.com/note/7000000000000000004"
+MISSING = "https://www.douyin.com/video/7999999999999999999"
+
+
+class FlushCounter(io.StringIO):
+    """记录每次 flush 时已写出的行数"""
+
+    def __init__(self):
+        super().__init__()
+        self.flushed = []
+
+    def flush(self):
+        self.flushed.append(self.getvalue().count("\n"))
+
+
+async def test_ndjson_writes_one_compact_record_per_line(mock_douyin):
+    out = FlushCounter()
+    stats = await export_links([VIDEO, "", "# comment", IMAGES, MISSING], out, concurrency=1)
+
+    lines = out.getvalue().splitlines()
+    records = [json.loads(line) for line in lines]
+    assert stats == {"ok": 2, "failed": 1}
+    assert [r["input"] for r in records] == [VIDEO, IMAGES, MISSING]
+    assert records[0]["aweme_id"] == "7000000000000000005"
+    assert records[1]["type"] == "images" and records[1]["image_urls"]
+    assert "视频列表为空" in records[2]["error"]
+    # 每条记录写完立即 flush
+    assert out.flushed == [0, 1, 2, 3]
+
+
+async def test_ndjson_field_selection(mock_douyin):
+    out = io.StringIO()
+    await export_links([VIDEO], out, fields=("aweme_id", "title"))
+    assert json.loads(out.getvalue()).keys() == {"input", "aweme_id", "title"}
+
+
+async def test_csv_export(mock_douyin):
+    out = io.StringIO()
+    await export_links([VIDEO, MISSING], out, fmt="csv", fields=("aweme_id", "video_urls"), concurrency=1)
+
+    rows = list(csv.reader(io.StringIO(out.getvalue())))
+    assert rows[0] == ["input", "aweme_id", "video_urls", "error"]
+    assert rows[1][:2] == [VIDEO, "7000000000000000005"]
+    assert rows[1][2].startswith("https://") and rows[1][3] == ""
+    assert rows[2][1:3] == ["", ""] and rows[2][3]
+
+
+def test_parse_fields_rejects_unknown():
+    assert parse_fields("aweme_id, title") == ("aweme_id", "title")
+    with pytest.raises(ValueError, match="未知字段"):
+        parse_fields("aweme_id,nope")
+
+
+async def test_concurrency_and_read_ahead_are_bounded():
+    state = {"inflight": 0, "max": 0, "read": 0}
+
+    def lines():
+        for i in range(50):
+            state["read"] += 1
+            yield f"https://www.douyin.com/video/{7000000000000000000 + i}"
+
+    async def slow_parse(text):
+        state["inflight"] += 1
+        state["max"] = max(state["max"], state["inflight"])
+        await asyncio.sleep(0.001)
+        state["inflight"] -= 1
+        raise RuntimeError("skip")
+
+    reads_at_first_result = []
+
+    class Out(io.StringIO):
+        def flush(self):
+            if self.getvalue() and not reads_at_first_result:
+                reads_at_first_result.append(state["read"])
+
+    with patch("export._parse", side_effect=slow_parse):
+        stats = await export_links(lines(), Out(), concurrency=4)
+
+    assert stats == {"ok": 0, "failed": 50}
+    assert state["max"] == 4
+    # 第一条结果写出时，最多读入 并发数 + 队列长度 + 1 条
+    assert reads_at_first_result[0] <= 4 + 4 + 1
+
+
+def test_cli_export_reads_stdin(mock_douyin, monkeypatch, capsys):
+    monkeypatch.setattr(sys, "stdin", io.StringIO(f"{VIDEO}\n{IMAGES}\n"))
+    monkeypatch.setattr(sys, "argv", ["cli.py", "--export", "ndjson", "--input", "-", "--fields", "aweme_id"])
+    cli.main()
+
+    captured = capsys.readouterr()
+    ids = sorted(json.loads(line)["aweme_id"] for line in captured.out.splitlines())
+    assert ids == ["7000000000000000004", "7000000000000000005"]
+    assert "成功 2 条" in captured.err
+
+
+def test_cli_rejects_input_without_export(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["cli.py", "--input", "links.txt"])
+    with pytest.raises(SystemExit):
+        cli.main()
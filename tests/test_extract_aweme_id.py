@@ -22,6 +22,11 @@ def test_extract_aweme_id_vid_param():
     assert extract_aweme_id(url) == "7345678901234567890"
 
 
+def test_extract_aweme_id_slides_path():
+    url = "https://www.iesdouyin.com/share/slides/7345678901234567890/?region=CN"
+    assert extract_aweme_id(url) == "7345678901234567890"
+
+
 def test_extract_aweme_id_no_match_raises():
     with pytest.raises(ValueError, match="无法从 URL 中提取视频 ID"):
         extract_aweme_id("https://www.douyin.com/some/other/path")
@@ -0,0 +1,385 @@
+import asyncio
+import threading
+import httpx
+import pytest
+from unittest.mock import patch
+
+import fanout
+from fanout import FanoutHub, SpillBuffer, normalize_url
+from storage import DiskBudget
+
+URL = "https://v3-dy.douyinvod.com/video.mp4?b=2&a=1"
+
+_EOF = object()
+
+
+class FakeStream:
+    """上游流：测试通过 feed() 逐块推送数据"""
+
+    def __init__(self):
+        self.headers = {"content-type": "video/mp4"}
+        self.chunks = asyncio.Queue()
+        self.pulled = 0
+        self.closed = False
+
+    def feed(self, *chunks):
+        for chunk in chunks:
+            self.chunks.put_nowait(chunk)
+
+    async def aiter_bytes(self, chunk_size=None):
+        while True:
+            chunk = await self.chunks.get()
+            if chunk is _EOF:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            self.pulled += 1
+            yield chunk
+
+    async def aclose(self):
+        self.closed = True
+
+
+class FakePool:
+    def __init__(self, error=None, failing=()):
+        self.streams = []
+        self.error = error
+        self.failing = set(failing)
+        self.opened = []
+        self.active = 0
+        self.waiting = 0
+        self.max_streams = 64
+
+    async def open(self, url):
+        self.opened.append(url)
+        if self.error is not None:
+            raise self.error
+        if url in self.failing:
+            raise httpx.ConnectError("unreachable")
+        stream = FakeStream()
+        self.streams.append(stream)
+        return stream
+
+
+async def _read_all(reader):
+    try:
+        return b"".join([chunk async for chunk in reader.aiter_bytes()])
+    finally:
+        await reader.aclose()
+
+
+def test_normalize_url():
+    assert normalize_url("HTTPS://V3-DY.douyinvod.com/video.mp4?b=2&a=1#t=3") == normalize_url(
+        "https://v3-dy.douyinvod.com/video.mp4?a=1&b=2"
+    )
+    assert normalize_url(URL) != normalize_url("https://v3-dy.douyinvod.com/other.mp4?a=1&b=2")
+
+
+async def test_spill_buffer_moves_to_disk(tmp_path):
+    buffer = SpillBuffer(memory_limit=8, spill_dir=str(tmp_path))
+    await buffer.append(b"hello")
+    assert not buffer.spilled
+    await buffer.append(b" world")
+    assert buffer.spilled
+    assert await buffer.read(0, 100) == b"hello world"
+    assert await buffer.read(3, 4) == b"lo w"
+    buffer.close()
+
+
+async def test_concurrent_readers_share_one_upstream():
+    pool = FakePool()
+    hub = FanoutHub(pool)
+
+    first = await hub.open(URL)
+    second = await hub.open("https://v3-dy.douyinvod.com/video.mp4?a=1&b=2")
+    assert len(pool.streams) == 1
+    assert hub.inflight == 1 and hub.readers == 2
+
+    upstream = pool.streams[0]
+    upstream.feed(b"aa", b"bb")
+    reads = [asyncio.create_task(_read_all(r)) for r in (first, second)]
+    await asyncio.sleep(0.01)
+    upstream.feed(b"cc", _EOF)
+
+    assert await asyncio.gather(*reads) == [b"aabbcc", b"aabbcc"]
+    assert upstream.closed
+    assert hub.inflight == 0
+
+
+async def test_late_joiner_replays_then_follows_live(tmp_path):
+    pool = FakePool()
+    hub = FanoutHub(pool, memory_limit=4, spill_dir=str(tmp_path))
+
+    first = await hub.open(URL)
+    upstream = pool.streams[0]
+    upstream.feed(b"1111", b"2222")
+    first_read = asyncio.create_task(_read_all(first))
+    await asyncio.sleep(0.01)
+
+    # 已经落盘的数据先重放，之后跟随实时数据
+    late = await hub.open(URL)
+    late_read = asyncio.create_task(_read_all(late))
+    await asyncio.sleep(0.01)
+    upstream.feed(b"3333", _EOF)
+
+    assert await first_read == b"111122223333"
+    assert await late_read == b"111122223333"
+    assert len(pool.streams) == 1
+
+
+async def test_new_request_after_completion_opens_fresh_upstream():
+    pool = FakePool()
+    hub = FanoutHub(pool)
+
+    reader = await hub.open(URL)
+    pool.streams[0].feed(b"data", _EOF)
+    assert await _read_all(reader) == b"data"
+
+    reader = await hub.open(URL)
+    assert len(pool.streams) == 2
+    pool.streams[1].feed(_EOF)
+    await _read_all(reader)
+
+
+async def test_last_reader_leaving_cancels_upstream():
+    pool = FakePool()
+    hub = FanoutHub(pool)
+
+    readers = [await hub.open(URL) for _ in range(2)]
+    upstream = pool.streams[0]
+    upstream.feed(b"x")
+    await asyncio.sleep(0.01)
+
+    await readers[0].aclose()
+    assert not upstream.closed
+    await readers[1].aclose()
+    await asyncio.sleep(0.01)
+    assert upstream.closed
+    assert hub.inflight == 0
+
+
+async def test_upstream_open_error_reaches_every_reader():
+    request = httpx.Request("GET", URL)
+    error = httpx.HTTPStatusError("403", request=request, response=httpx.Response(403, request=request))
+    hub = FanoutHub(FakePool(error=error))
+
+    results = await asyncio.gather(hub.open(URL), hub.open(URL), return_exceptions=True)
+    assert all(r is error for r in results)
+    assert hub.inflight == 0
+
+
+async def test_midstream_error_is_raised_to_readers():
+    pool = FakePool()
+    hub = FanoutHub(pool)
+    reader = await hub.open(URL)
+    pool.streams[0].feed(b"part", httpx.ReadError("boom"))
+
+    with pytest.raises(httpx.ReadError):
+        await _read_all(reader)
+
+
+async def test_upstream_pauses_when_readers_lag():
+    pool = FakePool()
+    hub = FanoutHub(pool, readahead=4)
+    reader = await hub.open(URL)
+    upstream = pool.streams[0]
+    upstream.feed(*[b"abcd"] * 10, _EOF)
+    await asyncio.sleep(0.01)
+
+    # 读者还没开始读，上游最多领先 readahead
+    assert upstream.pulled <= 2
+
+    assert await _read_all(reader) == b"abcd" * 10
+    assert upstream.pulled == 10
+
+
+async def test_single_reader_passes_through_after_replay_window():
+    pool = FakePool()
+    hub = FanoutHub(pool, memory_limit=8, replay_limit=16, readahead=4)
+    reader = await hub.open(URL)
+    fetch = reader._fetch
+    pool.streams[0].feed(*[b"abcd"] * 20, _EOF)
+
+    data = b""
+    async for chunk in reader.aiter_bytes(4):
+        data += chunk
+        # 窗口之后只保留读者还没读的数据
+        assert fetch.buffer.size - fetch.buffer.start <= 16
+    await reader.aclose()
+    assert data == b"abcd" * 20
+    assert not fetch.buffer.spilled and fetch.buffer.start >= 64
+
+
+async def test_request_after_replay_window_opens_fresh_upstream():
+    pool = FakePool()
+    hub = FanoutHub(pool, replay_limit=8)
+    first = await hub.open(URL)
+    pool.streams[0].feed(b"1111", b"2222", b"3333")
+    await _until(lambda: pool.streams[0].pulled == 3)
+
+    # 开头的数据可能已被丢弃，不能再重放
+    second = await hub.open(URL)
+    assert len(pool.streams) == 2
+    pool.streams[0].feed(_EOF)
+    pool.streams[1].feed(b"fresh", _EOF)
+    assert await _read_all(first) == b"111122223333"
+    assert await _read_all(second) == b"fresh"
+
+
+async def test_slow_reader_bounds_buffer_after_window():
+    pool = FakePool()
+    hub = FanoutHub(pool, memory_limit=8, replay_limit=8, readahead=4)
+    fast = await hub.open(URL)
+    slow = await hub.open(URL)
+    upstream = pool.streams[0]
+    upstream.feed(*[b"abcd"] * 20, _EOF)
+
+    fast_read = asyncio.create_task(_read_all(fast))
+    await asyncio.sleep(0.01)
+    # 不读的读者让上游停住，而不是无限缓冲
+    assert upstream.pulled <= 6 and not fast_read.done()
+
+    assert await _read_all(slow) == b"abcd" * 20
+    assert await fast_read == b"abcd" * 20
+
+
+async def test_spill_is_counted_against_disk_budget(tmp_path):
+    budget = DiskBudget(limit=100, wait_timeout=0)
+    pool = FakePool()
+    hub = FanoutHub(pool, memory_limit=4, replay_limit=32, spill_dir=str(tmp_path), disk_budget=budget)
+    reader = await hub.open(URL)
+    pool.streams[0].feed(b"1111", b"2222")
+    await _until(lambda: reader._fetch.buffer.spilled)
+    assert budget.reserved == 32
+
+    pool.streams[0].feed(_EOF)
+    assert await _read_all(reader) == b"11112222"
+    await _until(lambda: budget.reserved == 0)
+
+
+async def test_window_closes_early_without_disk_budget(tmp_path):
+    budget = DiskBudget(limit=16, wait_timeout=0)
+    pool = FakePool()
+    hub = FanoutHub(pool, memory_limit=4, replay_limit=32, spill_dir=str(tmp_path), disk_budget=budget)
+    reader = await hub.open(URL)
+    pool.streams[0].feed(b"1111", b"2222", _EOF)
+
+    assert await _read_all(reader) == b"11112222"
+    assert not reader._fetch.buffer.spilled and budget.reserved == 0
+    assert hub.inflight == 0
+
+
+async def test_spill_file_outlives_cancelled_write(tmp_path):
+    started, release = threading.Event(), threading.Event()
+    real_pwrite = fanout.os.pwrite
+
+    def slow_pwrite(fd, data, offset):
+        started.set()
+        release.wait(5)
+        return real_pwrite(fd, data, offset)
+
+    buffer = SpillBuffer(memory_limit=4, spill_dir=str(tmp_path))
+    await buffer.append(b"1111")
+    await buffer.append(b"2222")
+    f = buffer._file
+    with patch("fanout.os.pwrite", slow_pwrite):
+        task = asyncio.create_task(buffer.append(b"3333"))
+        await asyncio.to_thread(started.wait, 5)
+        task.cancel()
+        await asyncio.sleep(0)
+        # 写线程仍在运行：文件描述符要等它结束后才关闭
+        buffer.close()
+        assert not f.closed
+        release.set()
+        await _until(lambda: f.closed)
+
+
+# ---- 预热 ----
+
+async def _until(predicate):
+    for _ in range(100):
+        if predicate():
+            return
+        await asyncio.sleep(0.001)
+    raise AssertionError("条件未满足")
+
+
+async def test_warm_reads_first_chunk_then_real_request_joins():
+    pool = FakePool()
+    hub = FanoutHub(pool, warm_limit=2, warm_bytes=4)
+    assert hub.warm([URL])
+    await _until(lambda: pool.streams)
+    upstream = pool.streams[0]
+    upstream.feed(*[b"abcd"] * 10, _EOF)
+    await asyncio.sleep(0.01)
+    # 预热只让上游领先 warm_bytes
+    assert upstream.pulled <= 2
+
+    reader = await hub.open(URL)
+    assert await _read_all(reader) == b"abcd" * 10
+    assert len(pool.streams) == 1
+    await _until(lambda: not hub._warming)
+    assert hub.warm_stats() == {"warming": 0, "started": 1, "used": 1, "skipped": 0}
+
+
+async def test_warm_tries_candidates_in_order():
+    bad = "https://aweme.snssdk.com/aweme/v1/play/?video_id=x&ratio=default"
+    pool = FakePool(failing=[bad])
+    hub = FanoutHub(pool, warm_limit=1)
+    hub.warm([bad, URL])
+    await _until(lambda: pool.streams)
+    assert pool.opened == [bad, URL]
+    assert hub.inflight == 1
+
+
+async def test_small_file_is_kept_until_warm_hold_ends():
+    pool = FakePool()
+    hub = FanoutHub(pool, warm_limit=1, warm_hold=0.05)
+    hub.warm([URL])
+    await _until(lambda: pool.streams)
+    pool.streams[0].feed(b"image", _EOF)
+    await asyncio.sleep(0.01)
+
+    # 上游已读完，真实请求直接从缓冲区重放
+    assert await _read_all(await hub.open(URL)) == b"image"
+    assert len(pool.streams) == 1
+
+
+async def test_unused_warm_is_released_after_hold():
+    pool = FakePool()
+    hub = FanoutHub(pool, warm_limit=1, warm_hold=0.01)
+    hub.warm([URL])
+    await _until(lambda: pool.streams)
+    await asyncio.sleep(0.05)
+    assert pool.streams[0].closed
+    assert hub.inflight == 0 and hub.warm_stats()["warming"] == 0
+
+
+async def test_warm_is_bounded_and_yields_to_real_traffic():
+    pool = FakePool()
+    hub = FanoutHub(pool, warm_limit=1)
+    assert hub.warm([URL])
+    assert not hub.warm([URL])  # 已在预热
+    assert not hub.warm(["https://v3-dy.douyinvod.com/other.mp4"])  # 达到上限
+
+    idle = FanoutHub(FakePool(), warm_limit=4)
+    idle.pool.waiting = 1
+    assert not idle.warm([URL])  # 连接池有请求在排队
+    assert not FanoutHub(FakePool()).warm([URL])  # 未开启
+    assert hub.warm_stats()["skipped"] == 2
+    for task in list(hub._warming.values()):
+        task.cancel()
+
+
+async def test_api_parse_warms_video_and_images(mock_douyin, monkeypatch):
+    import server
+
+    warmed = []
+    monkeypatch.setattr(server.FANOUT, "warm_limit", 4)
+    monkeypatch.setattr(server.FANOUT, "warm", lambda urls: warmed.append(urls) or True)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as client:
+        video = (await client.post("/api/parse", json={"share_text": "https://www.douyin.com/video/7000000000000000005"})).json()
+        images = (await client.post("/api/parse", json={"share_text": "https://www.douyin.com/video/7000000000000000004"})).json()
+
+    assert warmed[0] == video["data"]["video_urls"]
+    assert warmed[1:] == [[u] for u in images["data"]["image_urls"][:server.WARMUP_MAX_IMAGES]]
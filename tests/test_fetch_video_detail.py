@@ -5,14 +5,25 @@ from unittest.mock import patch, AsyncMock, MagicMock
 from douyin_core import fetch_video_detail
 
 
+def _make_redirect(location):
+    """构造一个只有 Location 头的 302 响应"""
+    redirect = MagicMock()
+    redirect.is_redirect = True
+    redirect.headers = {"location": location}
+    redirect.aclose = AsyncMock()
+    return redirect
+
+
 def _make_mock_client(html_text, final_url="https://www.iesdouyin.com/share/video/123/"):
-    """构造一个 mock httpx.AsyncClient，返回指定 HTML 的响应"""
+    """构造一个 mock httpx.AsyncClient：短链接重定向到 final_url，页面返回指定 HTML"""
     mock_response = MagicMock()
     mock_response.text = html_text
     mock_response.raise_for_status = MagicMock()
     mock_response.url = final_url
 
     mock_client = AsyncMock()
+    mock_client.build_request = MagicMock(side_effect=lambda method, url, **kwargs: url)
+    mock_client.send.return_value = _make_redirect(final_url)
     mock_client.get.return_value = mock_response
     mock_client.__aenter__.return_value = mock_client
     mock_client.__aexit__.return_value = False
@@ -72,45 +83,60 @@ async def test_fetch_video_detail_empty_item_list():
             await fetch_video_detail("https://v.douyin.com/xxx/")
 
 
-async def test_fetch_video_detail_slides_fallback(sample_detail):
-    """当重定向到 /share/slides/ 时，应自动改用 /share/video/ 路径重新请求"""
-    # 第一次请求返回 slides 页面（无 _ROUTER_DATA）
-    slides_response = MagicMock()
-    slides_response.text = "<html><body>slides CSR page</body></html>"
-    slides_response.raise_for_status = MagicMock()
-    slides_response.url = "https://www.iesdouyin.com/share/slides/7604002509288003003/?region=CN"
-
-    # 第二次请求返回 video 页面（有 _ROUTER_DATA）
-    router_data = {
-        "loaderData": {
-            "video_(id)/page": {
-                "videoInfoRes": {
-                    "item_list": [sample_detail]
-                }
-            }
-        }
-    }
-    video_html = (
-        "<html><head></head><body>"
-        f"<script>window._ROUTER_DATA = {json.dumps(router_data, ensure_ascii=False)}</script>"
-        "</body></html>"
+async def test_fetch_video_detail_slides_fallback(sample_detail, sample_router_data_html):
+    """重定向到 /share/slides/ 时，不请求 CSR 页面，直接改用 /share/video/ 路径"""
+    mock_client = _make_mock_client(
+        sample_router_data_html,
+        final_url="https://www.iesdouyin.com/share/slides/7604002509288003003/?region=CN",
     )
-    video_response = MagicMock()
-    video_response.text = video_html
-    video_response.raise_for_status = MagicMock()
-    video_response.url = "https://www.iesdouyin.com/share/video/7604002509288003003/"
-
-    mock_client = AsyncMock()
-    mock_client.get.side_effect = [slides_response, video_response]
-    mock_client.__aenter__.return_value = mock_client
-    mock_client.__aexit__.return_value = False
 
     with patch("douyin_core.httpx.AsyncClient", return_value=mock_client):
         result = await fetch_video_detail("https://v.douyin.com/EygiOkP3IAU/")
 
     assert result["aweme_id"] == sample_detail["aweme_id"]
-    assert result["desc"] == sample_detail["desc"]
-    # 验证第二次请求使用了 /share/video/ 路径
-    assert mock_client.get.call_count == 2
-    second_call_url = mock_client.get.call_args_list[1][0][0]
-    assert "/share/video/7604002509288003003/" in second_call_url
+    # 只读取了短链接的重定向头，页面只加载一次
+    assert mock_client.send.call_count == 1
+    assert mock_client.send.call_args.kwargs == {"stream": True, "follow_redirects": False}
+    mock_client.send.return_value.aclose.assert_awaited_once()
+    assert mock_client.get.call_count == 1
+    assert mock_client.get.call_args[0][0] == "https://www.iesdouyin.com/share/video/7604002509288003003/"
+
+
+async def test_fetch_video_detail_full_url_skips_redirect(sample_router_data_html):
+    """完整的视频链接直接提取 ID，不发重定向请求"""
+    mock_client = _make_mock_client(sample_router_data_html)
+
+    with patch("douyin_core.httpx.AsyncClient", return_value=mock_client):
+        await fetch_video_detail("https://www.douyin.com/video/7345678901234567890")
+
+    mock_client.send.assert_not_called()
+    assert mock_client.get.call_args[0][0] == "https://www.iesdouyin.com/share/video/7345678901234567890/"
+
+
+async def test_fetch_video_detail_multi_hop_redirect(sample_router_data_html):
+    """多次重定向时逐跳读取 Location（支持相对地址），直到能提取出 ID"""
+    mock_client = _make_mock_client(sample_router_data_html)
+    mock_client.send.side_effect = [
+        _make_redirect("https://www.iesdouyin.com/jump?x=1"),
+        _make_redirect("/share/video/7345678901234567890/?region=CN"),
+    ]
+
+    with patch("douyin_core.httpx.AsyncClient", return_value=mock_client):
+        await fetch_video_detail("https://v.douyin.com/xxx/")
+
+    assert [c[0][0] for c in mock_client.send.call_args_list] == [
+        "https://v.douyin.com/xxx/",
+        "https://www.iesdouyin.com/jump?x=1",
+    ]
+    assert mock_client.get.call_args[0][0] == "https://www.iesdouyin.com/share/video/7345678901234567890/"
+
+
+async def test_fetch_video_detail_end_to_end_reads_no_intermediate_page(mock_douyin):
+    """真实 HTTP 流程：短链接 → slides 落地页，只请求一次分享页"""
+    aweme_id = "7000000000000000004"
+    mock_douyin.short_links["slides"] = f"https://www.iesdouyin.com/share/slides/{aweme_id}/?region=CN"
+
+    detail = await fetch_video_detail("https://v.douyin.com/slides/")
+
+    assert detail["aweme_id"] == aweme_id
+    assert mock_douyin.requests == ["/slides/", f"/share/video/{aweme_id}/"]
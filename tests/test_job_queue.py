@@ -0,0 +1,298 @@
+import os
+import threading
+import pytest
+from unittest.mock import patch
+
+import job_queue
+from job_queue import RedisQueue, SQLiteQueue, open_queue, retry_delay
+from worker import run_worker
+
+
+@pytest.fixture
+def queue(tmp_path):
+    with SQLiteQueue(str(tmp_path / "jobs.sqlite3"), visibility_timeout=60, max_attempts=3, backoff=10) as q:
+        yield q
+
+
+def expire_leases(queue):
+    """模拟租约到期"""
+    queue._db.execute("UPDATE jobs SET lease_until = 0 WHERE status = 'leased'")
+
+
+def test_lease_and_ack(queue):
+    job_id = queue.enqueue("parse", {"share_text": "https://v.douyin.com/a/"})
+    job = queue.lease()
+    assert job.id == job_id and job.kind == "parse" and job.attempts == 1
+    assert queue.lease() is None  # 已被领取
+
+    assert queue.ack(job, {"aweme_id": "1"})
+    record = queue.get(job_id)
+    assert record["status"] == "done" and record["result"] == {"aweme_id": "1"}
+    assert queue.stats() == {"ready": 0, "leased": 0, "done": 1, "dead": 0}
+
+
+def test_leases_are_exclusive_across_connections(queue):
+    for i in range(5):
+        queue.enqueue("parse", {"share_text": str(i)})
+    with SQLiteQueue(queue.path) as other:
+        leased = [q.lease() for q in (queue, other) * 3]
+    ids = [job.id for job in leased if job]
+    assert len(ids) == 5 and len(set(ids)) == 5
+
+
+def test_expired_lease_is_reassigned_and_stale_ack_ignored(queue):
+    queue.enqueue("download", {"share_text": "x"})
+    first = queue.lease()
+    expire_leases(queue)
+
+    second = queue.lease()
+    assert second.id == first.id and second.attempts == 2
+    # 原 worker 失联后再提交，结果不会覆盖新的租约
+    assert not queue.ack(first)
+    assert not queue.extend(first)
+    assert queue.extend(second)
+    assert queue.ack(second)
+
+
+def test_failures_back_off_then_dead_letter(queue):
+    job_id = queue.enqueue("download", {"share_text": "x"})
+    for attempt in (1, 2):
+        job = queue.lease()
+        assert job.attempts == attempt
+        queue.fail(job, "boom")
+        # 退避期间不可领取
+        assert queue.lease() is None
+        queue._db.execute("UPDATE jobs SET available_at = 0")
+
+    job = queue.lease()
+    queue.fail(job, "boom again")
+    assert queue.get(job_id)["status"] == "dead"
+    assert [j["last_error"] for j in queue.dead()] == ["boom again"]
+
+    assert queue.requeue(job_id)
+    assert queue.lease().attempts == 1
+
+
+def test_permanent_failure_skips_retries(queue):
+    job_id = queue.enqueue("parse", {})
+    queue.fail(queue.lease(), "invalid", retry=False)
+    assert queue.get(job_id)["status"] == "dead"
+
+
+def test_crashing_job_is_dead_lettered_after_max_attempts(queue):
+    job_id = queue.enqueue("download", {"share_text": "x"})
+    for _ in range(3):
+        assert queue.lease() is not None
+        expire_leases(queue)
+    assert queue.lease() is None
+    assert queue.get(job_id)["status"] == "dead"
+
+
+def test_retry_delay_is_exponential_and_capped():
+    assert [retry_delay(n, 10) for n in (1, 2, 3)] == [10, 20, 40]
+    assert retry_delay(30, 10) == job_queue.MAX_BACKOFF
+
+
+def test_open_queue_urls(tmp_path):
+    path = tmp_path / "q.sqlite3"
+    with open_queue(f"sqlite://{path}") as q:
+        assert q.path == str(path)
+    with open_queue(str(tmp_path / "plain.sqlite3"), max_attempts=2) as q:
+        assert q.max_attempts == 2
+    with pytest.raises(ValueError):
+        open_queue("amqp://localhost/")
+    with patch("job_queue.redis", None):
+        with pytest.raises(RuntimeError, match="redis"):
+            open_queue("redis://localhost:6379/0")
+
+
+async def test_worker_processes_parse_and_download_jobs(mock_douyin, queue, tmp_path):
+    parse_id = queue.enqueue("parse", {"share_text": "https://www.douyin.com/video/7000000000000000005"})
+    download_id = queue.enqueue("download", {"share_text": "https://www.douyin.com/video/7000000000000000002"})
+    invalid_id = queue.enqueue("download", {"share_text": "没有链接"})
+    missing_id = queue.enqueue("parse", {"share_text": "https://www.douyin.com/video/7999999999999999999"})
+
+    output = tmp_path / "out"
+    count = await run_worker(queue, str(output), concurrency=2, drain=True)
+
+    assert count == 4
+    assert queue.get(parse_id)["result"]["aweme_id"] == "7000000000000000005"
+    download = queue.get(download_id)
+    assert download["status"] == "done"
+    assert all(os.path.exists(p) for p in download["result"]["paths"])
+    assert queue.get(invalid_id)["status"] == "dead"
+    # 临时错误按退避重试，不会立刻进入死信
+    missing = queue.get(missing_id)
+    assert missing["status"] == "ready" and "视频列表为空" in missing["last_error"]
+
+    # 同一作品再次下载时由下载清单跳过
+    again = queue.enqueue("download", {"share_text": "https://www.douyin.com/video/7000000000000000002"})
+    await run_worker(queue, str(output), drain=True)
+    assert queue.get(again)["result"]["skipped"] is True
+
+
+async def test_worker_calls_queue_off_the_event_loop(mock_douyin, queue, tmp_path):
+    loop_thread = threading.get_ident()
+    threads = set()
+
+    def record(method):
+        def wrapper(*args, **kwargs):
+            threads.add(threading.get_ident())
+            return method(*args, **kwargs)
+        return wrapper
+
+    queue.enqueue("parse", {"share_text": "https://www.douyin.com/video/7000000000000000005"})
+    queue.enqueue("parse", {"share_text": "没有链接"})
+    with patch.object(queue, "lease", record(queue.lease)), \
+            patch.object(queue, "ack", record(queue.ack)), \
+            patch.object(queue, "fail", record(queue.fail)):
+        assert await run_worker(queue, str(tmp_path / "out"), drain=True) == 2
+    # 阻塞的队列调用不在事件循环线程上执行
+    assert threads and loop_thread not in threads
+
+
+# ====== RedisQueue（fakeredis 在进程内执行 Lua 脚本）======
+
+
+@pytest.fixture
+def redis_server():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    return fakeredis.FakeServer()
+
+
+def make_redis_queue(server, **kwargs):
+    import fakeredis
+
+    client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    kwargs = {"visibility_timeout": 60, "max_attempts": 3, "backoff": 10, **kwargs}
+    return RedisQueue(client, prefix="test:jobs", **kwargs)
+
+
+@pytest.fixture
+def redis_queue(redis_server):
+    with make_redis_queue(redis_server) as q:
+        yield q
+
+
+def expire_redis_leases(queue):
+    """模拟租约到期"""
+    key = f"{queue.prefix}:leased"
+    for job_id in queue._redis.zrange(key, 0, -1):
+        queue._redis.zadd(key, {job_id: 0})
+
+
+def end_redis_backoff(queue):
+    """模拟退避结束"""
+    key = f"{queue.prefix}:ready"
+    for job_id in queue._redis.zrange(key, 0, -1):
+        queue._redis.zadd(key, {job_id: 0})
+
+
+def test_redis_lease_and_ack(redis_queue):
+    job_id = redis_queue.enqueue("parse", {"share_text": "https://v.douyin.com/a/"})
+    job = redis_queue.lease()
+    assert job.id == job_id and job.kind == "parse" and job.attempts == 1
+    assert job.payload == {"share_text": "https://v.douyin.com/a/"}
+    assert redis_queue.lease() is None  # 已被领取
+    assert redis_queue.stats() == {"ready": 0, "leased": 1, "dead": 0}
+
+    assert redis_queue.ack(job, {"aweme_id": "1"})
+    record = redis_queue.get(job_id)
+    assert record["status"] == "done" and record["result"] == {"aweme_id": "1"}
+    assert redis_queue.stats() == {"ready": 0, "leased": 0, "dead": 0}
+    # 完成后不能再次提交
+    assert not redis_queue.ack(job)
+
+
+def test_redis_delayed_job_is_not_leased_early(redis_queue):
+    redis_queue.enqueue("parse", {}, delay=3600)
+    assert redis_queue.lease() is None
+    end_redis_backoff(redis_queue)
+    assert redis_queue.lease() is not None
+
+
+def test_redis_leases_are_exclusive_across_clients(redis_server, redis_queue):
+    for i in range(5):
+        redis_queue.enqueue("parse", {"share_text": str(i)})
+    with make_redis_queue(redis_server) as other:
+        leased = [q.lease() for q in (redis_queue, other) * 3]
+    ids = [job.id for job in leased if job]
+    assert len(ids) == 5 and len(set(ids)) == 5
+
+
+def test_redis_expired_lease_is_reassigned_and_stale_ack_ignored(redis_queue):
+    job_id = redis_queue.enqueue("download", {"share_text": "x"})
+    first = redis_queue.lease()
+    assert redis_queue.extend(first)
+    expire_redis_leases(redis_queue)
+
+    second = redis_queue.lease()
+    assert second.id == first.id == job_id and second.attempts == 2
+    # 原 worker 失联后再提交，结果不会覆盖新的租约
+    assert not redis_queue.ack(first)
+    assert not redis_queue.extend(first)
+    assert not redis_queue.fail(first, "stale")
+    assert redis_queue.extend(second)
+    assert redis_queue.ack(second)
+    assert redis_queue.get(job_id)["last_error"] is None
+
+
+def test_redis_failures_back_off_then_dead_letter(redis_queue):
+    job_id = redis_queue.enqueue("download", {"share_text": "x"})
+    for attempt in (1, 2):
+        job = redis_queue.lease()
+        assert job.attempts == attempt
+        assert redis_queue.fail(job, "boom")
+        # 退避期间不可领取
+        assert redis_queue.lease() is None
+        end_redis_backoff(redis_queue)
+
+    job = redis_queue.lease()
+    assert job.last_error == "boom"
+    assert redis_queue.fail(job, "boom again")
+    assert redis_queue.get(job_id)["status"] == "dead"
+    assert [j["last_error"] for j in redis_queue.dead()] == ["boom again"]
+    assert redis_queue.stats() == {"ready": 0, "leased": 0, "dead": 1}
+
+    assert redis_queue.requeue(job_id)
+    assert not redis_queue.requeue(job_id)  # 已不在死信中
+    assert redis_queue.lease().attempts == 1
+
+
+def test_redis_permanent_failure_skips_retries(redis_queue):
+    job_id = redis_queue.enqueue("parse", {})
+    redis_queue.fail(redis_queue.lease(), "invalid", retry=False)
+    assert redis_queue.get(job_id)["status"] == "dead"
+
+
+def test_redis_crashing_job_is_dead_lettered_after_max_attempts(redis_queue):
+    job_id = redis_queue.enqueue("download", {"share_text": "x"})
+    for _ in range(3):
+        assert redis_queue.lease() is not None
+        expire_redis_leases(redis_queue)
+    assert redis_queue.lease() is None
+    record = redis_queue.get(job_id)
+    assert record["status"] == "dead" and record["last_error"] == "lease expired"
+    assert redis_queue.stats() == {"ready": 0, "leased": 0, "dead": 1}
+
+
+def test_open_queue_redis_url(redis_server):
+    import fakeredis
+
+    client = fakeredis.FakeRedis(server=redis_server, decode_responses=True)
+    with patch("job_queue.redis.Redis.from_url", return_value=client) as from_url:
+        with open_queue("redis://localhost:6379/0", max_attempts=2) as q:
+            assert isinstance(q, RedisQueue) and q.max_attempts == 2
+    from_url.assert_called_once_with("redis://localhost:6379/0", decode_responses=True)
+
+
+async def test_worker_with_redis_queue(mock_douyin, redis_queue, tmp_path):
+    parse_id = redis_queue.enqueue("parse", {"share_text": "https://www.douyin.com/video/7000000000000000005"})
+    invalid_id = redis_queue.enqueue("download", {"share_text": "没有链接"})
+
+    count = await run_worker(redis_queue, str(tmp_path / "out"), concurrency=2, drain=True)
+
+    assert count == 2
+    assert redis_queue.get(parse_id)["result"]["aweme_id"] == "7000000000000000005"
+    assert redis_queue.get(invalid_id)["status"] == "dead"
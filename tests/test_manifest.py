@@ -0,0 +1,119 @@
+import hashlib
+from unittest.mock import patch, AsyncMock
+
+from douyin_core import parse_and_download
+from manifest import Manifest, MANIFEST_FILENAME
+
+
+async def _fake_download(url, save_path, **kwargs):
+    with open(save_path, "wb") as f:
+        f.write(b"video bytes")
+    return save_path
+
+
+async def test_manifest_record_and_lookup(tmp_path):
+    video = tmp_path / "a.mp4"
+    video.write_bytes(b"hello")
+    info = {"aweme_id": "123", "type": "video", "title": "t", "author": "a"}
+
+    with Manifest(str(tmp_path)) as manifest:
+        await manifest.record(
+            info,
+            [str(video)],
+            url="https://aweme.snssdk.com/aweme/v1/play/?video_id=v1&ratio=1080p&line=0",
+            share_url="https://v.douyin.com/abc/",
+        )
+        record = manifest.lookup("https://v.douyin.com/abc/")
+
+    assert (tmp_path / MANIFEST_FILENAME).exists()
+    assert record["aweme_id"] == "123"
+    assert record["paths"] == [str(video)]
+    assert record["size"] == 5
+    assert record["ratio"] == "1080p"
+    assert record["sha256"] == [hashlib.sha256(b"hello").hexdigest()]
+    assert record["info"]["title"] == "t"
+
+
+async def test_manifest_missing_file_invalidates_record(tmp_path):
+    video = tmp_path / "a.mp4"
+    video.write_bytes(b"hello")
+
+    with Manifest(str(tmp_path)) as manifest:
+        await manifest.record({"aweme_id": "123"}, [str(video)])
+        video.unlink()
+        assert manifest.get("123") is None
+
+
+async def test_manifest_size_mismatch_invalidates_record(tmp_path):
+    video = tmp_path / "a.mp4"
+    video.write_bytes(b"hello")
+
+    with Manifest(str(tmp_path)) as manifest:
+        await manifest.record({"aweme_id": "123"}, [str(video)])
+        video.write_bytes(b"truncated?")
+        assert manifest.get("123") is None
+
+
+async def test_parse_and_download_skips_known_link(tmp_path, sample_detail):
+    """第二次运行同一链接时，不应再请求分享页或 CDN"""
+    mock_fetch = AsyncMock(return_value=sample_detail)
+    mock_download = AsyncMock(side_effect=_fake_download)
+
+    with (
+        patch("douyin_core.fetch_video_detail", mock_fetch),
+        patch("douyin_core.download_video", mock_download),
+        Manifest(str(tmp_path)) as manifest,
+    ):
+        first = await parse_and_download("https://v.douyin.com/xxx/", str(tmp_path), manifest=manifest)
+        second = await parse_and_download("https://v.douyin.com/xxx/", str(tmp_path), manifest=manifest)
+
+    assert first["downloaded"] is True
+    assert "skipped" not in first
+    assert second["skipped"] is True
+    assert second["save_path"] == first["save_path"]
+    assert mock_fetch.call_count == 1
+    assert mock_download.call_count == 1
+
+
+async def test_parse_and_download_skips_known_aweme_id_before_cdn(tmp_path, sample_detail):
+    """不同分享链接指向同一作品：需要请求分享页，但不应再下载"""
+    mock_fetch = AsyncMock(return_value=sample_detail)
+    mock_download = AsyncMock(side_effect=_fake_download)
+
+    with (
+        patch("douyin_core.fetch_video_detail", mock_fetch),
+        patch("douyin_core.download_video", mock_download),
+        Manifest(str(tmp_path)) as manifest,
+    ):
+        await parse_and_download("https://v.douyin.com/aaa/", str(tmp_path), manifest=manifest)
+        second = await parse_and_download("https://v.douyin.com/bbb/", str(tmp_path), manifest=manifest)
+        # 新链接已被记录，第三次连分享页也不用请求
+        await parse_and_download("https://v.douyin.com/bbb/", str(tmp_path), manifest=manifest)
+
+    assert second["skipped"] is True
+    assert mock_fetch.call_count == 2
+    assert mock_download.call_count == 1
+
+
+async def test_parse_and_download_force_redownloads(tmp_path, sample_detail):
+    mock_download = AsyncMock(side_effect=_fake_download)
+
+    with (
+        patch("douyin_core.fetch_video_detail", AsyncMock(return_value=sample_detail)),
+        patch("douyin_core.download_video", mock_download),
+        Manifest(str(tmp_path)) as manifest,
+    ):
+        await parse_and_download("https://v.douyin.com/xxx/", str(tmp_path), manifest=manifest)
+        again = await parse_and_download(
+            "https://v.douyin.com/xxx/", str(tmp_path), manifest=manifest, force=True
+        )
+
+    assert "skipped" not in again
+    assert mock_download.call_count == 2
+
+
+def test_manifest_can_be_shared_by_worker_processes(tmp_path):
+    # WAL + 忙等待：多个 worker 进程写同一个清单时不会报 database is locked
+    with Manifest(str(tmp_path)) as manifest:
+        assert manifest._db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert manifest._db.execute("PRAGMA busy_timeout").fetchone()[0] > 0
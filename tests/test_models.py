@@ -0,0 +1,91 @@
+import json
+from unittest.mock import patch
+
+import pytest
+
+import models
+from models import VideoInfo, ImagePostInfo, dumps
+from douyin_core import extract_video_urls
+
+
+def test_extract_video_urls_returns_models(sample_detail, sample_image_detail):
+    assert isinstance(extract_video_urls(sample_detail), VideoInfo)
+    assert isinstance(extract_video_urls(sample_image_detail), ImagePostInfo)
+
+
+def test_video_info_uses_slots():
+    info = VideoInfo(title="t")
+    assert not hasattr(info, "__dict__")
+    with pytest.raises(AttributeError):
+        info.unknown_attr = 1
+
+
+def test_dict_compatible_view():
+    info = VideoInfo(title="标题", author="作者", aweme_id="1", video_urls=["u"])
+
+    assert info["title"] == "标题"
+    assert info.get("type") == "video"
+    assert info.get("missing", "x") == "x"
+    assert "video_urls" in info
+    assert "save_path" not in info
+
+    info["downloaded"] = True
+    info["save_path"] = "/tmp/a.mp4"
+    info["title"] = "新标题"
+    assert info.title == "新标题"
+    assert info.extra == {"downloaded": True, "save_path": "/tmp/a.mp4"}
+    assert list(info)[-2:] == ["downloaded", "save_path"]
+
+    as_dict = dict(info)
+    assert as_dict["type"] == "video"
+    assert as_dict["save_path"] == "/tmp/a.mp4"
+    assert "extra" not in as_dict
+    assert info == as_dict
+    assert {**info}["aweme_id"] == "1"
+
+
+def test_cannot_delete_fields():
+    info = ImagePostInfo()
+    info["error"] = "x"
+    del info["error"]
+    assert "error" not in info
+    with pytest.raises(KeyError):
+        del info["title"]
+
+
+def test_copy_is_independent():
+    info = VideoInfo(title="a")
+    info["downloaded"] = False
+    clone = info.copy()
+    clone["downloaded"] = True
+    assert info["downloaded"] is False
+    assert isinstance(clone, VideoInfo)
+
+
+def test_to_dict_matches_legacy_layout(sample_detail):
+    info = extract_video_urls(sample_detail)
+    assert list(info.to_dict()) == [
+        "title", "author", "aweme_id", "type", "video_urls", "image_urls", "audio_urls", "cover_url", "duration", "expires_at",
+    ]
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps_with_and_without_orjson(use_orjson, sample_detail):
+    if use_orjson and models.orjson is None:
+        pytest.skip("orjson 未安装")
+    info = extract_video_urls(sample_detail)
+    info["downloaded"] = False
+
+    backend = models.orjson if use_orjson else None
+    with patch("models.orjson", backend):
+        compact = dumps({"success": True, "data": info})
+        pretty = dumps([info], indent=True)
+
+    data = json.loads(compact)
+    assert data["data"]["title"] == "测试视频标题"
+    assert data["data"]["downloaded"] is False
+    assert "extra" not in data["data"]
+    # 中文不转义
+    assert "测试视频标题".encode() in compact
+    assert b"\n  " in pretty
+    assert json.loads(pretty)[0] == data["data"]
@@ -0,0 +1,146 @@
+import struct
+import pytest
+from unittest.mock import patch
+
+from mp4 import Mp4Error, check_mp4, faststart, finalize_mp4, iter_boxes
+from douyin_core import parse_and_download
+
+
+def box(box_type: bytes, payload: bytes = b"") -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def offsets_box(box_type: bytes, offsets: list) -> bytes:
+    code = "I" if box_type == b"stco" else "Q"
+    return box(box_type, struct.pack(">II", 0, len(offsets)) + struct.pack(f">{len(offsets)}{code}", *offsets))
+
+
+def moov_with(offsets: list, box_type: bytes = b"stco") -> bytes:
+    stbl = box(b"stbl", box(b"stsd", b"\0" * 8) + offsets_box(box_type, offsets))
+    return box(b"moov", box(b"mvhd", b"\0" * 20) + box(b"trak", box(b"mdia", box(b"minf", stbl))))
+
+
+CHUNKS = [b"AAAA", b"BBBBBB", b"CC"]
+
+
+def moov_at_end_mp4() -> bytes:
+    """ftyp + mdat(CHUNKS) + moov，stco 指向各个 chunk"""
+    ftyp = box(b"ftyp", b"isom\0\0\0\0isomavc1")
+    data_start = len(ftyp) + 8
+    offsets, pos = [], data_start
+    for chunk in CHUNKS:
+        offsets.append(pos)
+        pos += len(chunk)
+    return ftyp + box(b"mdat", b"".join(CHUNKS)) + moov_with(offsets)
+
+
+def read_chunks(path) -> list:
+    """按 moov 中的 stco 偏移读出各个 chunk"""
+    data = open(path, "rb").read()
+    stco = data.index(b"stco") - 4
+    count = struct.unpack_from(">I", data, stco + 12)[0]
+    offsets = struct.unpack_from(f">{count}I", data, stco + 16)
+    return [data[o:o + len(c)] for o, c in zip(offsets, CHUNKS)]
+
+
+def test_check_mp4_reports_layout(tmp_path):
+    path = tmp_path / "v.mp4"
+    path.write_bytes(moov_at_end_mp4())
+    report = check_mp4(str(path), expected_size=path.stat().st_size)
+    assert report["boxes"] == ["ftyp", "mdat", "moov"]
+    assert report["faststart"] is False
+
+
+def test_check_mp4_size_mismatch(tmp_path):
+    path = tmp_path / "v.mp4"
+    path.write_bytes(moov_at_end_mp4())
+    with pytest.raises(Mp4Error, match="content-length"):
+        check_mp4(str(path), expected_size=path.stat().st_size + 100)
+
+
+@pytest.mark.parametrize("cut", [3, 20, 40])
+def test_check_mp4_detects_truncation(tmp_path, cut):
+    path = tmp_path / "v.mp4"
+    path.write_bytes(moov_at_end_mp4()[:-cut])
+    with pytest.raises(Mp4Error):
+        check_mp4(str(path))
+
+
+def test_check_mp4_missing_moov(tmp_path):
+    path = tmp_path / "v.mp4"
+    path.write_bytes(box(b"ftyp", b"isom") + box(b"mdat", b"data"))
+    with pytest.raises(Mp4Error, match="moov"):
+        check_mp4(str(path))
+
+
+def test_iter_boxes_handles_64bit_and_open_ended_sizes(tmp_path):
+    path = tmp_path / "v.mp4"
+    large = struct.pack(">I4sQ", 1, b"free", 16 + 4) + b"xxxx"
+    open_ended = struct.pack(">I4s", 0, b"mdat") + b"rest of file"
+    path.write_bytes(box(b"ftyp", b"isom") + large + open_ended)
+    with open(path, "rb") as f:
+        boxes = list(iter_boxes(f, path.stat().st_size))
+    assert [(t, s) for t, _, s in boxes] == [(b"ftyp", 12), (b"free", 20), (b"mdat", 20)]
+
+
+def test_faststart_moves_moov_and_fixes_offsets(tmp_path):
+    path = tmp_path / "v.mp4"
+    original = moov_at_end_mp4()
+    path.write_bytes(original)
+
+    assert faststart(str(path)) is True
+    report = check_mp4(str(path), expected_size=len(original))
+    assert report["boxes"] == ["ftyp", "moov", "mdat"]
+    assert report["faststart"] is True
+    assert read_chunks(path) == CHUNKS
+    # 已经是 fast-start 时不再处理
+    assert faststart(str(path)) is False
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_faststart_converts_stco_to_co64_past_4gb(tmp_path):
+    path = tmp_path / "v.mp4"
+    ftyp = box(b"ftyp", b"isom")
+    mdat = box(b"mdat", b"data")
+    near_limit = 0xFFFFFFFF - 10
+    path.write_bytes(ftyp + mdat + moov_with([len(ftyp) + 8, near_limit]))
+
+    faststart(str(path))
+    data = path.read_bytes()
+    assert b"stco" not in data and b"co64" in data
+    co64 = data.index(b"co64") - 4
+    first, second = struct.unpack_from(">2Q", data, co64 + 16)
+    moov_size = struct.unpack_from(">I", data, len(ftyp))[0]
+    assert data[first:first + 4] == b"data"
+    assert second == near_limit + moov_size - len(moov_with([0, 0]))
+
+
+def test_finalize_mp4_relocates(tmp_path):
+    path = tmp_path / "v.mp4"
+    path.write_bytes(moov_at_end_mp4())
+    report = finalize_mp4(str(path), path.stat().st_size)
+    assert report["relocated"] is True
+    assert report["faststart"] is True
+
+
+async def test_parse_and_download_faststart_rejects_truncated_video(mock_douyin, tmp_path):
+    """开启 faststart 时，结构不完整的视频视为下载失败"""
+    mock_douyin.short_links["v"] = "https://www.iesdouyin.com/share/video/7000000000000000005/"
+    with pytest.raises(RuntimeError, match="所有视频地址均下载失败"):
+        await parse_and_download("https://v.douyin.com/v/", str(tmp_path), faststart=True)
+
+
+async def test_parse_and_download_faststart_relocates_moov(mock_douyin, tmp_path):
+    mock_douyin.short_links["v"] = "https://www.iesdouyin.com/share/video/7000000000000000005/"
+    mp4 = moov_at_end_mp4()
+
+    async def fake_download(url, save_path, **kwargs):
+        with open(save_path, "wb") as f:
+            f.write(mp4)
+        kwargs["postprocess"](save_path, len(mp4))
+        return save_path
+
+    with patch("douyin_core.download_video", side_effect=fake_download):
+        info = await parse_and_download("https://v.douyin.com/v/", str(tmp_path), faststart=True)
+
+    assert check_mp4(info["save_path"])["faststart"] is True
@@ -0,0 +1,235 @@
+import pickle
+import asyncio
+import httpx
+import pytest
+from unittest.mock import patch
+
+from douyin_core import fetch_video_detail, parse_router_data, extract_video_urls, url_expires_at
+from models import VideoInfo
+from parse_cache import NEGATIVE_CACHE, NegativeCache, ParseCache, PostUnavailableError, EXPIRY_MARGIN
+from server import app
+
+DELETED = "7000000000000000005"
+
+
+async def test_deleted_post_is_answered_from_cache(mock_douyin):
+    mock_douyin.deleted.add(DELETED)
+    url = f"https://www.douyin.com/video/{DELETED}"
+    for _ in range(3):
+        with pytest.raises(PostUnavailableError, match="视频列表为空") as exc:
+            await fetch_video_detail(url)
+        assert exc.value.category == "deleted"
+    assert mock_douyin.count(f"/share/video/{DELETED}") == 1
+
+
+async def test_short_links_share_entry_by_aweme_id(mock_douyin):
+    mock_douyin.deleted.add(DELETED)
+    mock_douyin.short_links["a"] = f"https://www.iesdouyin.com/share/video/{DELETED}/?region=CN"
+    mock_douyin.short_links["b"] = f"https://www.iesdouyin.com/share/video/{DELETED}/?from=bot"
+    for code in ("a", "b", "b"):
+        with pytest.raises(PostUnavailableError):
+            await fetch_video_detail(f"https://v.douyin.com/{code}/")
+    # 第二个短链接只走了重定向，第三次请求连重定向都不发
+    assert mock_douyin.count(f"/share/video/{DELETED}") == 1
+    assert mock_douyin.count("/b/") == 1
+
+
+async def test_transient_errors_are_not_cached(mock_douyin):
+    mock_douyin.failures["/share/video/"] = [500, 500, 500]
+    url = f"https://www.douyin.com/video/{DELETED}"
+    with pytest.raises(httpx.HTTPStatusError), patch("retry_policy.asyncio.sleep"):
+        await fetch_video_detail(url)
+    detail = await fetch_video_detail(url)
+    assert detail["aweme_id"] == DELETED
+
+
+def test_entries_expire_per_category():
+    cache = NegativeCache(ttl={"deleted": 600, "unavailable": 0})
+    cache.put(PostUnavailableError("gone", "deleted"), "a", None)
+    cache.put(PostUnavailableError("blocked", "unavailable"), "b")
+    assert str(cache.get(None, "a")) == "gone"
+    assert cache.get("b") is None
+
+    with patch("parse_cache.time.monotonic", return_value=10**9):
+        assert cache.get("a") is None
+    assert cache.stats() == {"entries": 0, "hits": 1}
+
+
+def test_cache_is_bounded():
+    cache = NegativeCache(max_entries=2)
+    for key in "abc":
+        cache.put(PostUnavailableError("gone", "deleted"), key)
+    assert cache.get("a") is None and cache.get("c") is not None
+
+
+def test_missing_video_info_res_category():
+    html = '<script>window._ROUTER_DATA = {"loaderData":{}}</script>'
+    with pytest.raises(PostUnavailableError) as exc:
+        parse_router_data(html)
+    assert exc.value.category == "unavailable"
+    # 解析进程池中抛出的错误要能序列化回主进程
+    restored = pickle.loads(pickle.dumps(exc.value))
+    assert (str(restored), restored.category) == (str(exc.value), "unavailable")
+
+
+async def test_api_repeats_cached_error(mock_douyin):
+    mock_douyin.deleted.add(DELETED)
+    hits = NEGATIVE_CACHE.hits
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        body = {"share_text": f"看看 https://www.douyin.com/video/{DELETED}"}
+        first = await client.post("/api/parse", json=body)
+        second = await client.post("/api/parse", json=body)
+        metrics = (await client.get("/api/metrics")).json()
+    assert first.status_code == second.status_code == 400
+    assert first.json() == second.json()
+    assert metrics["negative_cache"]["hits"] == hits + 1
+
+
+# ---- 地址过期时间与 stale-while-revalidate ----
+
+def test_url_expires_at():
+    assert url_expires_at("https://p3-sign.douyinpic.com/a.webp?lk3s=1&x-expires=1700000000&x-signature=s") == 1700000000
+    assert url_expires_at("https://cdn.example.com/a.mp4?expires=1700000000123") == 1700000000
+    assert url_expires_at(f"https://v3-web.douyinvod.com/{'0' * 32}/6553f100/video/tos/cn/a") == 0x6553F100
+    assert url_expires_at("https://aweme.snssdk.com/aweme/v1/play/?video_id=v0200&ratio=720p") is None
+    assert url_expires_at(f"https://v3-web.douyinvod.com/{'0' * 32}/00000001/video/tos/cn/a") is None
+
+
+def test_extract_video_urls_reports_earliest_expiry(sample_image_detail):
+    sample_image_detail["images"][0]["url_list"] = ["https://p3-sign.douyinpic.com/a.webp?x-expires=1700000500"]
+    sample_image_detail["images"][1]["url_list"] = ["https://p3-sign.douyinpic.com/b.webp?x-expires=1700000100"]
+    assert extract_video_urls(sample_image_detail)["expires_at"] == 1700000100
+
+
+def test_extract_video_urls_without_signed_urls(sample_detail):
+    assert extract_video_urls(sample_detail).expires_at is None
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    clock = Clock()
+    with patch("parse_cache.time.time", clock):
+        yield clock
+
+
+def fetcher(clock, lifetime=300):
+    """返回 (fetch, 调用记录)，每次解析得到的地址 lifetime 秒后过期"""
+    calls = []
+
+    async def fetch():
+        calls.append(clock.now)
+        return VideoInfo(aweme_id=str(len(calls)), expires_at=int(clock.now + lifetime))
+
+    return fetch, calls
+
+
+async def test_fresh_entries_are_served_from_cache(clock):
+    cache = ParseCache()
+    fetch, calls = fetcher(clock)
+    assert (await cache.get("k", fetch)).aweme_id == "1"
+    clock.now += 60
+    assert (await cache.get("k", fetch)).aweme_id == "1"
+    assert len(calls) == 1
+
+
+async def test_entries_near_expiry_refresh_in_background(clock):
+    cache = ParseCache(refresh_ahead=120)
+    fetch, calls = fetcher(clock)
+    await cache.get("k", fetch)
+
+    # 距地址过期还有 150 秒：立即返回旧结果，同时后台刷新
+    clock.now += 150
+    assert (await cache.get("k", fetch)).aweme_id == "1"
+    assert (await cache.get("k", fetch)).aweme_id == "1"
+    await asyncio.sleep(0)
+    assert len(calls) == 2
+    assert (await cache.get("k", fetch)).aweme_id == "2"
+    assert cache.stats()["refreshes"] == 1
+
+
+async def test_expired_entries_are_refetched(clock):
+    cache = ParseCache()
+    fetch, calls = fetcher(clock)
+    await cache.get("k", fetch)
+    clock.now += 300 - EXPIRY_MARGIN
+    assert (await cache.get("k", fetch)).aweme_id == "2"
+
+
+async def test_unsigned_results_use_default_ttl(clock):
+    cache = ParseCache(ttl=100)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return VideoInfo(expires_at=None)
+
+    await cache.get("k", fetch)
+    clock.now += 99
+    await cache.get("k", fetch)
+    assert len(calls) == 1
+    clock.now += 2
+    await cache.get("k", fetch)
+    assert len(calls) == 2
+
+
+async def test_concurrent_misses_share_one_fetch(clock):
+    cache = ParseCache()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return VideoInfo(expires_at=int(clock.now + 600))
+
+    results = await asyncio.gather(*(cache.get("k", fetch) for _ in range(5)))
+    assert len(calls) == 1 and all(r is results[0] for r in results)
+
+
+async def test_failed_refresh_keeps_stale_entry_until_it_expires(clock):
+    cache = ParseCache()
+    fetch, _ = fetcher(clock)
+    await cache.get("k", fetch)
+
+    async def failing():
+        raise httpx.ConnectError("down")
+
+    clock.now += 200
+    assert (await cache.get("k", failing)).aweme_id == "1"
+    await asyncio.sleep(0)
+    assert (await cache.get("k", failing)).aweme_id == "1"
+
+
+async def test_refresh_drops_posts_that_became_unavailable(clock):
+    cache = ParseCache()
+    fetch, _ = fetcher(clock)
+    await cache.get("k", fetch)
+
+    async def deleted():
+        raise PostUnavailableError("gone", "deleted")
+
+    clock.now += 200
+    await cache.get("k", deleted)
+    await asyncio.sleep(0)
+    with pytest.raises(PostUnavailableError):
+        await cache.get("k", deleted)
+
+
+async def test_api_parse_uses_cache(mock_douyin):
+    from server import PARSE_CACHE
+
+    hits = PARSE_CACHE.hits
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        for _ in range(3):
+            resp = await client.post("/api/parse", json={"share_text": "https://www.douyin.com/video/7000000000000000005"})
+            assert resp.json()["data"]["aweme_id"] == "7000000000000000005"
+        metrics = (await client.get("/api/metrics")).json()
+    assert mock_douyin.count("/share/video/") == 1
+    assert metrics["parse_cache"]["hits"] == hits + 2
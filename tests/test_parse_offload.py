@@ -0,0 +1,108 @@
+import time
+import asyncio
+import threading
+import httpx
+import pytest
+from unittest.mock import patch
+
+import douyin_core
+from douyin_core import (
+    fetch_video_detail,
+    parse_router_data,
+    configure_parse_offload,
+    shutdown_parse_offload,
+)
+from loop_lag import LoopLagMonitor
+from server import app
+from tests.mock_douyin import make_video_post, router_data_html
+
+VIDEO = "https://www.douyin.com/video/7000000000000000005"
+
+
+@pytest.fixture(autouse=True)
+def reset_offload():
+    yield
+    shutdown_parse_offload()
+
+
+def record_threads():
+    """包装 parse_router_data，记录执行线程"""
+    threads = []
+    real = douyin_core.parse_router_data
+
+    def wrapper(html):
+        threads.append(threading.current_thread().name)
+        return real(html)
+
+    return patch("douyin_core.parse_router_data", wrapper), threads
+
+
+def test_parse_router_data_is_pure(sample_router_data_html, sample_detail):
+    assert parse_router_data(sample_router_data_html)["aweme_id"] == sample_detail["aweme_id"]
+    with pytest.raises(RuntimeError, match="_ROUTER_DATA"):
+        parse_router_data("<html></html>")
+
+
+async def test_small_pages_stay_inline(mock_douyin):
+    configure_parse_offload("thread", threshold=10 * 1024 * 1024)
+    patcher, threads = record_threads()
+    with patcher:
+        await fetch_video_detail(VIDEO)
+    assert threads == [threading.current_thread().name]
+
+
+async def test_large_pages_run_in_thread_pool(mock_douyin):
+    configure_parse_offload("thread", threshold=0)
+    patcher, threads = record_threads()
+    with patcher:
+        detail = await fetch_video_detail(VIDEO)
+    assert detail["aweme_id"] == "7000000000000000005"
+    assert threads[0].startswith("dy-parse")
+
+
+async def test_threshold_counts_bytes_not_characters(mock_douyin):
+    # 3 万个汉字：不到 64K 个字符，但 UTF-8 编码后超过 64 KiB
+    mock_douyin.posts[0]["desc"] = "长" * 30_000
+    configure_parse_offload("thread", threshold=64 * 1024)
+    patcher, threads = record_threads()
+    with patcher:
+        await fetch_video_detail(VIDEO)
+    assert threads[0].startswith("dy-parse")
+
+
+async def test_process_pool_parses_large_page():
+    post = make_video_post("7000000000000000009", 1700000000, desc="长" * 200_000)
+    html = router_data_html([post])
+    configure_parse_offload("process", threshold=1024, workers=1)
+    detail = await asyncio.get_running_loop().run_in_executor(douyin_core._parse_executor, parse_router_data, html)
+    assert detail["aweme_id"] == "7000000000000000009"
+
+
+def test_unknown_mode_rejected():
+    with pytest.raises(ValueError):
+        configure_parse_offload("gpu")
+    assert douyin_core._parse_executor is None
+
+
+async def test_loop_lag_monitor_detects_blocking():
+    monitor = LoopLagMonitor(interval=0.01)
+    task = asyncio.create_task(monitor.run())
+    await asyncio.sleep(0.02)
+    time.sleep(0.05)  # 阻塞事件循环
+    await asyncio.sleep(0.02)
+    task.cancel()
+
+    stats = monitor.stats()
+    assert stats["samples"] >= 2
+    assert stats["max_ms"] >= 40
+    assert stats["p50_ms"] <= stats["p99_ms"] <= stats["max_ms"]
+
+
+def test_loop_lag_stats_empty():
+    assert LoopLagMonitor().stats()["p99_ms"] == 0.0
+
+
+async def test_metrics_report_loop_lag():
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        resp = await client.get("/api/metrics")
+    assert {"p50_ms", "p99_ms", "max_ms"} <= set(resp.json()["loop_lag"])
@@ -0,0 +1,159 @@
+import sys
+import time
+import asyncio
+import httpx
+import pytest
+from unittest.mock import patch
+
+from douyin_core import parse_and_download
+from probe import PROBE_BYTES, PROBE_CACHE, NoCandidateFits, ProbeCache, ProbeResult, probe_urls, select_within
+from retry_policy import DeadlineExceeded, deadline
+from server import app
+
+VIDEO = "https://www.douyin.com/video/7000000000000000005"
+PLAY = "https://aweme.snssdk.com/aweme/v1/play/?video_id=v0200mock7000000000000000005&ratio={}&line=0"
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def sized(mock_douyin):
+    """原画 5MB，1080p 2MB，720p 1MB"""
+    mock_douyin.video_sizes.update({"default": 5 * MB, "1080p": 2 * MB, "720p": 1 * MB})
+    return mock_douyin
+
+
+async def test_probe_reports_size_codec_and_availability(sized):
+    sized.failures["/aweme/v1/play/"] = [404]
+    results = await probe_urls([PLAY.format("default"), PLAY.format("1080p")])
+    # 并发探测，第一个请求拿到 404；按传入顺序返回
+    assert [r.url for r in results] == [PLAY.format("default"), PLAY.format("1080p")]
+    failed, ok = sorted(results, key=lambda r: r.ok)
+    assert not failed.ok and failed.status == 404
+    assert ok.ok and ok.status == 206 and ok.size in (5 * MB, 2 * MB)
+    assert results[1].codec in ("h264", None)
+
+
+async def test_probe_does_not_download_body(sized):
+    (result,) = await probe_urls([PLAY.format("default")])
+    assert result.size == 5 * MB and result.codec is None
+
+
+async def test_select_within_keeps_quality_order(sized):
+    urls = [PLAY.format(ratio) for ratio in ("default", "1080p", "720p")]
+    fitting = await select_within(urls, 3 * MB)
+    assert [r.url for r in fitting] == urls[1:]
+    assert fitting[0].size == 2 * MB and fitting[0].codec == "h264"
+
+    with pytest.raises(NoCandidateFits, match="0.5MB"):
+        await select_within(urls, MB // 2)
+
+
+async def test_probe_results_are_cached(sized):
+    urls = [PLAY.format("default"), PLAY.format("720p")]
+    await probe_urls(urls)
+    hits = PROBE_CACHE.hits
+    await probe_urls(urls)
+    assert sized.count("/aweme/v1/play/") == 2
+    assert PROBE_CACHE.hits - hits == 2
+
+
+def test_probe_cache_respects_signed_expiry():
+    cache = ProbeCache()
+    cache.put(ProbeResult("https://v3-web.douyinvod.com/a.mp4?x-expires=1000000000", ok=True, size=1))
+    cache.put(ProbeResult("https://v3-web.douyinvod.com/b.mp4", ok=True, size=1))
+    assert cache.get("https://v3-web.douyinvod.com/a.mp4?x-expires=1000000000") is None
+    assert cache.get("https://v3-web.douyinvod.com/b.mp4").size == 1
+
+
+async def test_size_from_content_length_and_unknown_size():
+    def handler(request):
+        # 忽略 Range 的上游返回 200 + Content-Length；流式响应没有 Content-Length
+        if request.url.path == "/full.mp4":
+            return httpx.Response(200, content=b"x" * 100)
+        return httpx.Response(200, stream=httpx.ByteStream(b"x" * 100))
+
+    transport = httpx.MockTransport(handler)
+    with patch("probe.dns_cache.transport", return_value=transport):
+        results = await probe_urls(["https://cdn.test/full.mp4", "https://cdn.test/chunked.mp4"])
+    assert [r.size for r in results] == [100, None]
+    # 大小未知的地址不会被选中
+    with patch("probe.dns_cache.transport", return_value=transport):
+        fitting = await select_within(["https://cdn.test/chunked.mp4", "https://cdn.test/full.mp4"], 1000)
+    assert [r.url for r in fitting] == ["https://cdn.test/full.mp4"]
+
+
+async def test_probes_respect_deadline():
+    async def handler(request):
+        await asyncio.sleep(10)
+        return httpx.Response(200, content=b"x")
+
+    transport = httpx.MockTransport(handler)
+    start = time.monotonic()
+    with patch("probe.dns_cache.transport", return_value=transport):
+        with deadline(0.1):
+            with pytest.raises(DeadlineExceeded):
+                await probe_urls(["https://cdn.test/slow1.mp4", "https://cdn.test/slow2.mp4"])
+    assert time.monotonic() - start < 1
+    # 超时不是探测结果，不缓存
+    assert PROBE_CACHE.get("https://cdn.test/slow1.mp4") is None
+
+
+async def test_probes_retry_transient_errors_and_are_throttled(sized):
+    sized.failures["/aweme/v1/play/"] = [503]
+    charged = []
+
+    async def throttle(nbytes):
+        # 在请求发出之前计入带宽
+        charged.append((nbytes, sized.count("/aweme/v1/play/")))
+
+    with patch("probe.PROBE_RETRY.backoff", 0):
+        (result,) = await probe_urls([PLAY.format("720p")], throttle=throttle)
+    assert result.ok and result.size == MB
+    assert sized.count("/aweme/v1/play/") == 2
+    assert charged == [(PROBE_BYTES, 0)]
+
+
+async def test_api_probe_deadline_returns_504(sized):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        # 解析结果已缓存，只有探测会访问上游
+        await client.post("/api/parse", json={"share_text": VIDEO})
+        with patch("server.PARSE_DEADLINE", 1e-9):
+            resp = await client.post("/api/parse", json={"share_text": VIDEO, "max_bytes": 3 * MB})
+    assert resp.status_code == 504
+    assert sized.count("/aweme/v1/play/") == 0
+
+
+async def test_parse_and_download_within_budget(sized, tmp_path):
+    info = await parse_and_download(VIDEO, output_dir=str(tmp_path), max_bytes=3 * MB)
+    assert info["downloaded"] and info["size"] == 2 * MB
+    assert info["video_urls"] == [PLAY.format("1080p"), PLAY.format("720p")]
+    with open(info["save_path"], "rb") as f:
+        assert f.read(64).rstrip(b"\0") == b"MOCKVIDEO:v0200mock7000000000000000005:1080p"
+
+
+async def test_api_max_bytes(sized):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        parsed = await client.post("/api/parse", json={"share_text": VIDEO, "max_bytes": 3 * MB})
+        full = await client.post("/api/parse", json={"share_text": VIDEO})
+        download = await client.post("/api/download", json={"share_text": VIDEO, "max_bytes": int(1.5 * MB)})
+        too_small = await client.post("/api/parse", json={"share_text": VIDEO, "max_bytes": 1024})
+        invalid = await client.post("/api/parse", json={"share_text": VIDEO, "max_bytes": 0})
+
+    data = parsed.json()["data"]
+    assert data["video_urls"] == [PLAY.format("1080p"), PLAY.format("720p")]
+    assert data["size"] == 2 * MB
+    # 缓存中的完整结果不受影响
+    assert len(full.json()["data"]["video_urls"]) == 4 and "size" not in full.json()["data"]
+    assert download.status_code == 200 and len(download.content) == MB
+    assert download.content.startswith(b"MOCKVIDEO:v0200mock7000000000000000005:720p")
+    assert too_small.status_code == 404 and "没有不超过" in too_small.json()["detail"]
+    assert invalid.status_code == 422
+
+
+def test_cli_rejects_max_size_for_author_mode():
+    import cli
+
+    with patch.object(sys, "argv", ["cli.py", "https://v.douyin.com/x/", "--author", "--max-size", "10"]):
+        with pytest.raises(SystemExit) as exc:
+            cli.main()
+    assert exc.value.code == 2
@@ -0,0 +1,174 @@
+import time
+import asyncio
+import httpx
+import pytest
+from unittest.mock import patch
+
+import retry_policy
+from retry_policy import RetryPolicy, DeadlineExceeded, deadline, remaining
+from douyin_core import fetch_video_detail, download_video, PAGE
+from upstream import UpstreamPool
+from fanout import FanoutHub
+from server import app
+
+PLAY_URL = "https://www.douyin.com/aweme/v1/play/?video_id=v0200mock1"
+
+
+def status_error(status: int, headers: dict = None) -> httpx.HTTPStatusError:
+    request = httpx.Request("GET", "https://example.com/")
+    response = httpx.Response(status, headers=headers, request=request)
+    return httpx.HTTPStatusError(f"{status}", request=request, response=response)
+
+
+def failing(*errors, result="ok"):
+    """依次抛出 errors 中的异常，之后返回 result；记录每次尝试的超时"""
+    timeouts = []
+
+    async def attempt(timeout):
+        timeouts.append(timeout)
+        if len(timeouts) <= len(errors):
+            raise errors[len(timeouts) - 1]
+        return result
+
+    return attempt, timeouts
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(PAGE, "backoff", 0)
+    monkeypatch.setattr(retry_policy.MEDIA, "backoff", 0)
+
+
+def test_deadline_nests_and_keeps_earliest():
+    assert remaining() is None
+    with deadline(10):
+        with deadline(60):
+            assert 9 < remaining() <= 10
+        with deadline(1):
+            assert remaining() <= 1
+        assert remaining() > 9
+    assert remaining() is None
+
+
+async def test_retries_retryable_errors():
+    policy = RetryPolicy(attempts=3, backoff=0)
+    attempt, timeouts = failing(status_error(503), httpx.ConnectError("refused"))
+    assert await policy.call(attempt) == "ok"
+    assert len(timeouts) == 3
+
+
+async def test_does_not_retry_client_errors():
+    policy = RetryPolicy(attempts=3, backoff=0)
+    attempt, timeouts = failing(status_error(404))
+    with pytest.raises(httpx.HTTPStatusError):
+        await policy.call(attempt)
+    assert len(timeouts) == 1
+
+
+async def test_gives_up_after_max_attempts():
+    policy = RetryPolicy(attempts=2, backoff=0)
+    attempt, timeouts = failing(*[httpx.ReadTimeout("slow")] * 3)
+    with pytest.raises(httpx.ReadTimeout):
+        await policy.call(attempt)
+    assert len(timeouts) == 2
+
+
+def test_backoff_grows_with_jitter_and_honours_retry_after():
+    policy = RetryPolicy(backoff=1, max_backoff=4)
+    with patch("retry_policy.random.uniform", side_effect=lambda lo, hi: hi):
+        assert [policy.delay(n) for n in (1, 2, 3, 4)] == [1, 2, 4, 4]
+    with patch("retry_policy.random.uniform", return_value=0):
+        assert policy.delay(1, status_error(429, {"Retry-After": "3"})) == 3
+        assert policy.delay(1, status_error(503, {"Retry-After": "120"})) == 4
+
+
+async def test_timeouts_are_clamped_to_deadline():
+    policy = RetryPolicy(connect=5, read=30)
+    attempt, timeouts = failing()
+    with deadline(2):
+        await policy.call(attempt)
+    assert timeouts[0].connect <= 2 and timeouts[0].pool <= 2
+    # 读取超时约束的是响应体分块之间的间隔，不按剩余时间缩短
+    assert timeouts[0].read == 30
+
+
+async def test_deadline_bounds_attempt_until_headers():
+    policy = RetryPolicy(attempts=3)
+    calls = []
+
+    async def slow_headers(timeout):
+        calls.append(timeout)
+        await asyncio.sleep(10)
+
+    start = time.monotonic()
+    with deadline(0.05):
+        with pytest.raises(DeadlineExceeded):
+            await policy.call(slow_headers)
+    assert len(calls) == 1
+    assert time.monotonic() - start < 1
+
+
+async def test_late_download_keeps_full_read_timeout(mock_douyin, tmp_path):
+    seen = []
+    real_stream = httpx.AsyncClient.stream
+
+    def stream(self, *args, **kwargs):
+        seen.append(kwargs["timeout"])
+        return real_stream(self, *args, **kwargs)
+
+    with patch.object(httpx.AsyncClient, "stream", stream):
+        with deadline(0.5):
+            await download_video(PLAY_URL, str(tmp_path / "v.mp4"))
+    assert seen[0].connect <= 0.5 and seen[0].read == retry_policy.MEDIA.read
+
+
+async def test_expired_deadline_fails_fast():
+    policy = RetryPolicy()
+    attempt, timeouts = failing()
+    with deadline(0.001):
+        time.sleep(0.002)
+        with pytest.raises(DeadlineExceeded):
+            await policy.call(attempt)
+    assert timeouts == []
+
+
+async def test_no_retry_when_backoff_exceeds_deadline():
+    policy = RetryPolicy(attempts=5, backoff=10, max_backoff=10)
+    attempt, timeouts = failing(status_error(429, {"Retry-After": "10"}))
+    start = time.monotonic()
+    with deadline(1):
+        with pytest.raises(httpx.HTTPStatusError):
+            await policy.call(attempt)
+    assert len(timeouts) == 1
+    assert time.monotonic() - start < 0.5
+
+
+async def test_fetch_video_detail_retries_flaky_share_page(mock_douyin, no_backoff):
+    mock_douyin.failures["/share/video/"] = [503, 502]
+    detail = await fetch_video_detail("https://www.douyin.com/video/7000000000000000005")
+    assert detail["aweme_id"] == "7000000000000000005"
+    assert mock_douyin.count("/share/video/") == 3
+
+
+async def test_download_video_retries_before_writing(mock_douyin, no_backoff, tmp_path):
+    mock_douyin.failures["/aweme/v1/play/"] = [500]
+    save_path = str(tmp_path / "v.mp4")
+    await download_video(PLAY_URL, save_path)
+    assert open(save_path, "rb").read() == b"MOCKVIDEO:v0200mock1:default"
+    assert mock_douyin.count("/aweme/v1/play/") == 2
+
+
+async def test_api_proxy_retries_and_maps_timeouts(mock_douyin, no_backoff):
+    pool = UpstreamPool()
+    mock_douyin.failures["/aweme/v1/play/"] = [502]
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        with patch("server.FANOUT", FanoutHub(pool)):
+            ok = await client.get("/api/proxy", params={"url": PLAY_URL})
+            with patch("server.PROXY_DEADLINE", 1e-9):
+                late = await client.get("/api/proxy", params={"url": PLAY_URL})
+
+    assert ok.status_code == 200
+    assert ok.content == b"MOCKVIDEO:v0200mock1:default"
+    assert late.status_code == 504
+    assert pool.active == 0
+    await pool.aclose()
@@ -0,0 +1,211 @@
+import os
+import time
+import asyncio
+import httpx
+import pytest
+from unittest.mock import patch
+
+from douyin_core import download_video
+from storage import DiskBudget, DiskBudgetExceeded, reap_stale_dirs, UNKNOWN_SIZE_ESTIMATE
+
+
+def _make_dir(root, name, age):
+    path = root / name
+    path.mkdir()
+    (path / "video.mp4").write_bytes(b"data")
+    old = time.time() - age
+    os.utime(path / "video.mp4", (old, old))
+    os.utime(path, (old, old))
+    return path
+
+
+def test_reap_stale_dirs_removes_only_old(tmp_path):
+    stale = _make_dir(tmp_path, "stale", age=7200)
+    fresh = _make_dir(tmp_path, "fresh", age=10)
+    reaped_cb = []
+
+    reaped = reap_stale_dirs(str(tmp_path), max_age=3600, on_reap=reaped_cb.append)
+
+    assert reaped == [str(stale)]
+    assert reaped_cb == [str(stale)]
+    assert not stale.exists()
+    assert fresh.exists()
+
+
+def test_reap_stale_dirs_recent_file_keeps_dir(tmp_path):
+    """目录本身很旧，但其中文件仍在写入，不应被清理"""
+    path = _make_dir(tmp_path, "downloading", age=7200)
+    now = time.time()
+    os.utime(path / "video.mp4", (now, now))
+
+    assert reap_stale_dirs(str(tmp_path), max_age=3600) == []
+    assert path.exists()
+
+
+def test_reap_stale_dirs_missing_root(tmp_path):
+    assert reap_stale_dirs(str(tmp_path / "nope"), max_age=1) == []
+
+
+async def test_disk_budget_reserve_and_release():
+    budget = DiskBudget(limit=100)
+    await budget.reserve("a", 60)
+    await budget.reserve("a", 20)
+    assert budget.available == 20
+
+    budget.release("a")
+    assert budget.available == 100
+    # 重复释放无副作用
+    budget.release("a")
+    assert budget.available == 100
+
+
+async def test_disk_budget_unknown_size_uses_estimate():
+    budget = DiskBudget(limit=UNKNOWN_SIZE_ESTIMATE * 2)
+    await budget.reserve("a", 0)
+    assert budget.reserved == UNKNOWN_SIZE_ESTIMATE
+
+
+async def test_disk_budget_rejects_oversized():
+    budget = DiskBudget(limit=100)
+    with pytest.raises(DiskBudgetExceeded, match="超过磁盘配额"):
+        await budget.reserve("a", 101)
+
+
+async def test_disk_budget_queues_until_release():
+    budget = DiskBudget(limit=100, wait_timeout=5)
+    await budget.reserve("a", 80)
+
+    waiter = asyncio.create_task(budget.reserve("b", 50))
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+    assert budget.waiting == 1
+
+    budget.release("a")
+    await asyncio.wait_for(waiter, 1)
+    assert budget.reserved == 50
+    assert budget.waiting == 0
+
+
+async def test_disk_budget_wait_timeout():
+    budget = DiskBudget(limit=100, wait_timeout=0.05)
+    await budget.reserve("a", 80)
+
+    with pytest.raises(DiskBudgetExceeded, match="排队超时"):
+        await budget.reserve("b", 50)
+    assert budget.waiting == 0
+
+
+async def test_disk_budget_no_wait_rejects_immediately():
+    budget = DiskBudget(limit=100, wait_timeout=0)
+    await budget.reserve("a", 80)
+
+    with pytest.raises(DiskBudgetExceeded):
+        await budget.reserve("b", 50)
+
+
+async def test_disk_budget_same_item_replaces_reservation():
+    budget = DiskBudget(limit=1000, wait_timeout=0)
+    await budget.reserve("req", 600, "video.mp4")
+    # 换候选地址重新下载到同一个文件：替换而不是累加
+    await budget.reserve("req", 600, "video.mp4")
+    assert budget.reserved == 600
+    await budget.reserve("req", 400, "video.mp4")
+    assert budget.reserved == 400
+    assert budget.try_reserve("req", 500, "other.webp")
+    assert budget.reserved == 900
+    assert not budget.try_reserve("req", 2000, "huge.mp4")
+
+    budget.release("req")
+    assert budget.reserved == 0
+    await budget.reserve("req", 600, "video.mp4")
+    assert budget.reserved == 600
+
+
+
+async def test_disk_budget_holder_never_waits():
+    budget = DiskBudget(limit=100, wait_timeout=5)
+    await budget.reserve("a", 50, "1.webp")
+    await budget.reserve("b", 40, "1.webp")
+
+    # 两个请求都持有配额、都还要更多：排队会互相等待，直接失败
+    with pytest.raises(DiskBudgetExceeded):
+        await asyncio.wait_for(budget.reserve("a", 30, "2.webp"), 1)
+    assert budget.waiting == 0 and budget.reserved == 90
+
+    # 配额够用时，持有者不必排在没有持有配额的等待者后面
+    waiter = asyncio.create_task(budget.reserve("c", 60))
+    await asyncio.sleep(0.01)
+    assert budget.waiting == 1
+    await budget.reserve("b", 5, "2.webp")
+    assert budget.try_reserve("b", 5, "3.webp")
+    assert budget.reserved == 100 and budget.waiting == 1
+
+    budget.release("a")
+    budget.release("b")
+    await asyncio.wait_for(waiter, 1)
+    assert budget.reserved == 60
+
+
+PLAY = "https://aweme.snssdk.com/aweme/v1/play/?video_id=v0200mock7000000000000000005&ratio=720p&line=0"
+
+
+async def test_download_retry_to_same_path_does_not_double_reserve(mock_douyin, tmp_path):
+    mock_douyin.video_sizes["720p"] = 600
+    budget = DiskBudget(limit=1000, wait_timeout=0)
+    reserve = budget.reserver(str(tmp_path))
+    save_path = str(tmp_path / "video.mp4")
+
+    await download_video(PLAY, save_path, reserve=reserve)
+    await download_video(PLAY, save_path, reserve=reserve)
+    assert budget.reserved == 600
+
+
+async def test_download_closes_upstream_while_waiting_for_budget(mock_douyin, tmp_path):
+    mock_douyin.video_sizes["720p"] = 600
+    budget = DiskBudget(limit=1000, wait_timeout=5)
+    await budget.reserve("other", 800)
+
+    task = asyncio.create_task(
+        download_video(PLAY, str(tmp_path / "video.mp4"), reserve=budget.reserver(str(tmp_path)))
+    )
+    while budget.waiting == 0:
+        await asyncio.sleep(0.001)
+    # 排队期间不占着上游响应，拿到配额后重新请求
+    assert mock_douyin.count("/aweme/v1/play/") == 1
+    budget.release("other")
+    await asyncio.wait_for(task, 5)
+    assert mock_douyin.count("/aweme/v1/play/") == 2
+    assert os.path.getsize(tmp_path / "video.mp4") == 600
+
+
+async def test_api_image_zip_is_reserved(mock_douyin, tmp_path):
+    from server import app
+
+    # 图片本身放得下，打包的 zip 放不下
+    budget = DiskBudget(limit=1000, wait_timeout=0)
+    with patch("server.DISK_BUDGET", budget), patch("server.TMP_DIR", str(tmp_path)):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            resp = await client.post("/api/download", json={"share_text": "https://www.douyin.com/video/7000000000000000004"})
+
+    assert resp.status_code == 503
+    assert budget.reserved == 0 and list(tmp_path.iterdir()) == []
+
+
+async def test_download_does_not_queue_again_after_reopening(mock_douyin, tmp_path):
+    budget = DiskBudget(limit=1000, wait_timeout=5)
+    await budget.reserve("other", 800)
+    mock_douyin.video_sizes["720p"] = 600
+
+    task = asyncio.create_task(
+        download_video(PLAY, str(tmp_path / "video.mp4"), reserve=budget.reserver(str(tmp_path)))
+    )
+    while budget.waiting == 0:
+        await asyncio.sleep(0.001)
+    # 排到配额后重新请求，上游这次返回的文件更大
+    mock_douyin.video_sizes["720p"] = 900
+    budget.release("other")
+    budget.try_reserve("another", 300)
+
+    with pytest.raises(DiskBudgetExceeded):
+        await asyncio.wait_for(task, 5)
+    assert budget.waiting == 0
@@ -0,0 +1,122 @@
+import asyncio
+import httpx
+import pytest
+from unittest.mock import patch
+
+from server import app
+from fanout import FanoutHub
+from upstream import UpstreamPool, UpstreamBusy
+
+PLAY_URL = "https://www.douyin.com/aweme/v1/play/?video_id=v0200mock1"
+IMG_URL = "https://p3-sign.douyinpic.com/img/cover_1.jpeg"
+
+
+async def test_open_streams_and_releases_slot(mock_douyin):
+    pool = UpstreamPool(max_streams=2)
+    stream = await pool.open(PLAY_URL)
+    assert pool.active == 1
+
+    body = b"".join([chunk async for chunk in stream.aiter_bytes()])
+    assert body == b"MOCKVIDEO:v0200mock1:default"
+
+    await stream.aclose()
+    await stream.aclose()  # 重复关闭无副作用
+    assert pool.active == 0
+    await pool.aclose()
+
+
+async def test_streams_share_one_client(mock_douyin):
+    pool = UpstreamPool()
+    with patch("upstream.httpx.AsyncClient", wraps=httpx.AsyncClient) as factory:
+        for _ in range(3):
+            stream = await pool.open(PLAY_URL)
+            await stream.aclose()
+    assert factory.call_count == 1
+    await pool.aclose()
+
+
+async def test_excess_streams_queue_until_slot_freed(mock_douyin):
+    pool = UpstreamPool(max_streams=1, queue_timeout=5)
+    first = await pool.open(PLAY_URL)
+
+    second = asyncio.create_task(pool.open(IMG_URL))
+    await asyncio.sleep(0.01)
+    assert not second.done()
+    assert pool.waiting == 1
+
+    await first.aclose()
+    stream = await asyncio.wait_for(second, 1)
+    assert pool.active == 1
+    await stream.aclose()
+    await pool.aclose()
+
+
+async def test_queue_timeout_raises_busy(mock_douyin):
+    pool = UpstreamPool(max_streams=1, queue_timeout=0.01)
+    first = await pool.open(PLAY_URL)
+
+    with pytest.raises(UpstreamBusy):
+        await pool.open(PLAY_URL)
+    assert pool.waiting == 0
+
+    await first.aclose()
+    assert pool.active == 0
+    await pool.aclose()
+
+
+async def test_full_queue_rejects_immediately(mock_douyin):
+    pool = UpstreamPool(max_streams=1, max_queue=0, queue_timeout=5)
+    first = await pool.open(PLAY_URL)
+
+    with pytest.raises(UpstreamBusy):
+        await asyncio.wait_for(pool.open(PLAY_URL), 0.5)
+
+    await first.aclose()
+    await pool.aclose()
+
+
+async def test_per_host_limit_does_not_block_other_hosts(mock_douyin):
+    pool = UpstreamPool(max_streams=4, max_per_host=1, queue_timeout=5)
+    first = await pool.open(PLAY_URL)
+
+    same_host = asyncio.create_task(pool.open(PLAY_URL))
+    await asyncio.sleep(0.01)
+    assert not same_host.done()
+
+    # 另一个主机不受影响，且排队中的请求不占用全局名额
+    other = await asyncio.wait_for(pool.open(IMG_URL), 0.5)
+    assert pool.active == 2
+
+    await first.aclose()
+    queued = await asyncio.wait_for(same_host, 1)
+    for stream in (queued, other):
+        await stream.aclose()
+    assert pool.active == 0
+    assert pool._hosts == {}
+    await pool.aclose()
+
+
+async def test_upstream_error_releases_slot(mock_douyin):
+    pool = UpstreamPool(max_streams=1)
+    with pytest.raises(httpx.HTTPStatusError):
+        await pool.open("https://www.iesdouyin.com/unknown-code/")
+    assert pool.active == 0
+    await pool.aclose()
+
+
+async def test_api_proxy_returns_503_when_pool_busy(mock_douyin):
+    pool = UpstreamPool(max_streams=1, queue_timeout=0.01)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        with patch("server.FANOUT", FanoutHub(pool)):
+            held = await pool.open(PLAY_URL)
+            resp = await client.get("/api/proxy", params={"url": PLAY_URL})
+            await held.aclose()
+
+            ok = await client.get("/api/proxy", params={"url": PLAY_URL})
+
+    assert resp.status_code == 503
+    assert resp.headers["retry-after"] == "5"
+    assert ok.status_code == 200
+    assert ok.content == b"MOCKVIDEO:v0200mock1:default"
+    assert pool.active == 0
+    await pool.aclose()
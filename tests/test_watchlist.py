@@ -0,0 +1,155 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+import author
+import watchlist as watchlist_module
+from watchlist import Watchlist, sync_author, sync_all
+from tests.mock_douyin import SEC_UID, make_video_post
+
+
+async def test_first_sync_downloads_everything(mock_douyin, tmp_path):
+    with Watchlist(str(tmp_path)) as wl:
+        wl.add(SEC_UID)
+        summary = await sync_author(wl, SEC_UID, str(tmp_path))
+        state = wl.get(SEC_UID)
+
+    assert summary["new"] == 5
+    assert summary["downloaded"] == 5
+    assert state["hwm_create_time"] == 1700000500
+    assert state["hwm_aweme_id"] == "7000000000000000005"
+    assert state["nickname"] == "MockAuthor"
+
+
+async def test_incremental_sync_stops_at_high_water_mark(mock_douyin, tmp_path):
+    with Watchlist(str(tmp_path)) as wl:
+        wl.add(SEC_UID)
+        await sync_author(wl, SEC_UID, str(tmp_path), page_size=2)
+
+        mock_douyin.requests.clear()
+        mock_douyin.posts.insert(0, make_video_post("7000000000000000006", 1700000600))
+        summary = await sync_author(wl, SEC_UID, str(tmp_path), page_size=2)
+        state = wl.get(SEC_UID)
+
+    assert summary["new"] == 1
+    assert summary["downloaded"] == 1
+    # 第一页就遇到了已同步的作品，不再继续翻页
+    assert mock_douyin.count("/web/api/v2/aweme/post/") == 1
+    assert mock_douyin.count("/aweme/v1/play/") == 1
+    assert state["hwm_create_time"] == 1700000600
+
+
+async def test_sync_without_new_posts_downloads_nothing(mock_douyin, tmp_path):
+    with Watchlist(str(tmp_path)) as wl:
+        await sync_author(wl, SEC_UID, str(tmp_path))
+        mock_douyin.requests.clear()
+        summary = await sync_author(wl, SEC_UID, str(tmp_path))
+
+    assert summary["new"] == 0
+    assert mock_douyin.count("/aweme/v1/play/") == 0
+
+
+async def test_post_in_same_second_as_high_water_mark_is_downloaded(mock_douyin, tmp_path):
+    with Watchlist(str(tmp_path)) as wl:
+        await sync_author(wl, SEC_UID, str(tmp_path))
+
+        mock_douyin.posts.insert(0, make_video_post("7000000000000000006", 1700000500))
+        summary = await sync_author(wl, SEC_UID, str(tmp_path))
+        state = wl.get(SEC_UID)
+        again = await sync_author(wl, SEC_UID, str(tmp_path))
+
+    assert summary["new"] == 1 and summary["downloaded"] == 1
+    assert (state["hwm_create_time"], state["hwm_aweme_id"]) == (1700000500, "7000000000000000006")
+    assert again["new"] == 0
+
+
+async def test_pinned_old_post_does_not_stop_paging(mock_douyin, tmp_path):
+    with Watchlist(str(tmp_path)) as wl:
+        await sync_author(wl, SEC_UID, str(tmp_path))
+
+        pinned = dict(mock_douyin.posts[-1], is_top=1)
+        mock_douyin.posts.insert(0, make_video_post("7000000000000000006", 1700000600))
+        mock_douyin.posts.insert(0, pinned)
+        summary = await sync_author(wl, SEC_UID, str(tmp_path))
+
+    assert summary["new"] == 1
+
+
+async def test_failed_download_keeps_run_and_retries_only_pending(mock_douyin, tmp_path):
+    real_download_post = watchlist_module.download_post
+    failing = {"7000000000000000002"}
+
+    async def flaky_download_post(info, *args, **kwargs):
+        if info["aweme_id"] in failing:
+            raise RuntimeError("CDN 超时")
+        return await real_download_post(info, *args, **kwargs)
+
+    with Watchlist(str(tmp_path)) as wl:
+        with patch("watchlist.download_post", side_effect=flaky_download_post):
+            first = await sync_author(wl, SEC_UID, str(tmp_path))
+        assert first["failed"] == 1
+        # 尚有未完成的作品，high-water mark 不推进
+        assert wl.get(SEC_UID)["hwm_create_time"] == 0
+        assert [p["aweme_id"] for p in wl.pending(SEC_UID)] == ["7000000000000000002"]
+
+        mock_douyin.requests.clear()
+        failing.clear()
+        second = await sync_author(wl, SEC_UID, str(tmp_path))
+        state = wl.get(SEC_UID)
+
+    assert second["downloaded"] == 1
+    # 翻页已完成，恢复时不需要再请求列表
+    assert mock_douyin.count("/web/api/v2/aweme/post/") == 0
+    # 上次运行的列表地址可能已过期，遗留的作品重新请求详情页
+    assert mock_douyin.count("/share/video/7000000000000000002/") == 1
+    assert state["hwm_create_time"] == 1700000500
+
+
+async def test_interrupted_paging_resumes_from_cursor(mock_douyin, tmp_path):
+    real_fetch = author.fetch_author_page
+    calls = {"n": 0}
+
+    async def interrupted_fetch(*args, **kwargs):
+        calls["n"] += 1
+        if calls["n"] == 2:
+            raise KeyboardInterrupt
+        return await real_fetch(*args, **kwargs)
+
+    with Watchlist(str(tmp_path)) as wl:
+        with patch("watchlist.fetch_author_page", side_effect=interrupted_fetch):
+            with pytest.raises(KeyboardInterrupt):
+                await sync_author(wl, SEC_UID, str(tmp_path), page_size=2)
+        assert len(wl.pending(SEC_UID)) == 2
+
+        mock_douyin.requests.clear()
+        summary = await sync_author(wl, SEC_UID, str(tmp_path), page_size=2)
+        state = wl.get(SEC_UID)
+
+    # 从第 2 页继续：只需再请求 2 页
+    assert mock_douyin.count("/web/api/v2/aweme/post/") == 2
+    assert summary["downloaded"] == 5
+    assert state["hwm_create_time"] == 1700000500
+
+
+async def test_sync_all_and_remove(mock_douyin, tmp_path):
+    with Watchlist(str(tmp_path)) as wl:
+        wl.add(SEC_UID, "https://v.douyin.com/author/")
+        wl.add("unknown_author")
+        results = await sync_all(wl, str(tmp_path))
+
+        wl.remove("unknown_author")
+        remaining = [a["sec_uid"] for a in wl.authors()]
+
+    by_uid = {r["sec_uid"]: r for r in results}
+    assert by_uid[SEC_UID]["downloaded"] == 5
+    assert "获取作品列表失败" in by_uid["unknown_author"]["error"]
+    assert remaining == [SEC_UID]
+
+
+async def test_sync_passes_faststart(mock_douyin, tmp_path):
+    with Watchlist(str(tmp_path)) as wl:
+        wl.add(SEC_UID)
+        with patch("watchlist.download_post", new_callable=AsyncMock) as download_post:
+            await sync_all(wl, str(tmp_path), faststart=True)
+    assert download_post.await_count == 5
+    assert all(call.kwargs["faststart"] is True for call in download_post.await_args_list)
@@ -0,0 +1,298 @@
+"""
+/api/proxy 共享的上游连接池
+
+原先每个代理请求新建一个 httpx.AsyncClient，并发上千个流就是上千个连接池、
+socket 和 TLS 会话。这里所有代理流共用一个有界的 client：
+
+- 连接池大小等于最大流数，空闲连接 keep-alive 复用（省去 TCP/TLS 握手）
+- 每个主机同时打开的流有上限 (max_per_host)，一个 CDN 节点慢不会占满整个池
+- 同时进行的代理流总数有上限 (max_streams)，超出的请求按 FIFO 排队；
+  队列已满或排队超时抛出 UpstreamBusy（接口返回 503）
+
+背压：上游响应按固定大小的块读取，客户端取走上一块之后才读下一块。
+慢客户端只会让上游 TCP 窗口停住，不会在内存里积压数据
+（fanout 合并同一地址的请求时，每次下载最多保留可重放窗口和 memory_limit 的数据，见 fanout 模块）。
+"""
+
+import asyncio
+from collections import Counter, deque
+from urllib.parse import urlparse
+
+import httpx
+
+import dns_cache
+from retry_policy import MEDIA
+
+# 代理流每次读取的块大小
+CHUNK_SIZE = 64 * 1024
+
+
+class UpstreamBusy(RuntimeError):
+    """代理流已满，排队队列已满或排队超时"""
+
+
+class _Slots:
+    """
+    FIFO 计数信号量
+
+    与 asyncio.Semaphore 不同，不绑定创建时的事件循环，且可以查看排队人数。
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def idle(self) -> bool:
+        return self.active == 0 and not self._waiters
+
+    async def acquire(self, timeout: float = None):
+        if not self._waiters and self.active < self.limit:
+            self.active += 1
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await asyncio.wait_for(fut, timeout)
+        except BaseException as e:
+            if fut.done() and not fut.cancelled():
+                # 名额已经分配，但等待方被取消：归还
+                self.release()
+            elif fut in self._waiters:
+                self._waiters.remove(fut)
+            if isinstance(e, asyncio.TimeoutError):
+                raise UpstreamBusy("代理请求排队超时，请稍后重试") from None
+            raise
+
+    def release(self):
+        self.active -= 1
+        while self._waiters and self.active < self.limit:
+            fut = self._waiters.popleft()
+            if fut.done():
+                continue
+            self.active += 1
+            fut.set_result(None)
+
+
+class UpstreamStream:
+    """
+    一个进行中的代理流，持有连接池名额，必须调用 aclose()（可重复调用）
+
+    Attributes:
+        response: 上游 httpx.Response（已收到响应头，body 尚未读取）
+    """
+
+    def __init__(self, response: httpx.Response, release):
+        self.response = response
+        self.headers = response.headers
+        self._release = release
+
+    async def aiter_bytes(self, chunk_size: int = CHUNK_SIZE):
+        async for chunk in self.response.aiter_bytes(chunk_size=chunk_size):
+            yield chunk
+
+    async def aclose(self):
+        release, self._release = self._release, None
+        if release is None:
+            return
+        try:
+            await self.response.aclose()
+        finally:
+            release()
+
+
+class UpstreamPool:
+    """
+    代理流共享的有界连接池
+
+    Args:
+        max_streams: 同时进行的代理流上限（也是连接池大小）
+        max_per_host: 单个主机同时进行的代理流上限
+        max_queue: 排队等待的请求上限，超出立即拒绝
+        queue_timeout: 排队最长等待秒数
+        headers: 上游请求头
+        retry: 上游请求的重试与超时策略 (见 retry_policy)，默认 retry_policy.MEDIA
+        keepalive_expiry: 空闲连接保留秒数（需要大于预热间隔，预热的连接才不会过期）
+    """
+
+    def __init__(
+        self,
+        max_streams: int = 64,
+        max_per_host: int = 16,
+        max_queue: int = 256,
+        queue_timeout: float = 10.0,
+        headers: dict = None,
+        retry=None,
+        keepalive_expiry: float = 60,
+    ):
+        self.max_streams = max_streams
+        self.max_per_host = max_per_host
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.headers = headers or {}
+        self.retry = retry or MEDIA
+        self.keepalive_expiry = keepalive_expiry
+        self._streams = _Slots(max_streams)
+        self._hosts = {}
+        self._client = None
+        self._loop = None
+        # 近期代理过的主机及次数，周期预热时优先预热；
+        # 只有开启周期预热 (run_prewarm interval > 0) 时才统计，每个周期清空一次
+        self.hot_hosts = Counter()
+        self.track_hot_hosts = False
+
+    @property
+    def active(self) -> int:
+        return self._streams.active
+
+    @property
+    def waiting(self) -> int:
+        return self._streams.waiting + sum(s.waiting for s in self._hosts.values())
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # client 的连接绑定在事件循环上，循环变化（如测试中）时重新创建
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            limits = httpx.Limits(
+                max_connections=self.max_streams,
+                max_keepalive_connections=self.max_streams,
+                keepalive_expiry=self.keepalive_expiry,
+            )
+            # 配置了环境变量代理时 transport() 返回 None，limits 由 client 使用
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                follow_redirects=True,
+                timeout=self.retry.timeout(),
+                limits=limits,
+                transport=dns_cache.transport(limits=limits),
+            )
+            self._loop = loop
+        return self._client
+
+    async def _acquire(self, host: str):
+        """依次占用主机名额和全局名额，返回释放函数"""
+        host_slots = self._hosts.get(host)
+        must_wait = self._streams.active >= self.max_streams or (
+            host_slots is not None and host_slots.active >= self.max_per_host
+        )
+        if must_wait and self.waiting >= self.max_queue:
+            raise UpstreamBusy("代理请求过多，请稍后重试")
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.queue_timeout
+        # 先占主机名额：等待某个慢主机的请求不占用全局名额，不会挡住其他主机
+        host_slots = host_slots or self._hosts.setdefault(host, _Slots(self.max_per_host))
+        try:
+            await host_slots.acquire(self.queue_timeout)
+            try:
+                await self._streams.acquire(max(0.0, deadline - loop.time()))
+            except BaseException:
+                host_slots.release()
+                raise
+        finally:
+            if host_slots.idle and self._hosts.get(host) is host_slots:
+                del self._hosts[host]
+
+        def release():
+            self._streams.release()
+            host_slots.release()
+            if host_slots.idle and self._hosts.get(host) is host_slots:
+                del self._hosts[host]
+
+        return release
+
+    async def open(self, url: str) -> UpstreamStream:
+        """
+        占用名额并发起流式 GET，收到响应头后返回
+
+        连接失败、超时和 5xx 等按 retry 策略在同一名额内重试，不重新排队。
+
+        Raises:
+            UpstreamBusy: 排队队列已满或排队超时
+            httpx.HTTPStatusError: 上游返回错误状态码
+            retry_policy.DeadlineExceeded: 超过请求截止时间
+        """
+        host = urlparse(url).hostname or ""
+        if self.track_hot_hosts:
+            self.hot_hosts[host] += 1
+        release = await self._acquire(host)
+        client = self._get_client()
+
+        async def attempt(timeout):
+            resp = await client.send(client.build_request("GET", url, timeout=timeout), stream=True)
+            try:
+                resp.raise_for_status()
+            except BaseException:
+                await resp.aclose()
+                raise
+            return resp
+
+        try:
+            resp = await self.retry.call(attempt)
+        except BaseException:
+            release()
+            raise
+        return UpstreamStream(resp, release)
+
+    async def prewarm(self, hosts) -> dict:
+        """
+        预先解析域名并建立 keep-alive 连接（DNS + TCP + TLS），首个用户请求不必再等握手
+
+        Returns:
+            {host: 状态码或错误信息}
+        """
+        client = self._get_client()
+
+        async def warm(host):
+            try:
+                # 任何响应都说明连接已建立并放回连接池
+                resp = await client.head(f"https://{host}/", follow_redirects=False, timeout=10)
+                return host, resp.status_code
+            except Exception as e:
+                return host, f"{type(e).__name__}: {e}"
+
+        return dict(await asyncio.gather(*(warm(h) for h in hosts)))
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+async def run_prewarm(pool: UpstreamPool, hosts, interval: float = 0, hot: int = 8, dns_hosts=()):
+    """
+    启动时预热一次；interval > 0 时周期性预热，保持连接和 DNS 缓存常热，直到任务被取消
+
+    Args:
+        pool: 上游连接池
+        hosts: 固定预热的主机（连接建立在 pool 中，只对经 pool 的代理请求有用）
+        interval: 预热间隔（秒），0 表示只在启动时预热
+        hot: 周期预热时额外预热上一周期代理次数最多的主机数
+        dns_hosts: 只预先解析域名的主机（如分享页主机：页面请求不经过 pool，连接无法复用）
+    """
+    # 只启动时预热一次的话 hot_hosts 不会被用到，也不会被清空
+    pool.track_hot_hosts = interval > 0
+    while True:
+        for host, result in zip(dns_hosts, await asyncio.gather(
+            *(dns_cache.DNS_CACHE.resolve(h) for h in dns_hosts), return_exceptions=True
+        )):
+            if isinstance(result, Exception):
+                print(f"[prewarm] 域名解析失败: {host}: {result}")
+        targets = list(dict.fromkeys([*hosts, *(h for h, _ in pool.hot_hosts.most_common(hot))]))
+        pool.hot_hosts.clear()
+        try:
+            results = await pool.prewarm(targets)
+            failed = {h: r for h, r in results.items() if not isinstance(r, int)}
+            if failed:
+                print(f"[prewarm] 预热失败: {failed}")
+        except Exception as e:
+            print(f"[prewarm] 预热失败: {e}")
+        if interval <= 0:
+            return
+        await asyncio.sleep(interval)
@@ -0,0 +1,298 @@
+"""
+关注作者的增量同步
+
+每个作者记录已同步到的最新作品 (high-water mark: create_time + aweme_id)。
+同步时从第一页开始翻页，遇到不晚于 high-water mark 的作品即停止翻页，只下载新作品。
+作品按 (create_time, aweme_id) 比较先后，与 high-water mark 同一秒发布的新作品不会被跳过。
+
+运行状态持久化在下载目录的 SQLite 中，分两步推进：
+1. 翻页：发现的新作品写入 pending 表，每页结束后保存游标
+2. 下载：逐个下载 pending 中的作品，成功后删除
+
+pending 全部处理完才推进 high-water mark，因此定时任务中途被中断后，
+下次运行会从保存的游标继续翻页，并只重试尚未完成的下载。
+pending 只保存 aweme_id：列表中的播放 / 图片地址带签名，会过期，
+本次运行翻页得到的作品直接使用列表数据，之前运行遗留的作品重新请求详情页。
+"""
+
+import os
+import time
+import asyncio
+import sqlite3
+
+from author import (
+    author_client,
+    fetch_author_page,
+    fetch_post_info,
+    post_base_name,
+    DOWNLOAD_CONCURRENCY,
+    PAGE_SIZE,
+)
+from douyin_core import download_post
+
+WATCHLIST_FILENAME = ".dy_watchlist.sqlite3"
+
+# 单个作品下载失败超过该次数后放弃，避免已删除的作品永远卡住同步
+MAX_ATTEMPTS = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS authors (
+    sec_uid         TEXT PRIMARY KEY,
+    share_url       TEXT,
+    nickname        TEXT,
+    hwm_create_time INTEGER NOT NULL DEFAULT 0,
+    hwm_aweme_id    TEXT NOT NULL DEFAULT '',
+    last_sync       REAL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    sec_uid         TEXT PRIMARY KEY,
+    started_at      REAL NOT NULL,
+    cursor          INTEGER NOT NULL DEFAULT 0,
+    paging_done     INTEGER NOT NULL DEFAULT 0,
+    top_create_time INTEGER NOT NULL DEFAULT 0,
+    top_aweme_id    TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS pending (
+    sec_uid     TEXT NOT NULL,
+    aweme_id    TEXT NOT NULL,
+    create_time INTEGER NOT NULL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (sec_uid, aweme_id)
+);
+"""
+
+
+def _position(create_time: int, aweme_id) -> tuple:
+    """作品的先后顺序：同一秒发布的作品按 aweme_id 区分"""
+    return int(create_time or 0), int(aweme_id or 0)
+
+
+class Watchlist:
+    """
+    关注列表及同步状态
+
+    Args:
+        output_dir: 下载目录，状态文件保存在该目录下
+    """
+
+    def __init__(self, output_dir: str):
+        os.makedirs(output_dir, exist_ok=True)
+        self.path = os.path.join(output_dir, WATCHLIST_FILENAME)
+        self._db = sqlite3.connect(self.path)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---- 关注列表 ----
+
+    def add(self, sec_uid: str, share_url: str = ""):
+        with self._db:
+            self._db.execute(
+                "INSERT OR IGNORE INTO authors (sec_uid, share_url) VALUES (?, ?)",
+                (sec_uid, share_url),
+            )
+
+    def remove(self, sec_uid: str):
+        with self._db:
+            for table in ("authors", "runs", "pending"):
+                self._db.execute(f"DELETE FROM {table} WHERE sec_uid = ?", (sec_uid,))
+
+    def get(self, sec_uid: str):
+        row = self._db.execute("SELECT * FROM authors WHERE sec_uid = ?", (sec_uid,)).fetchone()
+        return dict(row) if row else None
+
+    def authors(self) -> list:
+        return [dict(r) for r in self._db.execute("SELECT * FROM authors ORDER BY sec_uid")]
+
+    # ---- 运行状态 ----
+
+    def run(self, sec_uid: str) -> dict:
+        """返回进行中的同步状态，没有则新建"""
+        row = self._db.execute("SELECT * FROM runs WHERE sec_uid = ?", (sec_uid,)).fetchone()
+        if row:
+            return dict(row)
+        with self._db:
+            self._db.execute(
+                "INSERT INTO runs (sec_uid, started_at) VALUES (?, ?)", (sec_uid, time.time())
+            )
+        return self.run(sec_uid)
+
+    def save_page(self, sec_uid: str, posts: list, cursor: int, paging_done: bool, top: dict):
+        """原子地保存一页的结果：新作品进入 pending，同时推进游标"""
+        with self._db:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO pending (sec_uid, aweme_id, create_time) VALUES (?, ?, ?)",
+                [(sec_uid, str(p["aweme_id"]), p.get("create_time", 0)) for p in posts],
+            )
+            self._db.execute(
+                "UPDATE runs SET cursor = ?, paging_done = ?, top_create_time = ?, top_aweme_id = ? "
+                "WHERE sec_uid = ?",
+                (cursor, int(paging_done), top["create_time"], top["aweme_id"], sec_uid),
+            )
+
+    def pending(self, sec_uid: str) -> list:
+        """待下载的作品 [{"aweme_id", "create_time"}]"""
+        rows = self._db.execute(
+            "SELECT aweme_id, create_time FROM pending WHERE sec_uid = ? ORDER BY create_time", (sec_uid,)
+        )
+        return [dict(r) for r in rows]
+
+    def done(self, sec_uid: str, aweme_id: str):
+        with self._db:
+            self._db.execute(
+                "DELETE FROM pending WHERE sec_uid = ? AND aweme_id = ?", (sec_uid, aweme_id)
+            )
+
+    def failed(self, sec_uid: str, aweme_id: str) -> bool:
+        """记录一次失败，返回是否已放弃该作品"""
+        with self._db:
+            self._db.execute(
+                "UPDATE pending SET attempts = attempts + 1 WHERE sec_uid = ? AND aweme_id = ?",
+                (sec_uid, aweme_id),
+            )
+            row = self._db.execute(
+                "SELECT attempts FROM pending WHERE sec_uid = ? AND aweme_id = ?", (sec_uid, aweme_id)
+            ).fetchone()
+            if row and row["attempts"] >= MAX_ATTEMPTS:
+                self._db.execute(
+                    "DELETE FROM pending WHERE sec_uid = ? AND aweme_id = ?", (sec_uid, aweme_id)
+                )
+                return True
+        return False
+
+    def finish(self, sec_uid: str, nickname: str = ""):
+        """pending 清空后推进 high-water mark 并结束本次运行"""
+        run = self.run(sec_uid)
+        author = self.get(sec_uid) or {"hwm_create_time": 0, "hwm_aweme_id": ""}
+        hwm = (author["hwm_create_time"], author["hwm_aweme_id"])
+        top = (run["top_create_time"], run["top_aweme_id"])
+        if _position(*top) > _position(*hwm):
+            hwm = top
+        with self._db:
+            self._db.execute(
+                "UPDATE authors SET "
+                "hwm_create_time = ?, "
+                "hwm_aweme_id = ?, "
+                "nickname = COALESCE(NULLIF(?, ''), nickname), "
+                "last_sync = ? "
+                "WHERE sec_uid = ?",
+                (*hwm, nickname, time.time(), sec_uid),
+            )
+            self._db.execute("DELETE FROM runs WHERE sec_uid = ?", (sec_uid,))
+
+
+async def sync_author(
+    watchlist: Watchlist,
+    sec_uid: str,
+    output_dir: str = ".",
+    manifest=None,
+    page_size: int = PAGE_SIZE,
+    download_concurrency: int = DOWNLOAD_CONCURRENCY,
+    faststart: bool = False,
+) -> dict:
+    """
+    增量同步一个作者
+
+    faststart: 视频下载后校验 MP4 并重排为 fast-start (见 download_post)
+
+    Returns:
+        {"sec_uid", "new": 新发现作品数, "downloaded", "failed", "pages"}
+    """
+    author = watchlist.get(sec_uid)
+    if author is None:
+        watchlist.add(sec_uid)
+        author = watchlist.get(sec_uid)
+    hwm = _position(author["hwm_create_time"], author["hwm_aweme_id"])
+    run = watchlist.run(sec_uid)
+    # 本次运行从列表中拿到的作品（带新签名的播放地址）
+    listed = {}
+    summary = {"sec_uid": sec_uid, "new": 0, "downloaded": 0, "failed": 0, "pages": 0}
+
+    # 1. 翻页直到遇到已同步过的作品
+    if not run["paging_done"]:
+        cursor = run["cursor"]
+        top = {"create_time": run["top_create_time"], "aweme_id": run["top_aweme_id"]}
+        async with author_client() as client:
+            while True:
+                data = await fetch_author_page(client, sec_uid, cursor, page_size)
+                summary["pages"] += 1
+                new_posts = []
+                reached = False
+                for post in data.get("aweme_list") or []:
+                    create_time = post.get("create_time", 0)
+                    position = _position(create_time, post.get("aweme_id"))
+                    if position <= hwm:
+                        # 置顶作品不按时间排序，不能作为停止条件
+                        if post.get("is_top"):
+                            continue
+                        reached = True
+                        break
+                    new_posts.append(post)
+                    listed[str(post["aweme_id"])] = post
+                    if position > _position(top["create_time"], top["aweme_id"]):
+                        top = {"create_time": create_time, "aweme_id": str(post["aweme_id"])}
+
+                paging_done = reached or not data.get("has_more")
+                cursor = data.get("max_cursor", 0)
+                watchlist.save_page(sec_uid, new_posts, cursor, paging_done, top)
+                summary["new"] += len(new_posts)
+                if paging_done:
+                    break
+
+    # 2. 下载 pending 中的作品
+    pending = watchlist.pending(sec_uid)
+    nickname = ""
+    semaphore = asyncio.Semaphore(download_concurrency)
+
+    async def download(entry):
+        nonlocal nickname
+        aweme_id = str(entry["aweme_id"])
+        async with semaphore:
+            try:
+                # 之前运行遗留的作品没有播放地址，fetch_post_info 会重新请求详情页
+                info = await fetch_post_info(listed.get(aweme_id, {"aweme_id": aweme_id}))
+                nickname = nickname or info.get("author", "")
+                if manifest is None or manifest.get(aweme_id) is None:
+                    await download_post(
+                        info, output_dir, base_name=post_base_name(info), manifest=manifest, faststart=faststart
+                    )
+                watchlist.done(sec_uid, aweme_id)
+                summary["downloaded"] += 1
+            except Exception as e:
+                gave_up = watchlist.failed(sec_uid, aweme_id)
+                summary["failed"] += 1
+                print(f"作品 {aweme_id} 下载失败{'，已放弃' if gave_up else ''}: {e}")
+
+    await asyncio.gather(*(download(p) for p in pending))
+
+    # 3. 全部完成后推进 high-water mark；仍有待重试的作品时保留运行状态
+    if not watchlist.pending(sec_uid):
+        watchlist.finish(sec_uid, nickname)
+
+    print(
+        f"作者 {sec_uid}: 新作品 {summary['new']}，下载 {summary['downloaded']}，"
+        f"失败 {summary['failed']}"
+    )
+    return summary
+
+
+async def sync_all(watchlist: Watchlist, output_dir: str = ".", manifest=None, faststart: bool = False) -> list:
+    """依次同步关注列表中的所有作者"""
+    results = []
+    for author in watchlist.authors():
+        try:
+            results.append(
+                await sync_author(watchlist, author["sec_uid"], output_dir, manifest=manifest, faststart=faststart)
+            )
+        except Exception as e:
+            print(f"作者 {author['sec_uid']} 同步失败: {e}")
+            results.append({"sec_uid": author["sec_uid"], "error": str(e)})
+    return results
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+队列 worker：从持久化任务队列 (job_queue) 领取 解析 / 下载 任务并执行
+
+单机一个服务进程跟不上夜间归档量时，在一台或多台机器上启动多个 worker 进程，
+共享同一个队列即可横向扩展（多机需要 Redis 队列）。
+
+任务类型:
+    parse     {"share_text": ...}                   解析作品信息，结果写回队列
+    download  {"share_text": ..., "faststart": bool} 解析并下载到 worker 的下载目录（按下载清单去重）
+
+用法:
+    python worker.py enqueue --queue sqlite:///archive/jobs.sqlite3 "https://v.douyin.com/xxx/"
+    python worker.py enqueue --queue redis://queue-host:6379/0 --input links.txt
+    python worker.py run --queue sqlite:///archive/jobs.sqlite3 -o ./archive --concurrency 4
+    python worker.py stats --queue sqlite:///archive/jobs.sqlite3
+    python worker.py dead --queue sqlite:///archive/jobs.sqlite3 [--requeue]
+"""
+
+import os
+import sys
+import signal
+import socket
+import asyncio
+import argparse
+
+from douyin_core import extract_url, fetch_video_detail, extract_video_urls, parse_and_download
+from job_queue import open_queue
+from manifest import Manifest
+from models import dumps
+
+JOB_KINDS = ("parse", "download")
+# 队列为空时的轮询间隔（秒）
+POLL_INTERVAL = 1.0
+# 默认每个 worker 进程同时执行的任务数
+DEFAULT_CONCURRENCY = 4
+
+
+class PermanentJobError(RuntimeError):
+    """重试也不会成功的任务（参数无效等），直接进入死信"""
+
+
+async def run_job(job, output_dir: str, manifest=None) -> dict:
+    """执行一个任务，返回写回队列的结果"""
+    share_text = job.payload.get("share_text")
+    if job.kind not in JOB_KINDS or not share_text:
+        raise PermanentJobError(f"无效任务: {job.kind} {job.payload}")
+    try:
+        extract_url(share_text)
+    except ValueError as e:
+        raise PermanentJobError(str(e)) from e
+
+    if job.kind == "parse":
+        detail = await fetch_video_detail(extract_url(share_text))
+        return extract_video_urls(detail).to_dict()
+
+    info = await parse_and_download(
+        share_text,
+        output_dir,
+        manifest=manifest,
+        faststart=bool(job.payload.get("faststart")),
+    )
+    return {
+        "aweme_id": info["aweme_id"],
+        "type": info.get("type", "video"),
+        "paths": info.get("save_paths") or ([info["save_path"]] if info.get("save_path") else []),
+        "skipped": bool(info.get("skipped")),
+    }
+
+
+async def _keep_lease(queue, job, interval: float):
+    """处理期间定期续租，租约已被他人接管时停止"""
+    while True:
+        await asyncio.sleep(interval)
+        if not await asyncio.to_thread(queue.extend, job):
+            print(f"[worker] 任务 {job.id} 的租约已失效，结果将被丢弃")
+            return
+
+
+async def process(queue, job, output_dir: str, manifest=None):
+    """
+    执行任务并根据结果 ack / fail
+
+    队列操作是阻塞的 SQLite / Redis 调用（SQLite 可能等锁），都放到线程中执行，
+    避免卡住事件循环上其他正在下载的任务和续租。
+    """
+    keeper = asyncio.create_task(_keep_lease(queue, job, queue.visibility_timeout / 3))
+    try:
+        result = await run_job(job, output_dir, manifest)
+    except PermanentJobError as e:
+        await asyncio.to_thread(queue.fail, job, str(e), retry=False)
+        print(f"[worker] 任务 {job.id} 无效，移入死信: {e}")
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        await asyncio.to_thread(queue.fail, job, error)
+        print(f"[worker] 任务 {job.id} 第 {job.attempts} 次失败: {error}")
+    else:
+        await asyncio.to_thread(queue.ack, job, result)
+    finally:
+        keeper.cancel()
+
+
+async def run_worker(
+    queue,
+    output_dir: str,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    poll_interval: float = POLL_INTERVAL,
+    stop: asyncio.Event = None,
+    drain: bool = False,
+) -> int:
+    """
+    持续领取并执行任务，直到 stop 被设置（正在执行的任务会先完成）
+
+    Args:
+        queue: 任务队列 (SQLiteQueue / RedisQueue)
+        output_dir: 下载目录（下载清单也在这里）
+        concurrency: 同时执行的任务数
+        poll_interval: 队列为空时的轮询间隔
+        stop: 停止信号
+        drain: 队列中没有可执行任务时退出（用于一次性处理和测试）
+
+    Returns:
+        处理的任务数
+    """
+    stop = stop or asyncio.Event()
+    processed = 0
+    running = set()
+    with Manifest(output_dir) as manifest:
+        while not stop.is_set():
+            if len(running) >= concurrency:
+                await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                continue
+            job = await asyncio.to_thread(queue.lease)
+            if job is None:
+                if drain and not running:
+                    break
+                # 队列为空：等待轮询间隔、停止信号或某个任务完成
+                waiters = [asyncio.create_task(stop.wait()), *running]
+                try:
+                    await asyncio.wait(waiters, timeout=poll_interval, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    waiters[0].cancel()
+                continue
+            processed += 1
+            task = asyncio.create_task(process(queue, job, output_dir, manifest))
+            running.add(task)
+            task.add_done_callback(running.discard)
+
+        if running:
+            await asyncio.wait(running)
+    return processed
+
+
+def _read_inputs(args) -> list:
+    texts = list(args.share_text)
+    if args.input:
+        f = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+        with f:
+            texts += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="抖音下载队列 worker")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_queue_args(p):
+        p.add_argument(
+            "--queue",
+            default=os.environ.get("DY_JOB_QUEUE", "sqlite://dy_jobs.sqlite3"),
+            help="队列地址: sqlite:///path/jobs.sqlite3 或 redis://host:6379/0 (默认: $DY_JOB_QUEUE)",
+        )
+        p.add_argument("--visibility-timeout", type=float, default=300, help="租约时长，秒 (默认: 300)")
+        p.add_argument("--max-attempts", type=int, default=5, help="最多尝试次数，超过后进入死信 (默认: 5)")
+
+    p = sub.add_parser("enqueue", help="添加任务")
+    add_queue_args(p)
+    p.add_argument("share_text", nargs="*", help="分享文本或链接")
+    p.add_argument("--input", help="输入文件，每行一个分享文本或链接，- 表示标准输入")
+    p.add_argument("--parse-only", action="store_true", help="只解析不下载")
+    p.add_argument("--faststart", action="store_true", help="下载后校验 MP4 并重排为 fast-start")
+
+    p = sub.add_parser("run", help="运行 worker")
+    add_queue_args(p)
+    p.add_argument("-o", "--output", default=".", help="下载目录 (默认: 当前目录)")
+    p.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="同时执行的任务数 (默认: 4)")
+    p.add_argument("--drain", action="store_true", help="队列中没有可执行任务时退出")
+
+    p = sub.add_parser("stats", help="查看队列状态")
+    add_queue_args(p)
+
+    p = sub.add_parser("dead", help="查看死信")
+    add_queue_args(p)
+    p.add_argument("--requeue", action="store_true", help="把死信全部重新入队")
+
+    args = parser.parse_args()
+    queue = open_queue(
+        args.queue,
+        visibility_timeout=args.visibility_timeout,
+        max_attempts=args.max_attempts,
+    )
+    with queue:
+        if args.command == "enqueue":
+            texts = _read_inputs(args)
+            if not texts:
+                parser.error("缺少分享文本或 --input")
+            kind = "parse" if args.parse_only else "download"
+            for text in texts:
+                payload = {"share_text": text}
+                if args.faststart:
+                    payload["faststart"] = True
+                queue.enqueue(kind, payload)
+            print(f"已添加 {len(texts)} 个 {kind} 任务")
+        elif args.command == "stats":
+            print(dumps(queue.stats()).decode())
+        elif args.command == "dead":
+            for job in queue.dead(limit=1000):
+                if args.requeue:
+                    queue.requeue(job["id"])
+                print(dumps(job).decode())
+        else:
+            asyncio.run(_run(queue, args))
+
+
+async def _run(queue, args):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    # SIGTERM / Ctrl+C：不再领取新任务，等正在执行的任务完成后退出
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+    print(f"[worker] {socket.gethostname()}:{os.getpid()} 开始处理队列 {args.queue}")
+    count = await run_worker(queue, args.output, concurrency=args.concurrency, stop=stop, drain=args.drain)
+    print(f"[worker] 已退出，共处理 {count} 个任务")
+
+
+if __name__ == "__main__":
+    main()